@@ -2,15 +2,38 @@
 Authentication utilities for JWT token generation and password hashing
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
+import asyncio
 import os
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from config import settings
+from metrics import register_queue
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes created with a different work factor are flagged by needs_update()
+# and transparently rehashed on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+# bcrypt is CPU bound, so it runs on a small dedicated pool instead of the
+# event loop. Beyond PASSWORD_HASH_MAX_PENDING operations running or queued,
+# further ones are refused (PasswordHashBusy) rather than left waiting, so a
+# login surge cannot pile up requests that time out before their turn
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+_hash_pending = 0
+register_queue("password_hash", lambda: _hash_executor._work_queue.qsize())
+
+class PasswordHashBusy(Exception):
+    """Raised when PASSWORD_HASH_MAX_PENDING bcrypt operations are already pending"""
 
 # JWT configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
@@ -25,6 +48,30 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def _run_hash_task(func, *args):
+    """Run a bcrypt operation on the hashing pool"""
+    global _hash_pending
+    if _hash_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHashBusy(f"{_hash_pending} password hash operations already pending")
+    
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await _run_hash_task(get_password_hash, password)
+
+async def verify_and_update_password(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a new hash if the stored one is outdated"""
+    return await _run_hash_task(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -48,7 +95,7 @@ def verify_token(token: str) -> Optional[dict]:
         if username is None or user_id is None:
             return None
         
-        return {"username": username, "user_id": user_id}
+        return {"username": username, "user_id": user_id, "exp": payload.get("exp")}
     except JWTError:
         return None
 
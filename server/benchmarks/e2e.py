@@ -0,0 +1,386 @@
+"""
+End-to-end load test of the classify and history endpoints.
+Starts a stub Ollama server and the API (SQLite in a temp directory, the
+stub tesseract on TESSERACT_CMD), uploads synthetic RVL-CDIP-like pages to
+/api/v1/classify at the requested concurrency, then replays the history
+endpoints against what was stored. Reports throughput plus p50/p95/p99
+client latency per endpoint and per pipeline stage (from the timings each
+classification returns) as JSON, so runs can be compared across commits:
+
+    python benchmarks/e2e.py --stub-models --requests 200 --concurrency 8
+    python benchmarks/e2e.py --stub-models --baseline benchmarks/results/<earlier run>.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from report import BENCHMARKS_DIR, SERVER_DIR, load_report, percentile, run_metadata, write_report
+from stubs.ollama import StubOllama
+from synthetic import LABELS, generate_corpus
+
+API = "/api/v1"
+PERCENTILES = (50, 95, 99)
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    summary = {"count": len(values)}
+    summary.update({f"p{q}": round(percentile(values, q), 2) if values else None for q in PERCENTILES})
+    summary["mean"] = round(sum(values) / len(values), 2) if values else None
+    return summary
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def write_tesseract_wrapper(directory: str) -> str:
+    """Make an executable that pytesseract can call in place of tesseract"""
+    script = os.path.join(BENCHMARKS_DIR, "stubs", "tesseract.py")
+    if os.name == "nt":
+        path = os.path.join(directory, "tesseract.bat")
+        with open(path, "w") as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(directory, "tesseract")
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(path, 0o755)
+    return path
+
+class Server:
+    """The API (and optionally the model server) in subprocesses, configured for an offline run"""
+
+    def __init__(self, args, workdir: str, ollama_url: str):
+        self.port = args.port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(workdir, "server.log")
+
+        env = dict(os.environ)
+        env.update({
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "SECRET_KEY": "benchmark-secret-key",
+            "DEBUG": "false",
+            "TESSERACT_CMD": write_tesseract_wrapper(workdir),
+            "OCR_ENGINE": "pytesseract",  # the stub tesseract is a CLI
+            "OLLAMA_URL": ollama_url,
+            "TEMP_DIR": os.path.join(workdir, "temp"),
+            "VECTOR_INDEX_DIR": os.path.join(workdir, "vector_index"),
+            "PROFILE_DIR": os.path.join(workdir, "profiles"),
+            "BENCH_OCR_DELAY_MS": str(args.ocr_delay_ms),
+            "BENCH_CNN_DELAY_MS": str(args.cnn_delay_ms),
+            "BENCH_SUMMARIZE_DELAY_MS": str(args.summarize_delay_ms),
+            "PYTHONPATH": os.pathsep.join(filter(None, [SERVER_DIR, BENCHMARKS_DIR, env.get("PYTHONPATH")])),
+        })
+        if args.stub_models:
+            # The stub CNN ignores the weights, but the router only loads a model file that exists
+            model_path = os.path.join(workdir, "stub_model.pth")
+            open(model_path, "wb").close()
+            env["MODEL_PATH"] = model_path
+        if args.model_server:
+            env["MODEL_SERVER_SOCKET"] = os.path.join(workdir, "models.sock")
+        for item in args.env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        self.env = env
+
+        run_server = [sys.executable, os.path.join(BENCHMARKS_DIR, "run_server.py")]
+        stub = ["--stub-models"] if args.stub_models else []
+        self.command = run_server + ["--port", str(self.port)] + stub
+        self.model_server_command = (
+            run_server + ["--model-server", "--workers", str(args.model_server)] + stub if args.model_server else None
+        )
+        self.processes: List[subprocess.Popen] = []
+
+    def _spawn(self, command: List[str]) -> subprocess.Popen:
+        process = subprocess.Popen(command, cwd=SERVER_DIR, env=self.env, stdout=self._log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        return process
+
+    def _check_running(self) -> None:
+        for process in self.processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}; see {self.log_path}")
+
+    def start(self, timeout: float) -> None:
+        self._log = open(self.log_path, "w")
+        deadline = time.monotonic() + timeout
+
+        if self.model_server_command:
+            self._spawn(self.model_server_command)
+            while not os.path.exists(self.env["MODEL_SERVER_SOCKET"]):
+                self._check_running()
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Model server did not start within {timeout}s; see {self.log_path}")
+                time.sleep(0.1)
+
+        self._spawn(self.command)
+        while time.monotonic() < deadline:
+            self._check_running()
+            try:
+                if httpx.get(f"{self.url}{API}/health", timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.25)
+        raise RuntimeError(f"Server did not become healthy within {timeout}s; see {self.log_path}")
+
+    def stop(self) -> None:
+        # API first, so it stops sending work to the model server
+        for process in reversed(self.processes):
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        if self.processes:
+            self._log.close()
+
+async def sign_up(client: httpx.AsyncClient) -> str:
+    suffix = f"{int(time.time())}{random.randrange(10000)}"
+    response = await client.post(f"{API}/auth/signup", json={
+        "email": f"bench{suffix}@example.com",
+        "username": f"bench{suffix}",
+        "full_name": "Benchmark User",
+        "password": "benchmark-password"
+    })
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def run_requests(count: int, concurrency: int, send) -> float:
+    """Call send(i) for i in range(count) on `concurrency` workers; returns wall time"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for number in range(count):
+        queue.put_nowait(number)
+
+    async def worker():
+        while True:
+            try:
+                number = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await send(number)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+async def classify_phase(client: httpx.AsyncClient, corpus, args) -> dict:
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, int] = defaultdict(int)
+    correct = 0
+    not_saved = 0
+
+    async def send(number):
+        nonlocal correct, not_saved
+        filename, label, data = corpus[number % len(corpus)]
+        start = time.perf_counter()
+        try:
+            response = await client.post(
+                f"{API}/classify",
+                params={"include_timings": "true"},
+                files={"file": (filename, data)}
+            )
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+
+        statuses[str(response.status_code)] += 1
+        if response.status_code != 200:
+            return
+        latencies.append(elapsed)
+        body = response.json()
+        for stage, duration in (body.get("timings") or {}).items():
+            stages[stage].append(duration)
+        correct += body.get("label") == label
+        not_saved += body.get("document_id") is None
+
+    if args.warmup:
+        await run_requests(args.warmup, min(args.concurrency, args.warmup), send)
+        latencies.clear()
+        stages.clear()
+        statuses.clear()
+        correct = not_saved = 0
+
+    wall = await run_requests(args.requests, args.concurrency, send)
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "statuses": dict(statuses),
+        "not_saved": not_saved,
+        "accuracy": round(correct / len(latencies), 4) if latencies else None,
+        "latency_ms": summarize(latencies),
+        "stages_ms": {stage: summarize(values) for stage, values in sorted(stages.items())},
+    }
+
+async def history_phase(client: httpx.AsyncClient, args) -> dict:
+    history = (await client.get(f"{API}/documents/history")).json()
+    document_ids = [document["id"] for document in history] or [None]
+
+    endpoints = {
+        "history": lambda: client.get(f"{API}/documents/history"),
+        "history_recent": lambda: client.get(f"{API}/documents/history/recent", params={"limit": 10}),
+        "history_page": lambda: client.get(f"{API}/documents/history/page", params={"limit": 50}),
+        "history_by_label": lambda: client.get(f"{API}/documents/history/by-label/{random.choice(LABELS)}"),
+        "history_document": lambda: client.get(f"{API}/documents/history/{random.choice(document_ids)}"),
+        "stats": lambda: client.get(f"{API}/documents/stats"),
+        "search": lambda: client.get(f"{API}/documents/search", params={"q": random.choice(["invoice", "memo", "resume", "budget"])}),
+    }
+    if document_ids[0] is None:
+        del endpoints["history_document"]
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    names = sorted(endpoints)
+
+    async def send(number):
+        name = names[number % len(names)]
+        start = time.perf_counter()
+        try:
+            response = await endpoints[name]()
+        except httpx.HTTPError as e:
+            statuses[name][type(e).__name__] += 1
+            return
+        statuses[name][str(response.status_code)] += 1
+        if response.status_code == 200:
+            latencies[name].append((time.perf_counter() - start) * 1000)
+
+    wall = await run_requests(args.history_requests, args.concurrency, send)
+    completed = sum(len(values) for values in latencies.values())
+    return {
+        "requests": args.history_requests,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(completed / wall, 2) if wall else None,
+        "endpoints_ms": {
+            name: dict(summarize(latencies[name]), statuses=dict(statuses[name])) for name in names
+        },
+    }
+
+async def run_load(base_url: str, corpus, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        token = await sign_up(client)
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        results = {"classify": await classify_phase(client, corpus, args)}
+        if args.history_requests:
+            results["history"] = await history_phase(client, args)
+        return results
+
+def compare(current: dict, baseline: dict) -> List[str]:
+    """Describe p50/p95/p99 changes against a baseline run"""
+    lines = [f"Compared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):"]
+
+    def delta(name, now, before):
+        for key in ("throughput_rps",) if "throughput_rps" in now else tuple(f"p{q}" for q in PERCENTILES):
+            if now.get(key) is None or not before.get(key):
+                continue
+            change = (now[key] - before[key]) / before[key] * 100
+            lines.append(f"  {name:<32} {key:<15} {before[key]:>10} -> {now[key]:>10} ({change:+.1f}%)")
+
+    for phase in ("classify", "history"):
+        now, before = current["results"].get(phase), baseline["results"].get(phase)
+        if not now or not before:
+            continue
+        delta(f"{phase}", {"throughput_rps": now["throughput_rps"]}, {"throughput_rps": before["throughput_rps"]})
+        if phase == "classify":
+            delta("classify latency", now["latency_ms"], before["latency_ms"])
+        groups = now.get("stages_ms") or now.get("endpoints_ms")
+        previous = before.get("stages_ms") or before.get("endpoints_ms") or {}
+        for name, values in groups.items():
+            if name in previous:
+                delta(f"{phase} {name}", values, previous[name])
+    return lines
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end load test of classify and history endpoints")
+    parser.add_argument("--requests", type=int, default=100, help="Classify requests to send")
+    parser.add_argument("--history-requests", type=int, default=500, help="History requests to send (0 to skip)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=5, help="Classify requests sent before measuring")
+    parser.add_argument("--corpus-size", type=int, default=50, help="Distinct synthetic pages to upload")
+    parser.add_argument("--formats", default="png,jpg,tiff,pdf", help="Comma-separated upload formats")
+    parser.add_argument("--pages", type=int, default=1, help="Pages per PDF and TIFF upload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stub-models", action="store_true", help="Replace the CNN, summarizer and embeddings with stand-ins")
+    parser.add_argument("--model-server", type=int, default=0, metavar="N", help="Run the models in N model_server.py processes")
+    parser.add_argument("--cnn-delay-ms", type=float, default=40, help="Simulated CNN time with --stub-models")
+    parser.add_argument("--summarize-delay-ms", type=float, default=300, help="Simulated summarizer time with --stub-models")
+    parser.add_argument("--ocr-delay-ms", type=float, default=150, help="Simulated time in the stub tesseract")
+    parser.add_argument("--ollama-delay-ms", type=float, default=500, help="Simulated time in the stub Ollama")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra server setting; repeatable")
+    parser.add_argument("--server-url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=0, help="Port for the started server (default: any free port)")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/e2e-<commit>-<time>.json)")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the temp database and server log")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    random.seed(args.seed)
+    formats = [image_format.strip() for image_format in args.formats.split(",") if image_format.strip()]
+    corpus = generate_corpus(args.corpus_size, formats, seed=args.seed, pages=args.pages)
+
+    workdir = tempfile.mkdtemp(prefix="doc-classifier-bench-")
+    ollama = StubOllama(delay_ms=args.ollama_delay_ms).start()
+    server = None
+    try:
+        if args.server_url:
+            base_url = args.server_url.rstrip("/")
+        else:
+            server = Server(args, workdir, ollama.url)
+            print(f"Starting server on {server.url} (log: {server.log_path})")
+            server.start(args.startup_timeout)
+            base_url = server.url
+
+        results = asyncio.run(run_load(base_url, corpus, args))
+    finally:
+        if server:
+            server.stop()
+        ollama.stop()
+        if args.keep_workdir:
+            print(f"Work directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    report = {"meta": run_metadata("e2e", config), "results": results}
+    output = write_report(report, args.output)
+
+    classify = results["classify"]
+    print(f"classify: {classify['throughput_rps']} req/s, latency {classify['latency_ms']}, statuses {classify['statuses']}, not saved {classify['not_saved']}")
+    for stage, values in classify["stages_ms"].items():
+        print(f"  {stage:<12} p50={values['p50']} p95={values['p95']} p99={values['p99']} ms")
+    if "history" in results:
+        print(f"history: {results['history']['throughput_rps']} req/s")
+        for name, values in results["history"]["endpoints_ms"].items():
+            print(f"  {name:<18} p50={values['p50']} p95={values['p95']} p99={values['p99']} ms {values['statuses']}")
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        print("\n".join(compare(report, load_report(args.baseline))))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
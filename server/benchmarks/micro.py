@@ -0,0 +1,376 @@
+"""
+Micro-benchmarks for the primitives every classify and history request runs.
+Covers predict_image at several page sizes, heuristic_detect,
+TextHelpers.clean_text and extract_keywords on 1 KB-1 MB texts,
+FileOperations.save_upload_file, and crud.get_documents on a seeded SQLite
+database (1M rows by default, built once under benchmarks/.data).
+
+Each case is calibrated to run for at least --min-time per round, then timed
+for --rounds rounds; the median time per call is compared with the stored
+baseline in benchmarks/baselines/micro.json:
+
+    python benchmarks/micro.py                    # run, compare, write results/
+    python benchmarks/micro.py --check            # exit 1 on a regression
+    python benchmarks/micro.py --save-baseline    # accept this run as the baseline
+    python benchmarks/micro.py -k heuristic -k clean_text
+"""
+
+import argparse
+import asyncio
+import atexit
+import io
+import logging
+import math
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path[:0] = [SERVER_DIR, BENCHMARKS_DIR]
+
+# The server modules read settings on import; benchmarks never touch the real database
+_scratch_dir = tempfile.mkdtemp(prefix="doc-classifier-micro-")
+atexit.register(shutil.rmtree, _scratch_dir, ignore_errors=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch_dir, 'scratch.db')}")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+os.environ.setdefault("DEBUG", "false")
+os.environ.setdefault("TEMP_DIR", os.path.join(_scratch_dir, "temp"))
+
+from report import load_report, run_metadata, write_report
+from synthetic import LABELS, TEMPLATES, generate_document
+
+DATA_DIR = os.path.join(BENCHMARKS_DIR, ".data")
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baselines", "micro.json")
+
+TEXT_SIZES = {"1kb": 1 << 10, "10kb": 10 << 10, "100kb": 100 << 10, "1mb": 1 << 20}
+PAGE_SIZES = {"thumb_224": (224, 224), "screen_754x1000": (754, 1000), "a4_150dpi": (1240, 1754), "a4_300dpi": (2480, 3508)}
+UPLOAD_SIZES = {"100kb": 100 << 10, "1mb": 1 << 20, "10mb": 10 << 20}
+
+class Skip(Exception):
+    """A benchmark group cannot run in this environment"""
+
+class Case:
+    """One timed call: func() is measured, teardown(result) runs outside the timer"""
+
+    def __init__(self, name: str, func: Callable[[], object], teardown: Optional[Callable[[object], None]] = None):
+        self.name = name
+        self.func = func
+        self.teardown = teardown
+
+def ocr_like_text(size: int, seed: int = 0) -> str:
+    """Text shaped like tesseract output: template sentences, runs of whitespace, stray control bytes"""
+    rng = random.Random(seed)
+    sentences = list(TEMPLATES.values())
+    parts: List[str] = []
+    length = 0
+    while length < size:
+        part = rng.choice(sentences)
+        if rng.random() < 0.3:
+            part += "\n\n   "
+        if rng.random() < 0.05:
+            part += "\x0c\x07"
+        parts.append(part)
+        length += len(part) + 1
+    return " ".join(parts)[:size]
+
+def _run_async(loop: asyncio.AbstractEventLoop, factory: Callable[[], object]) -> Callable[[], object]:
+    return lambda: loop.run_until_complete(factory())
+
+# Benchmark groups; each yields Cases or raises Skip
+
+def bench_predict_image(args, loop) -> Iterator[Case]:
+    try:
+        import torch
+        from torchvision import models
+        from model.cnn import predict_image, load_model
+        from config import settings
+    except ImportError as e:
+        raise Skip(f"model dependencies not installed ({e.name})")
+
+    torch.set_num_threads(args.torch_threads or torch.get_num_threads())
+    if settings.model_exists:
+        model = load_model(settings.MODEL_PATH)
+    else:
+        # Same architecture with random weights; inference cost does not depend on the weights
+        model = models.resnet18(weights=None)
+        model.fc = torch.nn.Linear(model.fc.in_features, 16)
+        model.eval()
+
+    from PIL import Image
+    for name, size in PAGE_SIZES.items():
+        image = Image.open(io.BytesIO(generate_document("Invoice", size=size))).convert("RGB")
+        yield Case(f"predict_image[{name}]", lambda image=image: predict_image(model, image))
+
+def bench_decode_image(args, loop) -> Iterator[Case]:
+    from PIL import Image
+    from model.decode import load_image
+
+    for name, size in PAGE_SIZES.items():
+        page = Image.open(io.BytesIO(generate_document("Invoice", size=size)))
+        for image_format in ("JPEG", "PNG"):
+            path = os.path.join(_scratch_dir, f"{name}.{image_format.lower()}")
+            page.save(path, format=image_format)
+            yield Case(f"decode_image[{name}-{image_format.lower()}]", lambda path=path: load_image(path))
+            yield Case(
+                f"decode_image_full[{name}-{image_format.lower()}]",
+                lambda path=path: Image.open(path).convert("RGB")
+            )
+
+def bench_ocr_image(args, loop) -> Iterator[Case]:
+    from PIL import Image
+    from config import settings
+    from model.ocr_engines import PytesseractEngine, TesserocrEngine
+
+    engines = []
+    try:
+        engines.append(TesserocrEngine(pool_size=1))
+    except RuntimeError:
+        pass
+    if shutil.which(settings.TESSERACT_CMD):
+        engines.append(PytesseractEngine())
+    if not engines:
+        raise Skip("no OCR engine available (tesserocr with language data, or the tesseract CLI)")
+
+    for name in ("thumb_224", "screen_754x1000"):
+        page = Image.open(io.BytesIO(generate_document("Invoice", size=PAGE_SIZES[name]))).convert("L")
+        for engine in engines:
+            yield Case(f"ocr_image[{engine.name}-{name}]", lambda engine=engine, page=page: engine.image_to_text(page))
+
+def bench_heuristic_detect(args, loop) -> Iterator[Case]:
+    from model.heuristics import heuristic_detect
+    for name, size in TEXT_SIZES.items():
+        # No class reaches three keywords, so every rule is scanned: the slow path
+        text = ("lorem ipsum dolor sit amet " * (size // 27 + 1))[:size]
+        yield Case(f"heuristic_detect[{name}-nomatch]", lambda text=text: heuristic_detect(text))
+        text = ocr_like_text(size)
+        yield Case(f"heuristic_detect[{name}-ocr]", lambda text=text: heuristic_detect(text))
+
+def bench_text_helpers(args, loop) -> Iterator[Case]:
+    from utils.helpers import TextHelpers
+    for name, size in TEXT_SIZES.items():
+        text = ocr_like_text(size)
+        yield Case(f"clean_text[{name}]", lambda text=text: TextHelpers.clean_text(text))
+        yield Case(f"extract_keywords[{name}]", lambda text=text: TextHelpers.extract_keywords(text))
+
+def bench_save_upload_file(args, loop) -> Iterator[Case]:
+    from starlette.datastructures import UploadFile
+    from utils.file_ops import FileOperations
+
+    temp_dir = os.path.join(_scratch_dir, "uploads")
+    for name, size in UPLOAD_SIZES.items():
+        data = random.Random(size).randbytes(size)
+
+        async def save(data=data):
+            upload = UploadFile(file=io.BytesIO(data), filename="scan.png")
+            return await FileOperations.save_upload_file(upload, temp_dir)
+
+        yield Case(f"save_upload_file[{name}]", _run_async(loop, save), teardown=os.remove)
+
+def seed_documents_db(rows: int) -> str:
+    """Build (once) a SQLite database with `rows` documents; returns its path"""
+    path = os.path.join(DATA_DIR, f"documents-{rows}.db")
+    if os.path.exists(path):
+        return path
+
+    from sqlalchemy import create_engine, event, insert
+    from database import Base
+    from models import Document
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    partial = path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    print(f"Seeding {rows:,} documents into {path} (one-off)...", flush=True)
+    engine = create_engine(f"sqlite:///{partial}")
+
+    @event.listens_for(engine, "connect")
+    def _fast_load(connection, _):
+        connection.execute("PRAGMA journal_mode=OFF")
+        connection.execute("PRAGMA synchronous=OFF")
+
+    Base.metadata.create_all(engine, tables=[Document.__table__])
+
+    # One heavy user holds 10% of the rows, the rest spread over 999 users
+    rng = random.Random(rows)
+    users = [str(uuid.UUID(int=number)) for number in range(1000)]
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    step = timedelta(days=730) / rows
+    batch_size = 20000
+    with engine.begin() as connection:
+        for offset in range(0, rows, batch_size):
+            batch = []
+            for number in range(offset, min(offset + batch_size, rows)):
+                label = rng.choice(LABELS)
+                batch.append({
+                    "id": uuid.UUID(int=rng.getrandbits(128)),
+                    "filename": f"scan_{number:07d}.png",
+                    "label": label,
+                    "confidence": rng.random(),
+                    "override_reason": "CNN prediction",
+                    "disagreement": False,
+                    "user_id": users[0] if rng.random() < 0.1 else rng.choice(users[1:]),
+                    "file_type": "png",
+                    "created_at": start + step * number,
+                })
+            connection.execute(insert(Document.__table__), batch)
+    engine.dispose()
+
+    os.replace(partial, path)
+    return path
+
+def bench_get_documents(args, loop) -> Iterator[Case]:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from crud import get_documents
+
+    path = seed_documents_db(args.db_rows)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    heavy_user = str(uuid.UUID(int=0))
+    light_user = str(uuid.UUID(int=1))
+
+    def query(**kwargs):
+        async def run():
+            async with session_factory() as db:
+                return await get_documents(db, **kwargs)
+        return _run_async(loop, run)
+
+    yield Case("get_documents[heavy_user-first_page]", query(user_id=heavy_user, limit=50))
+    yield Case("get_documents[heavy_user-label]", query(user_id=heavy_user, label_filter="Invoice", limit=50))
+    yield Case("get_documents[heavy_user-offset_5000]", query(user_id=heavy_user, skip=5000, limit=50))
+    yield Case("get_documents[light_user-first_page]", query(user_id=light_user, limit=50))
+    yield Case("get_documents[all-first_page]", query(limit=100))
+
+GROUPS = {
+    "predict_image": bench_predict_image,
+    "decode_image": bench_decode_image,
+    "ocr_image": bench_ocr_image,
+    "heuristic_detect": bench_heuristic_detect,
+    "text_helpers": bench_text_helpers,
+    "save_upload_file": bench_save_upload_file,
+    "get_documents": bench_get_documents,
+}
+
+def measure(case: Case, rounds: int, min_time: float, max_time: float) -> Dict[str, float]:
+    """Time a case; returns per-call statistics in microseconds"""
+
+    def timed(iterations: int) -> float:
+        elapsed = 0.0
+        for _ in range(iterations):
+            start = time.perf_counter()
+            result = case.func()
+            elapsed += time.perf_counter() - start
+            if case.teardown:
+                case.teardown(result)
+        return elapsed
+
+    # Calibrate: grow the iterations per round until a round lasts min_time
+    iterations = 1
+    elapsed = timed(iterations)
+    while elapsed < min_time:
+        iterations = max(iterations * 2, int(iterations * min_time / max(elapsed, 1e-9) * 1.2))
+        elapsed = timed(iterations)
+
+    # Slow cases (model inference, 1M-row queries) get fewer rounds
+    rounds = max(3, min(rounds, int(max_time / max(elapsed, 1e-9))))
+    per_call = [timed(iterations) / iterations * 1e6 for _ in range(rounds)]
+    return {
+        "median_us": round(statistics.median(per_call), 3),
+        "min_us": round(min(per_call), 3),
+        "mean_us": round(statistics.fmean(per_call), 3),
+        "stddev_us": round(statistics.stdev(per_call), 3) if len(per_call) > 1 else 0.0,
+        "rounds": rounds,
+        "iterations": iterations,
+    }
+
+def compare(results: Dict[str, dict], baseline: dict, threshold: float, min_delta_us: float) -> List[str]:
+    """Names of cases whose median got slower than the baseline allows"""
+    regressions = []
+    previous = baseline.get("results", {})
+    for name, stats in results.items():
+        if name not in previous:
+            continue
+        before, now = previous[name]["median_us"], stats["median_us"]
+        ratio = now / before if before else math.inf
+        flag = ""
+        if ratio > 1 + threshold and now - before > min_delta_us:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"  {name:<44} {before:>14.1f} -> {now:>14.1f} us ({(ratio - 1) * 100:+.1f}%){flag}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for classifier primitives with baseline checks")
+    parser.add_argument("-k", "--filter", action="append", default=[], help="Only run cases whose name contains this; repeatable")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+    parser.add_argument("--max-time", type=float, default=5.0, help="Rough seconds budget per case")
+    parser.add_argument("--db-rows", type=int, default=1_000_000, help="Rows in the seeded get_documents database")
+    parser.add_argument("--torch-threads", type=int, default=0, help="torch.set_num_threads for predict_image (0: default)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown, as a fraction")
+    parser.add_argument("--min-delta-us", type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 when a case regressed")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run's cases in the baseline")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/micro-<commit>-<time>.json)")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+
+    results: Dict[str, dict] = {}
+    skipped: Dict[str, str] = {}
+    for group, cases in GROUPS.items():
+        try:
+            for case in cases(args, loop):
+                if args.filter and not any(pattern in case.name for pattern in args.filter):
+                    continue
+                results[case.name] = measure(case, args.rounds, args.min_time, args.max_time)
+                stats = results[case.name]
+                print(f"{case.name:<46} median {stats['median_us']:>14.1f} us  (min {stats['min_us']:.1f}, "
+                      f"stddev {stats['stddev_us']:.1f}, {stats['rounds']}x{stats['iterations']})", flush=True)
+        except Skip as e:
+            skipped[group] = str(e)
+            print(f"{group}: skipped, {e}")
+    loop.close()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "check", "save_baseline")}
+    report = {"meta": run_metadata("micro", config), "results": results, "skipped": skipped}
+    print(f"Results written to {write_report(report, args.output)}")
+
+    regressions: List[str] = []
+    if os.path.exists(args.baseline):
+        baseline = load_report(args.baseline)
+        meta = baseline["meta"]
+        print(f"Compared with baseline {meta.get('commit')} ({meta.get('timestamp')}, {meta.get('platform')}):")
+        if meta.get("platform") != report["meta"]["platform"] or meta.get("cpu_count") != report["meta"]["cpu_count"]:
+            print("  warning: the baseline was recorded on a different machine; re-record it with --save-baseline")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_us)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            # Cases not run this time (filtered or skipped) keep their old numbers
+            merged = dict(load_report(args.baseline).get("results", {}), **results)
+        else:
+            merged = results
+        write_report({"meta": report["meta"], "results": merged}, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+
+    return 1 if args.check and regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
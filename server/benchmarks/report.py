@@ -0,0 +1,62 @@
+"""
+Result files shared by the benchmark scripts.
+Every run is written as JSON with the git commit, platform and options,
+so runs can be compared across commits and machines.
+"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCHMARKS_DIR)
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile, as numpy.percentile does"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_metadata(benchmark: str, config: dict) -> dict:
+    return {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+    }
+
+def write_report(report: dict, output: Optional[str] = None) -> str:
+    """Write a run to `output`, or to results/<benchmark>-<commit>-<time>.json"""
+    if output is None:
+        meta = report["meta"]
+        stamp = datetime.fromisoformat(meta["timestamp"]).strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{meta['benchmark']}-{meta['commit'] or 'unknown'}-{stamp}.json")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    return output
+
+def load_report(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,50 @@
+"""
+Run the API, or the model server, for benchmarks.
+With --stub-models, model.classifier and model.embeddings are replaced by
+the stand-ins in stubs/ before the app is imported, so no weights,
+torch or transformers are needed. Without it the real models load, as in
+production. Configuration comes from the environment, as for main.py.
+"""
+
+import argparse
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--stub-models", action="store_true", help="Use the CNN/summarizer/embedding stand-ins")
+    parser.add_argument("--model-server", action="store_true", help="Run model_server.py (on MODEL_SERVER_SOCKET) instead of the API")
+    args = parser.parse_args()
+
+    os.chdir(SERVER_DIR)
+    sys.path[:0] = [SERVER_DIR, BENCHMARKS_DIR]
+
+    if args.stub_models:
+        from stubs import classifier, embeddings
+        sys.modules["model.classifier"] = classifier
+        sys.modules["model.embeddings"] = embeddings
+
+    if args.model_server:
+        import model_server
+        sys.argv = [sys.argv[0], "--workers", str(args.workers)]
+        model_server.main()
+        return
+
+    import uvicorn
+
+    if args.workers > 1:
+        if args.stub_models:
+            parser.error("--stub-models runs a single worker; the stand-ins are installed in this process only")
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+    else:
+        from main import app
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
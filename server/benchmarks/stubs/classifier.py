@@ -0,0 +1,72 @@
+"""
+Stand-in for model.classifier, for benchmarks without model weights.
+Decoding is real; the CNN and summarizer are replaced by functions that read the synthetic
+class marker and sleep for BENCH_CNN_DELAY_MS / BENCH_SUMMARIZE_DELAY_MS;
+BENCH_CNN_ERROR_RATE of predictions pick a wrong class so the heuristic
+and Mistral override paths run too. OCR, heuristics and the Mistral call
+are the real modules, pointed at the stub tesseract and Ollama.
+"""
+
+import os
+import random
+import time
+from config import settings
+from model.decode import load_images as decode_images
+from model.pages import aggregate_page_predictions
+from model.ocr import extract_text
+from model.heuristics import heuristic_detect
+from model.mistral import classify_with_mistral
+from synthetic import LABELS, decode_marker
+
+class_map = dict(enumerate(LABELS))
+
+def _delay(variable):
+    delay = float(os.environ.get(variable, "0"))
+    if delay:
+        time.sleep(delay / 1000)
+
+class StubModel:
+    def __init__(self, error_rate):
+        self.error_rate = error_rate
+
+def load_model(model_path):
+    _delay("BENCH_MODEL_LOAD_DELAY_MS")
+    return StubModel(float(os.environ.get("BENCH_CNN_ERROR_RATE", "0.2")))
+
+# The real decoder: only the models are stubbed
+def load_image(image_path):
+    return decode_images(image_path)[0]
+
+def load_images(image_path):
+    return decode_images(image_path, max_pages=settings.CNN_MAX_PAGES)
+
+def predict_image(model, image):
+    if isinstance(image, (str, os.PathLike)):
+        image = load_image(image)
+    return predict_images(model, [image])[0]
+
+def predict_document(model, images):
+    return aggregate_page_predictions(predict_images(model, images))
+
+def predict_images(model, images):
+    # One simulated forward pass per batch, as with the real CNN
+    _delay("BENCH_CNN_DELAY_MS")
+    results = []
+    for image in images:
+        index = decode_marker(image)
+        if index < 0 or random.random() < model.error_rate:
+            index = random.randrange(len(LABELS))
+        results.append((class_map[index], round(random.uniform(0.5, 0.99), 4)))
+    return results
+
+def get_summarizer():
+    return None
+
+def summarize_text(text):
+    if len(text) < 50:
+        return "Text too short to summarize."
+    _delay("BENCH_SUMMARIZE_DELAY_MS")
+    return " ".join(text.split()[:40])
+
+def classify_with_llm(text):
+    return random.choice(LABELS), 0.5
@@ -0,0 +1,26 @@
+"""
+Stand-in for model.embeddings, for benchmarks without sentence-transformers.
+Hashes word tokens into a fixed-size vector (the hashing trick) and
+normalizes it, so the similarity indexer does representative work without
+downloading a model.
+"""
+
+import zlib
+import numpy as np
+from config import settings
+
+EMBEDDING_DIM = 384
+
+def get_embedding_model():
+    return None
+
+def get_embedding_dim():
+    return EMBEDDING_DIM
+
+def embed_texts(texts):
+    vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in (text or "")[:settings.EMBEDDING_TEXT_LIMIT].lower().split():
+            vectors[row, zlib.crc32(token.encode("utf-8")) % EMBEDDING_DIM] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
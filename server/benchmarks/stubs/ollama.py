@@ -0,0 +1,94 @@
+"""
+Stand-in for the Ollama /api/generate endpoint, for offline benchmarks.
+Answers every prompt with a fixed-shape classification: the class named in
+the document's first line when it is one of the labels the real prompt
+offers, otherwise "Letter". Runs in a background thread of the harness, or
+standalone with `python -m stubs.ollama --port 11434`.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROMPT_LABELS = ("Resume", "Memo", "Letter", "Specification")
+
+def _answer(prompt: str) -> dict:
+    text = prompt.split("Document Text:", 1)[-1].strip()
+    first_line = text.splitlines()[0].strip().lower() if text else ""
+    label = next((label for label in PROMPT_LABELS if label.lower() == first_line), "Letter")
+    return {
+        "document_type": label,
+        "confidence": round(random.uniform(0.6, 0.95), 2),
+        "reasoning": f"Stub answer based on the heading '{first_line}'"
+    }
+
+class _Handler(BaseHTTPRequestHandler):
+    delay_ms = 0.0
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_error(400, "Invalid JSON")
+            return
+
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1000)
+
+        body = json.dumps({
+            "model": payload.get("model", "mistral"),
+            "response": json.dumps(_answer(payload.get("prompt", ""))),
+            "done": True
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubOllama:
+    """Stub Ollama server on a background thread"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay_ms: float = 0.0):
+        handler = type("StubOllamaHandler", (_Handler,), {"delay_ms": delay_ms})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-ollama", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def start(self) -> "StubOllama":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = StubOllama(args.host, args.port, args.delay_ms)
+    print(f"Stub Ollama listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,46 @@
+"""
+Stand-in for the tesseract binary, for offline benchmarks.
+Called the way pytesseract calls tesseract (input image, output base, then
+options and the "txt" config). It decodes the class marker drawn by
+synthetic.py and writes that class's text to <output base>.txt.
+BENCH_OCR_DELAY_MS simulates recognition time.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from synthetic import LABELS, decode_marker, document_text
+
+def main(argv):
+    if not argv or argv[0] in ("--version", "-v"):
+        print("tesseract 5.3.0 (benchmark stub)")
+        return 0
+    if argv[0] == "--list-langs":
+        print("List of available languages (1):\neng")
+        return 0
+    if len(argv) < 2:
+        print("Usage: tesseract imagename outputbase [options...] [configfile...]", file=sys.stderr)
+        return 1
+
+    input_path, output_base = argv[0], argv[1]
+    delay = float(os.environ.get("BENCH_OCR_DELAY_MS", "0"))
+    if delay:
+        time.sleep(delay / 1000)
+
+    with Image.open(input_path) as image:
+        index = decode_marker(image)
+    text = document_text(LABELS[index]) if 0 <= index < len(LABELS) else ""
+
+    if output_base == "stdout":
+        sys.stdout.write(text + "\n")
+    else:
+        with open(output_base + ".txt", "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,142 @@
+"""
+Synthetic RVL-CDIP-like document pages for benchmarks.
+Each page is a grayscale scan-sized image with a title, body text and
+speckle noise. The document class is encoded in a row of solid blocks in
+the top-left corner, so the stub tesseract can return matching text; the
+blocks survive JPEG compression.
+"""
+
+import io
+import random
+from typing import List, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+# RVL-CDIP classes, in the CNN's class index order
+LABELS = [
+    "Advertisement", "Budget", "Email", "File Folder", "Form",
+    "Handwritten", "Invoice", "Letter", "Memo", "News Article",
+    "Presentation", "Questionnaire", "Resume", "Scientific Publication",
+    "Scientific Report", "Specification"
+]
+
+# Body text per class; several include enough keywords for heuristic_detect
+TEMPLATES = {
+    "Advertisement": "Limited time offer! Huge sale with 50% discount. Buy now while stocks last.",
+    "Budget": "Fiscal year budget summary. Allocation by department, expenditure to date and forecast.",
+    "Email": "From: alice@example.com To: bob@example.com Sent: Monday Subject: Quarterly numbers Cc: team",
+    "File Folder": "Folder contents index. File list for the archive, box 12.",
+    "Form": "Please fill out every field. Tick the checkbox, add your signature and the date. Form number 27B.",
+    "Handwritten": "handwritten note in blue ink, partly cursive and hard to read",
+    "Invoice": "Invoice number 10442. Bill to: ACME Corp. Total amount due: $1,250.00. Payment terms: net 30.",
+    "Letter": "Dear Mr. Smith, thank you for your enquiry regarding our services. Sincerely, Jane Doe. Kind regards.",
+    "Memo": "Interoffice memo. To: all staff. From: operations. Date: 12 March. Subject: parking changes.",
+    "News Article": "Breaking news headline. Byline: staff reporter. The press conference announced record results.",
+    "Presentation": "Slide 1: Agenda and overview. Bullet points for the quarterly presentation.",
+    "Questionnaire": "Customer survey. Question 1: please rate our service. Response: agree, neutral, disagree.",
+    "Resume": "Work experience: senior engineer, 2015-2023. Education: BSc computer science. Skills: Python, SQL. LinkedIn profile.",
+    "Scientific Publication": "Abstract. We present a new methodology. Results show improvements. References and doi included.",
+    "Scientific Report": "Experiment report. Data collection and analysis of samples. Conclusion and next steps.",
+    "Specification": "Product specification. Requirements, operating parameters and dimensions. Test procedure 4.2.",
+}
+
+MARKER_BITS = 4
+MARKER_BLOCKS_PER_WIDTH = 32  # marker blocks scale with the page, so they survive reduced decodes
+
+def document_text(label: str, repeat: int = 8) -> str:
+    """Get the text a page of this class carries (what OCR should return)"""
+    return "\n".join([label.upper()] + [TEMPLATES[label]] * repeat)
+
+def _marker_geometry(width: int) -> Tuple[int, int]:
+    block = max(4, round(width / MARKER_BLOCKS_PER_WIDTH))
+    return block, max(1, block // 3)
+
+def _marker_boxes(width: int) -> List[Tuple[int, int, int, int]]:
+    # One guard block (always dark) followed by the class index bits
+    block, margin = _marker_geometry(width)
+    boxes = []
+    for position in range(MARKER_BITS + 1):
+        left = margin + position * block * 2
+        boxes.append((left, margin, left + block, margin + block))
+    return boxes
+
+def decode_marker(image: Image.Image) -> int:
+    """Read the class index from a page; -1 if the page has no marker"""
+    gray = image.convert("L")
+    dark = []
+    inset = _marker_geometry(gray.width)[0] // 4
+    for left, top, right, bottom in _marker_boxes(gray.width):
+        region = gray.crop((left + inset, top + inset, right - inset, bottom - inset))
+        pixels = list(region.getdata())
+        dark.append(sum(pixels) / len(pixels) < 128)
+
+    if not dark[0]:
+        return -1
+    return sum(1 << bit for bit, is_dark in enumerate(dark[1:]) if is_dark)
+
+def _render_page(label: str, rng: random.Random, size: Tuple[int, int]) -> Image.Image:
+    image = Image.new("L", size, color=255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    index = LABELS.index(label)
+    boxes = _marker_boxes(size[0])
+    draw.rectangle(boxes[0], fill=0)
+    for bit, box in enumerate(boxes[1:]):
+        if index & (1 << bit):
+            draw.rectangle(box, fill=0)
+
+    block, margin = _marker_geometry(size[0])
+    y = margin + block * 3
+    draw.text((40, y), label.upper(), fill=0, font=font)
+    y += 40
+    words = TEMPLATES[label].split()
+    while y < size[1] - 40:
+        line = " ".join(rng.choice(words) for _ in range(rng.randint(6, 12)))
+        draw.text((40 + rng.randint(0, 10), y), line, fill=rng.randint(0, 60), font=font)
+        y += rng.randint(14, 22)
+
+    # Scanner speckle
+    for _ in range(size[0] * size[1] // 400):
+        draw.point((rng.randrange(size[0]), rng.randrange(size[1])), fill=rng.randint(0, 200))
+    return image
+
+def generate_document(
+    label: str,
+    seed: int = 0,
+    size: Tuple[int, int] = (754, 1000),
+    image_format: str = "PNG",
+    pages: int = 1
+) -> bytes:
+    """Render a synthetic document of the given class and encode it
+
+    Every page carries the class marker. pages > 1 needs a multi-page
+    format (PDF or TIFF).
+    """
+    rng = random.Random(seed)
+    images = [_render_page(label, rng, size) for _ in range(pages)]
+
+    buffer = io.BytesIO()
+    save_format = "JPEG" if image_format.upper() in ("JPG", "JPEG") else image_format.upper()
+    # Pages are drawn as 150 dpi scans; PDF page sizes follow from this
+    options = {"resolution": 150} if save_format == "PDF" else {}
+    if pages > 1:
+        options.update(save_all=True, append_images=images[1:])
+    images[0].save(buffer, format=save_format, **options)
+    return buffer.getvalue()
+
+def generate_corpus(count: int, formats: List[str], seed: int = 0, pages: int = 1) -> List[Tuple[str, str, bytes]]:
+    """Generate (filename, label, bytes) for a mix of classes and formats
+
+    pages applies to the multi-page formats (PDF, TIFF); the others get one.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for number in range(count):
+        label = rng.choice(LABELS)
+        image_format = formats[number % len(formats)]
+        extension = "jpg" if image_format.lower() in ("jpg", "jpeg") else image_format.lower()
+        filename = f"synthetic_{number:05d}_{label.lower().replace(' ', '_')}.{extension}"
+        page_count = pages if extension in ("pdf", "tiff", "tif") else 1
+        document = generate_document(label, seed=seed + number, image_format=image_format, pages=page_count)
+        corpus.append((filename, label, document))
+    return corpus
@@ -10,17 +10,75 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     DEBUG: bool = True
+    WORKERS: int = 1  # gunicorn workers forked from one preloaded master (gunicorn.conf.py)
     
     # Database Configuration
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: Optional[str] = None  # Derived from DATABASE_URL when unset
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 300
+    
+    # Write-behind Configuration (batch document inserts off the request path)
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_BATCH_SIZE: int = 100
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 1.0  # seconds
+    WRITE_BEHIND_MAX_QUEUE: int = 10000
+    WRITE_BEHIND_MAX_RETRIES: int = 3  # failed attempts at a batch before it is bisected to drop rejected rows
+    
+    # Statistics Configuration
+    STATS_USE_ROLLUP: bool = True  # False computes stats directly from documents
     
     # Authentication Configuration
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_CACHE_TTL: int = 60  # seconds a verified token stays cached
+    # Seconds a resolved user stays cached. The cache is per process:
+    # invalidation reaches only the worker that handled the update, so other
+    # workers may act on a deactivated, deleted or edited user this long
+    AUTH_USER_CACHE_TTL: int = 10
+    AUTH_CACHE_MAX_SIZE: int = 1024
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32  # bcrypt operations running or queued before logins get 503
+    ADMIN_USERS: list[str] = []  # usernames or emails allowed to use admin endpoints
     
     # Model Configuration
-    MODEL_PATH: str = "./model/resnet18_rvlcdip_final_fully_finetuned.pth"
+    MODEL_PATH: str = "./model/resnet18_rvlcdip_final_fully_finetuned.pth"  # .pth or .safetensors
+    MODEL_MMAP: bool = True  # memory-map .pth weights instead of reading them into private memory
+    PRELOAD_MODELS: bool = False  # load the summarizer and embedding model at startup, not on first use
+
+    # Model Registry Configuration (model_registry.py; the summarizer, zero-shot and embedding models load on first use)
+    MODEL_MEMORY_BUDGET_MB: int = 0  # resident model weights per process; 0 for no budget
+    MODEL_IDLE_TIMEOUT: int = 0  # seconds a model may go unused before it is unloaded; 0 keeps models loaded
+    MODEL_MIN_AVAILABLE_MB: int = 0  # unload idle models while the node has less memory available; 0 to disable
+    MODEL_REGISTRY_CHECK_INTERVAL: float = 30.0  # seconds between idle and memory pressure checks
+    
+    # Thread Budget Configuration (thread_budget.py; CPUs shared by torch, tesseract and workers)
+    THREAD_BUDGET_ENABLED: bool = True
+    CPU_BUDGET: int = 0  # CPUs the workers on this node may use; 0 uses every CPU available
+    TORCH_THREADS: int = 0  # intra-op threads per worker; 0 sizes them to the worker's CPU slice
+    TORCH_INTEROP_THREADS: int = 1
+    OCR_THREADS: int = 1  # OMP_THREAD_LIMIT for tesseract (each CLI run, or libtesseract when tesserocr loads)
+    OCR_PAGE_WORKERS: int = 0  # pages of one document OCR'd in parallel; 0 sizes it to the worker's CPU slice
+    PIN_WORKER_CPUS: bool = False  # pin each worker to its CPU slice (Linux)
+
+    # OCR Engine Configuration (model/ocr_engines.py)
+    OCR_ENGINE: str = "auto"  # "tesserocr" (in-process, pooled handles), "pytesseract" (tesseract CLI), or "auto"
+    OCR_LANG: str = "eng"  # tesseract language(s), e.g. "eng+deu"
+    TESSDATA_PATH: Optional[str] = None  # tessdata directory for tesserocr; None uses libtesseract's default
+    
+    # Model Server Configuration (model_server.py; unset runs the models inside each API worker)
+    MODEL_SERVER_SOCKET: Optional[str] = None  # Unix socket path, e.g. /run/doc-classifier/models.sock
+    MODEL_SERVER_WORKERS: int = 1  # model server processes forked after the models are loaded
+    MODEL_SERVER_THREADS: int = 0  # torch threads per process; 0 sizes them to the process's CPU slice
+    MODEL_SERVER_CPUS: list[int] = []  # CPUs to pin the model server to, split across its processes (Linux)
+    MODEL_SERVER_MAX_BATCH: int = 8  # images per CNN forward pass
+    MODEL_SERVER_BATCH_WINDOW: float = 0.005  # seconds to wait for more images before running a batch
+    MODEL_SERVER_OCR_WORKERS: int = 4  # concurrent tesseract runs per process
+    MODEL_SERVER_TIMEOUT: float = 60.0  # seconds an API worker waits for a reply
     
     # CORS Configuration
     ALLOWED_ORIGINS: list[str] = ["*"]
@@ -29,6 +87,13 @@ class Settings(BaseSettings):
     
     # File Upload Configuration
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_IMAGE_PIXELS: int = 100_000_000  # larger images are rejected as possible decompression bombs
+    PDF_DPI: int = 300  # resolution PDF pages are rendered at for OCR
+    PDF_MAX_PAGES: int = 20  # later pages are not read
+    TIFF_MAX_PAGES: int = 20  # pages of a multi-page TIFF (fax) that are read; later pages are not
+    CNN_MAX_PAGES: int = 3  # first pages of a PDF or TIFF the CNN classifies; their votes give the label
+    PDF_TEXT_LAYER: bool = True  # use a page's embedded text instead of OCR when it has one
+    PDF_TEXT_MIN_CHARS: int = 32  # fewer non-space characters count as no text layer (scanned page)
     ALLOWED_EXTENSIONS: list[str] = [".pdf", ".png", ".jpg", ".jpeg", ".tiff", ".bmp"]
     TEMP_DIR: str = "./temp"
     
@@ -38,14 +103,46 @@ class Settings(BaseSettings):
     VERSION: str = "1.0.0"
     DESCRIPTION: str = "FastAPI backend for AI-powered document classification"
     
+    # External Tools Configuration
+    TESSERACT_CMD: str = "tesseract"  # CLI used by the pytesseract engine; a name on PATH or a full path
+    OLLAMA_URL: str = "http://localhost:11434/api/generate"
+    
     # Timeout Configuration
     DEFAULT_TIMEOUT: int = 30
     LLM_TIMEOUT: int = 20
-    OCR_TIMEOUT: int = 15
+    OCR_TIMEOUT: int = 15  # seconds for a document's OCR; pages not finished by then are left out of its text
     
     # Text Processing Configuration
     MAX_TEXT_LENGTH: int = 10000
     LLM_TEXT_LIMIT: int = 2000
+    TEXT_COMPRESSION: str = "zstd"  # "zstd" or "zlib" for stored OCR text and summaries
+    SEARCH_LANGUAGE: str = "english"  # PostgreSQL text search configuration
+    SEARCH_SNIPPET_LENGTH: int = 200
+    
+    # Similarity Search Configuration
+    SIMILARITY_ENABLED: bool = True
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_TEXT_LIMIT: int = 2000
+    VECTOR_INDEX_DIR: str = "./vector_index"
+    VECTOR_IVF_THRESHOLD: int = 200000  # switch from brute force to IVF above this many vectors
+    VECTOR_IVF_NPROBE: int = 8
+    VECTOR_COMPACT_FRACTION: float = 0.2  # rewrite a user's vectors once this fraction of rows is deleted
+    
+    # Response Cache Configuration (history and stats, keyed by document version)
+    RESPONSE_CACHE_TTL: int = 300
+    RESPONSE_CACHE_MAX_SIZE: int = 256
+    RESPONSE_CACHE_MAX_BODY: int = 1024 * 1024  # larger bodies get an ETag but are not cached
+    
+    # Export Configuration
+    EXPORT_BATCH_SIZE: int = 1000  # rows fetched per server-side cursor batch
+    EXPORT_PARQUET_ROW_GROUP_SIZE: int = 10000  # rows buffered before each row group is written
+    
+    # Profiling Configuration
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_SAMPLE_RATE: float = 0.0  # fraction of classify requests profiled by the stack sampler
+    PROFILE_SAMPLE_INTERVAL: float = 0.005  # seconds between stack samples
+    PROFILE_MAX_FILES: int = 200  # oldest profiles are deleted beyond this
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,34 @@
+"""
+Convert a PyTorch .pth state dict to .safetensors
+safetensors files are memory-mapped on load, so workers on one node share
+the weights through the page cache. Point MODEL_PATH at the output.
+"""
+
+import argparse
+import os
+import sys
+
+def convert(source: str, target: str) -> None:
+    import torch
+    from safetensors.torch import save_file
+
+    state_dict = torch.load(source, map_location="cpu", weights_only=True)
+    save_file({name: tensor.contiguous() for name, tensor in state_dict.items()}, target)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert .pth model weights to .safetensors")
+    parser.add_argument("source", help="Path to the .pth state dict")
+    parser.add_argument("target", nargs="?", help="Output path (default: source with .safetensors)")
+    args = parser.parse_args()
+
+    target = args.target or os.path.splitext(args.source)[0] + ".safetensors"
+    print(f"🔄 Converting {args.source} -> {target}")
+    try:
+        convert(args.source, target)
+    except Exception as e:
+        print(f"❌ Conversion failed: {e}")
+        sys.exit(1)
+    print(f"✅ Done. Set MODEL_PATH={target}")
+
+if __name__ == "__main__":
+    main()
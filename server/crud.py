@@ -1,164 +1,439 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from models import Document, User
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, delete, desc, func, insert, or_, select
+from sqlalchemy.orm import selectinload
+from models import Document, DocumentContent, User
+from stats import apply_stats_delta
+from search import index_documents, remove_from_index, search_document_ids
+from similarity import similarity_indexer
+from response_cache import bump_document_versions
 from schemas import DocumentCreate, DocumentUpdate, UserCreate
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from datetime import date, datetime, time, timedelta, timezone
+import asyncio
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
-def create_document(db: Session, document: DocumentCreate) -> Document:
+# Document fields stored compressed in document_contents
+CONTENT_FIELDS = ("raw_text", "summary")
+
+# Document fields covered by the full-text search index
+SEARCH_FIELDS = ("filename", "raw_text", "summary", "user_id")
+
+# Document fields counted by the document_stats_daily rollup
+STATS_FIELDS = ("user_id", "created_at", "label", "override_reason", "disagreement", "confidence")
+
+def _search_fields(document: Document) -> Dict[str, Any]:
+    """Get the fields the search index needs from a document with content loaded"""
+    return {
+        "id": document.id,
+        "user_id": document.user_id,
+        "created_at": document.created_at,
+        "filename": document.filename,
+        "summary": document.summary,
+        "raw_text": document.raw_text,
+    }
+
+async def create_document(db: AsyncSession, document: DocumentCreate) -> Document:
     """Create a new document record"""
     try:
         db_document = Document(**document.model_dump())
+        db_document.created_at = datetime.now(timezone.utc)
         db.add(db_document)
-        db.commit()
-        db.refresh(db_document)
+        await db.flush()
+        search_fields = _search_fields(db_document)
+        await apply_stats_delta(db, [db_document])
+        await index_documents(db, [search_fields])
+        await bump_document_versions(db, [db_document.user_id])
+        await db.commit()
+        similarity_indexer.schedule([search_fields])
+        await db.refresh(db_document)
         logger.info(f"Created document: {db_document.id}")
         return db_document
     except Exception as e:
         logger.error(f"Error creating document: {e}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def get_document(db: Session, document_id: uuid.UUID) -> Optional[Document]:
-    """Get a document by ID"""
+async def create_documents_bulk(db: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+    """Insert many document rows in one multi-row INSERT and commit"""
+    if not rows:
+        return 0
+    
+    document_rows = [
+        {key: value for key, value in row.items() if key not in CONTENT_FIELDS}
+        for row in rows
+    ]
+    content_rows = [
+        {"document_id": row["id"], "raw_text": row.get("raw_text"), "summary": row.get("summary")}
+        for row in rows
+    ]
+    
     try:
-        return db.query(Document).filter(Document.id == document_id).first()
+        await db.execute(insert(Document), document_rows)
+        await db.execute(insert(DocumentContent), content_rows)
+        await apply_stats_delta(db, rows)
+        await index_documents(db, rows)
+        await bump_document_versions(db, [row.get("user_id") for row in rows])
+        await db.commit()
+        similarity_indexer.schedule(rows)
+        logger.info(f"Created {len(rows)} documents in bulk")
+        return len(rows)
+    except Exception as e:
+        logger.error(f"Error creating {len(rows)} documents in bulk: {e}")
+        await db.rollback()
+        raise
+
+async def get_document(
+    db: AsyncSession,
+    document_id: uuid.UUID,
+    include_content: bool = False
+) -> Optional[Document]:
+    """Get a document by ID, optionally loading its raw text and summary"""
+    try:
+        query = select(Document).where(Document.id == document_id)
+        
+        if include_content:
+            query = query.options(selectinload(Document.content))
+        
+        result = await db.execute(query)
+        return result.scalars().first()
     except Exception as e:
         logger.error(f"Error getting document {document_id}: {e}")
         raise
 
-def get_documents(
-    db: Session, 
-    skip: int = 0, 
+async def get_documents(
+    db: AsyncSession,
+    skip: int = 0,
     limit: int = 100,
     user_id: Optional[str] = None,
-    label_filter: Optional[str] = None
+    label_filter: Optional[str] = None,
+    include_content: bool = False
 ) -> List[Document]:
     """Get documents with pagination and optional filters"""
     try:
-        query = db.query(Document)
+        query = select(Document)
+        
+        if include_content:
+            query = query.options(selectinload(Document.content))
         
         if user_id:
-            query = query.filter(Document.user_id == user_id)
+            query = query.where(Document.user_id == user_id)
         
         if label_filter:
-            query = query.filter(Document.label == label_filter)
+            query = query.where(Document.label == label_filter)
         
-        return (
+        result = await db.execute(
             query
             .order_by(desc(Document.created_at))
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
     except Exception as e:
         logger.error(f"Error getting documents for user {user_id}: {e}")
         raise
 
-def get_documents_count(
-    db: Session,
+# Columns returned by history listings; raw_text and summary are left out
+DOCUMENT_LIST_COLUMNS = (
+    Document.id,
+    Document.filename,
+    Document.label,
+    Document.confidence,
+    Document.override_reason,
+    Document.disagreement,
+    Document.created_at,
+)
+
+async def get_documents_page(
+    db: AsyncSession,
+    user_id: str,
+    limit: int = 50,
+    cursor: Optional[Tuple[datetime, uuid.UUID]] = None,
+    label_filter: Optional[str] = None
+) -> Tuple[List[Any], bool]:
+    """Get one keyset page of a user's documents, newest first
+    
+    Returns the rows (compact projection) and whether more rows follow.
+    """
+    try:
+        query = select(*DOCUMENT_LIST_COLUMNS).where(Document.user_id == user_id)
+        
+        if label_filter:
+            query = query.where(Document.label == label_filter)
+        
+        if cursor:
+            cursor_created_at, cursor_id = cursor
+            query = query.where(
+                or_(
+                    Document.created_at < cursor_created_at,
+                    and_(Document.created_at == cursor_created_at, Document.id < cursor_id)
+                )
+            )
+        
+        result = await db.execute(
+            query
+            .order_by(desc(Document.created_at), desc(Document.id))
+            .limit(limit + 1)
+        )
+        rows = list(result.all())
+        return rows[:limit], len(rows) > limit
+    except Exception as e:
+        logger.error(f"Error getting documents page for user {user_id}: {e}")
+        raise
+
+async def get_documents_count(
+    db: AsyncSession,
     user_id: Optional[str] = None,
     label_filter: Optional[str] = None
 ) -> int:
     """Get total count of documents with optional filters"""
     try:
-        query = db.query(func.count(Document.id))
+        query = select(func.count(Document.id))
         
         if user_id:
-            query = query.filter(Document.user_id == user_id)
+            query = query.where(Document.user_id == user_id)
         
         if label_filter:
-            query = query.filter(Document.label == label_filter)
+            query = query.where(Document.label == label_filter)
         
-        return query.scalar()
+        return await db.scalar(query)
     except Exception as e:
         logger.error(f"Error getting documents count for user {user_id}: {e}")
         raise
 
-def update_document(
-    db: Session, 
-    document_id: uuid.UUID, 
+async def update_document(
+    db: AsyncSession,
+    document_id: uuid.UUID,
     document_update: DocumentUpdate
 ) -> Optional[Document]:
     """Update a document record"""
     try:
-        db_document = get_document(db, document_id)
+        update_data = document_update.model_dump(exclude_unset=True)
+        reindex = any(field in update_data for field in SEARCH_FIELDS)
+        include_content = reindex or any(field in update_data for field in CONTENT_FIELDS)
+        
+        db_document = await get_document(db, document_id, include_content=include_content)
         if not db_document:
             return None
         
-        update_data = document_update.model_dump(exclude_unset=True)
+        previous_user_id = db_document.user_id
+        affects_stats = any(field in update_data for field in STATS_FIELDS)
+        if affects_stats:
+            await apply_stats_delta(
+                db, [{field: getattr(db_document, field) for field in STATS_FIELDS}], sign=-1
+            )
+        
         for field, value in update_data.items():
             setattr(db_document, field, value)
         
-        db.commit()
-        db.refresh(db_document)
+        if affects_stats:
+            await apply_stats_delta(db, [db_document])
+        
+        if reindex:
+            search_fields = _search_fields(db_document)
+            await remove_from_index(db, [document_id])
+            await index_documents(db, [search_fields])
+        
+        await bump_document_versions(db, [previous_user_id, db_document.user_id])
+        await db.commit()
+        
+        if reindex:
+            similarity_indexer.remove(previous_user_id, [document_id])
+            similarity_indexer.schedule([search_fields])
+        
+        await db.refresh(db_document)
         logger.info(f"Updated document: {document_id}")
         return db_document
     except Exception as e:
         logger.error(f"Error updating document {document_id}: {e}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def delete_document(db: Session, document_id: uuid.UUID) -> bool:
+async def delete_document(db: AsyncSession, document_id: uuid.UUID) -> bool:
     """Delete a document record"""
     try:
-        db_document = get_document(db, document_id)
+        db_document = await get_document(db, document_id)
         if not db_document:
             return False
         
-        db.delete(db_document)
-        db.commit()
+        await apply_stats_delta(db, [db_document], sign=-1)
+        await remove_from_index(db, [document_id])
+        
+        # Content rows are removed explicitly; SQLite does not enforce ON DELETE CASCADE
+        await db.execute(delete(DocumentContent).where(DocumentContent.document_id == document_id))
+        await bump_document_versions(db, [db_document.user_id])
+        await db.delete(db_document)
+        await db.commit()
+        similarity_indexer.remove(db_document.user_id, [document_id])
         logger.info(f"Deleted document: {document_id}")
         return True
     except Exception as e:
         logger.error(f"Error deleting document {document_id}: {e}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def get_recent_documents(
-    db: Session, 
+async def get_recent_documents(
+    db: AsyncSession,
     limit: int = 10,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    include_content: bool = False
 ) -> List[Document]:
     """Get most recent documents"""
     try:
-        query = db.query(Document)
+        query = select(Document)
+        
+        if include_content:
+            query = query.options(selectinload(Document.content))
         
         if user_id:
-            query = query.filter(Document.user_id == user_id)
+            query = query.where(Document.user_id == user_id)
         
-        return (
+        result = await db.execute(
             query
             .order_by(desc(Document.created_at))
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
     except Exception as e:
         logger.error(f"Error getting recent documents for user {user_id}: {e}")
         raise
 
-def get_documents_by_label(
-    db: Session, 
+async def get_documents_by_label(
+    db: AsyncSession,
     label: str,
     limit: int = 50,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    include_content: bool = False
 ) -> List[Document]:
     """Get documents by label"""
     try:
-        query = db.query(Document).filter(Document.label == label)
+        query = select(Document).where(Document.label == label)
+        
+        if include_content:
+            query = query.options(selectinload(Document.content))
         
         if user_id:
-            query = query.filter(Document.user_id == user_id)
+            query = query.where(Document.user_id == user_id)
         
-        return (
+        result = await db.execute(
             query
             .order_by(desc(Document.created_at))
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
     except Exception as e:
         logger.error(f"Error getting documents by label {label}: {e}")
         raise
+
+async def stream_documents(
+    db: AsyncSession,
+    user_id: str,
+    label_filter: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    include_content: bool = False,
+    batch_size: int = 1000
+) -> AsyncIterator[List[Any]]:
+    """Stream a user's documents oldest first in batches from a server-side cursor"""
+    columns = list(DOCUMENT_LIST_COLUMNS)
+    if include_content:
+        columns += [DocumentContent.summary, DocumentContent.raw_text]
+    
+    query = select(*columns).where(Document.user_id == user_id)
+    
+    if include_content:
+        query = query.outerjoin(DocumentContent, DocumentContent.document_id == Document.id)
+    
+    if label_filter:
+        query = query.where(Document.label == label_filter)
+    
+    if start_date:
+        query = query.where(
+            Document.created_at >= datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+        )
+    if end_date:
+        query = query.where(
+            Document.created_at < datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc)
+        )
+    
+    result = await db.stream(
+        query
+        .order_by(Document.created_at, Document.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for partition in result.partitions():
+        yield partition
+
+async def search_documents(
+    db: AsyncSession,
+    user_id: str,
+    query: str,
+    limit: int = 20,
+    offset: int = 0
+) -> List[Tuple[Document, float]]:
+    """Full-text search a user's documents, returning (document, rank) best first"""
+    try:
+        ranked = await search_document_ids(db, user_id, query, limit=limit, offset=offset)
+        if not ranked:
+            return []
+        
+        result = await db.execute(
+            select(Document)
+            .options(selectinload(Document.content))
+            .where(Document.id.in_([document_id for document_id, _ in ranked]))
+        )
+        documents = {document.id: document for document in result.scalars().all()}
+        
+        return [
+            (documents[document_id], rank)
+            for document_id, rank in ranked if document_id in documents
+        ]
+    except Exception as e:
+        logger.error(f"Error searching documents for user {user_id}: {e}")
+        raise
+
+async def find_similar_documents(
+    db: AsyncSession,
+    user_id: str,
+    document_id: uuid.UUID,
+    limit: int = 10
+) -> Optional[List[Tuple[Any, float]]]:
+    """Get a user's documents most similar to one of theirs, as (row, score)
+    
+    Returns None if the document does not exist or belongs to another user.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        index = similarity_indexer.get_index(user_id)
+        vector = await loop.run_in_executor(None, index.get_vector, document_id) if index else None
+        
+        # Not embedded yet (or indexed before similarity search existed): embed on the fly
+        if vector is None:
+            document = await get_document(db, document_id, include_content=True)
+            if document is None or document.user_id != user_id:
+                return None
+            
+            text = document.raw_text or document.summary
+            if index is None or not text:
+                return []
+            
+            from model.embeddings import embed_texts
+            vector = (await loop.run_in_executor(None, embed_texts, [text]))[0]
+        
+        hits = await loop.run_in_executor(None, index.search, vector, limit, document_id)
+        if not hits:
+            return []
+        
+        result = await db.execute(
+            select(*DOCUMENT_LIST_COLUMNS)
+            .where(Document.id.in_([hit_id for hit_id, _ in hits]))
+            .where(Document.user_id == user_id)
+        )
+        rows = {row.id: row for row in result.all()}
+        
+        return [(rows[hit_id], score) for hit_id, score in hits if hit_id in rows]
+    except Exception as e:
+        logger.error(f"Error finding documents similar to {document_id}: {e}")
+        raise
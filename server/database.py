@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
@@ -8,17 +10,72 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create SQLAlchemy engine
+# Async drivers used for each sync backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url() -> str:
+    """Get the async database URL, deriving it from DATABASE_URL if needed"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    
+    url = make_url(settings.DATABASE_URL)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend: {backend}")
+    
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    
+    # asyncpg takes "ssl" rather than libpq's "sslmode"
+    if backend == "postgresql" and "sslmode" in url.query:
+        query = dict(url.query)
+        query["ssl"] = query.pop("sslmode")
+        url = url.set(query=query)
+    
+    return url.render_as_string(hide_password=False)
+
+def get_pool_options(database_url: str) -> dict:
+    """Get connection pool options from settings (SQLite keeps its default pool)"""
+    if make_url(database_url).get_backend_name() == "sqlite":
+        return {}
+    
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+# Create SQLAlchemy engine (used for schema setup and scripts)
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    echo=settings.DEBUG
+    echo=settings.DEBUG,
+    **get_pool_options(settings.DATABASE_URL)
 )
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async engine (used by the API routers)
+ASYNC_DATABASE_URL = get_async_database_url()
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=settings.DEBUG,
+    **get_pool_options(ASYNC_DATABASE_URL)
+)
+
+# Create AsyncSessionLocal class; objects stay usable after commit since
+# async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -34,12 +91,75 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            await db.rollback()
+            raise
+
+# Tables derived from documents, backfilled once by init_db.py; rows added
+# by the API only cover documents created after the table existed
+BACKFILLS = ("stats_rollup", "search_index")
+
+def get_pending_backfills(conn) -> list:
+    """Backfills not yet recorded in schema_migrations"""
+    from models import SchemaMigration
+    applied = set(conn.execute(select(SchemaMigration.name)).scalars())
+    return [name for name in BACKFILLS if name not in applied]
+
+def mark_backfilled(conn, names) -> None:
+    """Record backfills as applied inside the caller's transaction"""
+    from models import SchemaMigration
+    if names:
+        conn.execute(insert(SchemaMigration), [{"name": name} for name in names])
+
+def _check_backfills():
+    """Mark backfills done on a database without documents; warn when they are due"""
+    from sqlalchemy.exc import IntegrityError
+    from models import Document
+    with engine.connect() as conn:
+        pending = get_pending_backfills(conn)
+        if not pending:
+            return
+        if conn.execute(select(Document.id).limit(1)).first() is not None:
+            logger.warning(
+                f"Backfills pending ({', '.join(pending)}): stats and search miss older "
+                f"documents until 'python init_db.py' is run"
+            )
+            return
+    try:
+        with engine.begin() as conn:
+            mark_backfilled(conn, pending)
+    except IntegrityError:
+        pass  # another worker recorded them first
+
 # Initialize database tables
 def init_db():
     """Create all tables in the database"""
     try:
         Base.metadata.create_all(bind=engine)
+        
+        # create_all skips tables that already exist, so add newer indexes explicitly
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        
+        # Search tables use backend-specific DDL (tsvector/GIN or FTS5)
+        from search import create_search_index
+        with engine.begin() as conn:
+            create_search_index(conn)
+        
+        _check_backfills()
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
         raise
+
+async def close_db():
+    """Dispose of pooled connections on shutdown"""
+    await async_engine.dispose()
+    engine.dispose()
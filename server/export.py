@@ -0,0 +1,189 @@
+"""
+Streaming exports of a user's classification history.
+Rows are read from a server-side cursor in EXPORT_BATCH_SIZE batches and
+serialized batch by batch, so an export of any size keeps the API worker's
+memory flat.
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from config import settings
+from crud import stream_documents
+from database import AsyncSessionLocal
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency; parquet exports are unavailable without it
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ["id", "filename", "label", "confidence", "override_reason", "disagreement", "created_at"]
+CONTENT_COLUMNS = ["summary", "raw_text"]
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def parquet_available() -> bool:
+    return pyarrow is not None
+
+def _export_value(value: Any) -> Any:
+    """Convert a column value to a CSV/JSON friendly type"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+async def _to_csv(batches: AsyncIterator[List[Any]], columns: List[str]) -> AsyncIterator[bytes]:
+    """Serialize batches as CSV with a header row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    async for batch in batches:
+        writer.writerows([_export_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+async def _to_ndjson(batches: AsyncIterator[List[Any]], columns: List[str]) -> AsyncIterator[bytes]:
+    """Serialize batches as one JSON object per line"""
+    async for batch in batches:
+        yield "".join(
+            json.dumps({column: _export_value(value) for column, value in zip(columns, row)}) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+class _ChunkSink:
+    """Write-only file object that buffers Parquet output until it is drained"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def _parquet_schema(columns: List[str]):
+    types = {
+        "id": pyarrow.string(),
+        "filename": pyarrow.string(),
+        "label": pyarrow.string(),
+        "confidence": pyarrow.float64(),
+        "override_reason": pyarrow.string(),
+        "disagreement": pyarrow.bool_(),
+        "created_at": pyarrow.timestamp("us", tz="UTC"),
+        "summary": pyarrow.string(),
+        "raw_text": pyarrow.string(),
+    }
+    return pyarrow.schema([(column, types[column]) for column in columns])
+
+async def _to_parquet(batches: AsyncIterator[List[Any]], columns: List[str]) -> AsyncIterator[bytes]:
+    """Serialize batches as a zstd-compressed Parquet file, one row group at a time"""
+    schema = _parquet_schema(columns)
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    pending: Dict[str, List[Any]] = {column: [] for column in columns}
+    pending_rows = 0
+
+    def write_row_group():
+        nonlocal pending_rows
+        if "id" in pending:
+            pending["id"] = [str(value) for value in pending["id"]]
+        writer.write_table(pyarrow.table(pending, schema=schema))
+        for values in pending.values():
+            values.clear()
+        pending_rows = 0
+
+    try:
+        async for batch in batches:
+            for row in batch:
+                for column, value in zip(columns, row):
+                    pending[column].append(value)
+            pending_rows += len(batch)
+
+            if pending_rows >= settings.EXPORT_PARQUET_ROW_GROUP_SIZE:
+                write_row_group()
+                yield sink.drain()
+
+        if pending_rows:
+            write_row_group()
+    finally:
+        writer.close()
+
+    yield sink.drain()
+
+EXPORT_WRITERS = {
+    "csv": _to_csv,
+    "ndjson": _to_ndjson,
+    "parquet": _to_parquet,
+}
+
+async def _iter_batches(
+    user_id: str,
+    label_filter: Optional[str],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    include_content: bool
+) -> AsyncIterator[List[Any]]:
+    # The export outlives the request handler, so it holds its own session
+    async with AsyncSessionLocal() as db:
+        async for batch in stream_documents(
+            db,
+            user_id,
+            label_filter=label_filter,
+            start_date=start_date,
+            end_date=end_date,
+            include_content=include_content,
+            batch_size=settings.EXPORT_BATCH_SIZE
+        ):
+            yield batch
+
+async def export_documents(
+    export_format: str,
+    user_id: str,
+    label_filter: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    include_content: bool = False
+) -> AsyncIterator[bytes]:
+    """Stream a user's documents serialized as csv, ndjson or parquet"""
+    columns = EXPORT_COLUMNS + (CONTENT_COLUMNS if include_content else [])
+    batches = _iter_batches(user_id, label_filter, start_date, end_date, include_content)
+
+    try:
+        async for chunk in EXPORT_WRITERS[export_format](batches, columns):
+            yield chunk
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated body
+        logger.error(f"Error exporting documents for user {user_id} as {export_format}: {e}")
+        raise
@@ -0,0 +1,53 @@
+"""
+Gunicorn configuration: preload the app, then fork the workers.
+The master imports main (which loads the ResNet) and preloads the
+summarizer and embedding model before forking, so every worker shares one
+copy of the read-only weights copy-on-write instead of loading its own.
+gc.freeze() keeps the collector from writing to those shared pages.
+Each worker then applies its slice of the thread budget (thread_budget.py).
+
+    gunicorn main:app
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty directory so /metrics merges
+every worker's samples.
+"""
+
+import gc
+import os
+from config import settings
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+loglevel = "info" if settings.DEBUG else "warning"
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker forks
+    from model_registry import model_registry
+    from routers.classify import preload_models
+    preload_models()
+    # The master never serves requests: keep what it preloaded for workers
+    # forked later, and leave idle unloading to each worker's own thread
+    model_registry.stop_reaper()
+    gc.collect()
+    gc.freeze()
+
+def pre_fork(server, worker):
+    # Give each worker the lowest free slot, so a restarted worker takes over
+    # its predecessor's CPU slice. During a reload (SIGHUP) the new workers
+    # start while the old ones still hold every slot; they share the old
+    # workers' slices round-robin until those exit.
+    taken = {getattr(other, "budget_slot", None) for other in server.WORKERS.values()}
+    free = next((slot for slot in range(server.num_workers) if slot not in taken), None)
+    worker.budget_slot = free if free is not None else len(server.WORKERS) % server.num_workers
+
+def post_fork(server, worker):
+    from thread_budget import apply_thread_budget
+    apply_thread_budget(worker_index=worker.budget_slot, worker_count=server.num_workers)
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -5,8 +5,11 @@ Run this to set up the database tables
 
 import asyncio
 import logging
-from database import init_db, engine
-from models import Document
+from sqlalchemy import Column, MetaData, Table, Text, UUID, inspect, insert, select, text
+from database import init_db, engine, get_pending_backfills, mark_backfilled
+from models import Document, DocumentContent
+from stats import rebuild_stats_rollup
+from search import rebuild_search_index
 from config import settings
 
 logging.basicConfig(level=logging.INFO)
@@ -19,8 +22,27 @@ def create_tables():
         init_db()
         logger.info("✅ Database tables created successfully!")
         
+        added = add_document_columns()
+        if added:
+            logger.info(f"✅ Added documents columns: {', '.join(added)}")
+        
+        moved = migrate_document_text()
+        if moved:
+            logger.info(f"✅ Moved text of {moved} documents into document_contents")
+        
+        # Backfill tables derived from documents, once per database; the API
+        # may already have filled them with documents created since
+        with engine.connect() as conn:
+            pending = get_pending_backfills(conn)
+        if "stats_rollup" in pending:
+            with engine.begin() as conn:
+                groups = rebuild_stats_rollup(conn)
+                mark_backfilled(conn, ["stats_rollup"])
+            logger.info(f"✅ Built stats rollup ({groups} rows)")
+        if "search_index" in pending:
+            rebuild_search(mark_backfilled_as="search_index")
+        
         # Test connection
-        from sqlalchemy import text
         with engine.connect() as conn:
             result = conn.execute(text("SELECT 1"))
             logger.info("✅ Database connection test successful!")
@@ -29,6 +51,103 @@ def create_tables():
         logger.error(f"❌ Database setup failed: {e}")
         raise
 
+def _iter_searchable_documents(conn, batch_size: int = 500):
+    """Yield documents with decompressed text for (re)building the search index"""
+    contents = DocumentContent.__table__
+    result = conn.execute(
+        select(
+            Document.id,
+            Document.user_id,
+            Document.created_at,
+            Document.filename,
+            contents.c.summary,
+            contents.c.raw_text
+        )
+        .outerjoin(contents, contents.c.document_id == Document.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in result.mappings():
+        yield dict(row)
+
+def rebuild_search(mark_backfilled_as: str = None):
+    """Rebuild the full-text search index from stored documents"""
+    # Read and write on separate connections so the streaming read stays open
+    with engine.connect() as read_conn, engine.begin() as write_conn:
+        indexed = rebuild_search_index(write_conn, _iter_searchable_documents(read_conn))
+        if mark_backfilled_as:
+            mark_backfilled(write_conn, [mark_backfilled_as])
+    logger.info(f"✅ Built search index ({indexed} documents)")
+
+def add_document_columns() -> list:
+    """Add columns introduced after the documents table was first created"""
+    existing = {column["name"] for column in inspect(engine).get_columns("documents")}
+    missing = [column for column in Document.__table__.columns if column.name not in existing]
+    
+    with engine.begin() as conn:
+        for column in missing:
+            column_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE documents ADD COLUMN {column.name} {column_type}"))
+    
+    return [column.name for column in missing]
+
+def migrate_document_text(batch_size: int = 1000) -> int:
+    """Move inline raw_text/summary columns from documents into document_contents
+    
+    Rows are copied (compressed) in id-ordered batches, then the old columns
+    are dropped. Safe to re-run: already-copied rows are skipped and the
+    migration is a no-op once the columns are gone.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("documents")}
+    legacy_columns = [name for name in ("raw_text", "summary") if name in columns]
+    if not legacy_columns:
+        return 0
+    
+    logger.info(f"Migrating {', '.join(legacy_columns)} out of the documents table...")
+    legacy_documents = Table(
+        "documents",
+        MetaData(),
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        *[Column(name, Text) for name in legacy_columns]
+    )
+    contents = DocumentContent.__table__
+    
+    moved = 0
+    last_id = None
+    while True:
+        with engine.begin() as conn:
+            query = select(legacy_documents).order_by(legacy_documents.c.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(legacy_documents.c.id > last_id)
+            
+            rows = conn.execute(query).mappings().all()
+            if not rows:
+                break
+            
+            existing = set(conn.execute(
+                select(contents.c.document_id)
+                .where(contents.c.document_id.in_([row["id"] for row in rows]))
+            ).scalars())
+            
+            new_rows = [
+                {
+                    "document_id": row["id"],
+                    "raw_text": row.get("raw_text"),
+                    "summary": row.get("summary")
+                }
+                for row in rows if row["id"] not in existing
+            ]
+            if new_rows:
+                conn.execute(insert(contents), new_rows)
+            
+            moved += len(new_rows)
+            last_id = rows[-1]["id"]
+    
+    with engine.begin() as conn:
+        for name in legacy_columns:
+            conn.execute(text(f"ALTER TABLE documents DROP COLUMN {name}"))
+    
+    return moved
+
 def drop_tables():
     """Drop all database tables (use with caution!)"""
     try:
@@ -49,6 +168,20 @@ if __name__ == "__main__":
     
     create_tables()
     
+    if len(sys.argv) > 1 and sys.argv[1] == "--rebuild-stats":
+        with engine.begin() as conn:
+            groups = rebuild_stats_rollup(conn)
+        logger.info(f"✅ Rebuilt stats rollup ({groups} rows)")
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "--rebuild-search":
+        rebuild_search()
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "--rebuild-embeddings":
+        from similarity import similarity_indexer
+        with engine.connect() as conn:
+            indexed = similarity_indexer.rebuild(_iter_searchable_documents(conn))
+        logger.info(f"✅ Rebuilt similarity index ({indexed} documents)")
+    
     print("\n🎯 Database setup complete!")
     print(f"Database URL: {settings.DATABASE_URL}")
     print("\nYou can now start the API server with:")
@@ -1,14 +1,16 @@
-from fastapi import FastAPI, File, UploadFile, Depends
+from fastapi import FastAPI, File, UploadFile, Depends, Response
 from contextlib import asynccontextmanager
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
+import asyncio
 import logging
 import uvicorn
 
 # Import configuration and database
 from config import settings
-from database import init_db, get_db
+from database import init_db, get_async_db, close_db
 from middleware import setup_middleware
+from metrics import render_metrics
 from routers import classify_router, history_router
 from routers.auth import router as auth_router, get_current_user
 
@@ -26,10 +28,25 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Starting Document Classifier API...")
     
     try:
+        # gunicorn workers got their slice in post_fork; otherwise this process
+        # takes a 1/WORKERS share, pinned only when it is the only worker
+        from thread_budget import apply_thread_budget, get_thread_layout
+        if get_thread_layout() is None:
+            apply_thread_budget(worker_count=settings.WORKERS, pin=settings.PIN_WORKER_CPUS and settings.WORKERS == 1)
+        
         # Initialize database
         init_db()
         logger.info("✅ Database initialized")
         
+        if settings.WRITE_BEHIND_ENABLED:
+            from write_buffer import document_buffer
+            document_buffer.start()
+        
+        if settings.PRELOAD_MODELS:
+            # No-op in gunicorn workers, whose master already preloaded them
+            from routers.classify import preload_models
+            await asyncio.to_thread(preload_models)
+        
         # Cleanup old temp files on startup
         from utils.file_ops import file_ops
         cleaned = file_ops.cleanup_temp_dir(max_age_hours=1)
@@ -55,6 +72,26 @@ async def lifespan(app: FastAPI):
         logger.info(f"🧹 Final cleanup: removed {cleaned} temporary files")
     except Exception as e:
         logger.warning(f"Cleanup warning: {e}")
+    
+    if settings.WRITE_BEHIND_ENABLED:
+        try:
+            from write_buffer import document_buffer
+            await document_buffer.stop()
+            logger.info("💾 Flushed write-behind buffer")
+        except Exception as e:
+            logger.warning(f"Write-behind flush warning: {e}")
+    
+    try:
+        from similarity import similarity_indexer
+        similarity_indexer.stop()
+    except Exception as e:
+        logger.warning(f"Similarity indexer shutdown warning: {e}")
+    
+    try:
+        await close_db()
+        logger.info("🔌 Database connections closed")
+    except Exception as e:
+        logger.warning(f"Database shutdown warning: {e}")
 
 # Create FastAPI application
 app = FastAPI(
@@ -87,22 +124,40 @@ async def root():
         "auth": "/api/v1/auth",
         "health": "/api/v1/health",
         "classify": "/api/v1/classify",
-        "history": "/api/v1/history"
+        "history": "/api/v1/history",
+        "metrics": "/metrics"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # Legacy classify endpoint (for backward compatibility)
 @app.post("/classify")
 async def legacy_classify_endpoint(
+    response: Response,
     file: UploadFile = File(...),
     current_user = Depends(get_current_user),
     save_to_db: bool = True,
-    db: Session = Depends(get_db)
+    include_timings: bool = False,
+    profile: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Legacy endpoint - forwards to new classify endpoint"""
     from routers.classify import classify_document
     
     # Forward to the new classify endpoint
-    return await classify_document(file, current_user, save_to_db, db)
+    return await classify_document(
+        response,
+        file=file,
+        current_user=current_user,
+        save_to_db=save_to_db,
+        include_timings=include_timings,
+        profile=profile,
+        db=db
+    )
 
 if __name__ == "__main__":
     uvicorn.run(
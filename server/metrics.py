@@ -0,0 +1,161 @@
+"""
+Prometheus metrics for the classification pipeline.
+Stage latencies, override counts, timeouts and model load times are
+recorded where they happen. Cache hit counters and queue depths are read
+from their owners at scrape time, through register_cache and
+register_queue, so this module imports nothing from the rest of the app.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+METRIC_PREFIX = "doc_classifier"
+
+# Pipeline stages take from milliseconds (heuristics) to tens of seconds (LLM)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+STAGE_LATENCY = Histogram(
+    f"{METRIC_PREFIX}_stage_duration_seconds",
+    "Time spent in each classification pipeline stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+REQUEST_LATENCY = Histogram(
+    f"{METRIC_PREFIX}_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS
+)
+CLASSIFICATIONS = Counter(
+    f"{METRIC_PREFIX}_classifications_total",
+    "Completed classifications by override reason",
+    ["override_reason"]
+)
+TIMEOUTS = Counter(
+    f"{METRIC_PREFIX}_timeouts_total",
+    "Functions run through TimeoutManager that timed out",
+    ["function"]
+)
+FAILURES = Counter(
+    f"{METRIC_PREFIX}_failures_total",
+    "Functions run through TimeoutManager that raised",
+    ["function"]
+)
+WRITE_BEHIND_DROPPED = Counter(
+    f"{METRIC_PREFIX}_write_behind_dropped_total",
+    "Queued documents the write-behind buffer dropped because the database rejected them"
+)
+MODEL_LOAD_SECONDS = Gauge(
+    f"{METRIC_PREFIX}_model_load_seconds",
+    "Time taken by the most recent load of each model",
+    ["model"]
+)
+PAGES = Counter(
+    f"{METRIC_PREFIX}_pages_total",
+    "Document pages read, by where their text came from (text_layer or ocr)",
+    ["source"]
+)
+MODEL_RESIDENT_BYTES = Gauge(
+    f"{METRIC_PREFIX}_model_resident_bytes",
+    "Weights held in memory by each model in the model registry (0 while unloaded)",
+    ["model"]
+)
+MODEL_UNLOADS = Counter(
+    f"{METRIC_PREFIX}_model_unloads_total",
+    "Models unloaded by the model registry, by reason",
+    ["model", "reason"]
+)
+
+# Per-request stage durations in milliseconds, collected by time_stage
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+def start_stage_timings() -> Dict[str, float]:
+    """Start collecting the current request's stage durations (milliseconds)"""
+    timings: Dict[str, float] = {}
+    _stage_timings.set(timings)
+    return timings
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """Record the duration of a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed * 1000, 1)
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Format stage durations as a Server-Timing header value"""
+    return ", ".join(f"{stage};dur={duration}" for stage, duration in timings.items())
+
+@contextmanager
+def time_model_load(model: str) -> Iterator[None]:
+    """Record how long loading a model took"""
+    start = time.perf_counter()
+    yield
+    MODEL_LOAD_SECONDS.labels(model=model).set(time.perf_counter() - start)
+
+class _ScrapeTimeCollector:
+    """Reads cache counters and queue depths from their owners on each scrape"""
+
+    def __init__(self):
+        self.caches: Dict[str, object] = {}
+        self.queues: Dict[str, Callable[[], int]] = {}
+
+    def collect(self):
+        hits = CounterMetricFamily(
+            f"{METRIC_PREFIX}_cache_hits", "Cache lookups that found a fresh entry", labels=["cache"]
+        )
+        misses = CounterMetricFamily(
+            f"{METRIC_PREFIX}_cache_misses", "Cache lookups that found nothing", labels=["cache"]
+        )
+        sizes = GaugeMetricFamily(
+            f"{METRIC_PREFIX}_cache_entries", "Entries currently cached", labels=["cache"]
+        )
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            sizes.add_metric([name], stats["size"])
+
+        depths = GaugeMetricFamily(
+            f"{METRIC_PREFIX}_queue_depth", "Work items waiting in background queues and executors", labels=["queue"]
+        )
+        for name, depth in self.queues.items():
+            depths.add_metric([name], depth())
+
+        yield from (hits, misses, sizes, depths)
+
+_scrape_time_collector = _ScrapeTimeCollector()
+REGISTRY.register(_scrape_time_collector)
+
+def register_cache(name: str, cache) -> None:
+    """Expose a cache's stats() hit/miss counters as metrics"""
+    _scrape_time_collector.caches[name] = cache
+
+def register_queue(name: str, depth: Callable[[], int]) -> None:
+    """Expose a queue depth, read by calling depth() on each scrape"""
+    _scrape_time_collector.queues[name] = depth
+
+def render_metrics() -> tuple:
+    """Get the exposition body and content type for the /metrics endpoint"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Several uvicorn/gunicorn workers: merge the per-process files
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_scrape_time_collector)  # this worker's caches and queues only
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
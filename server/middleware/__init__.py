@@ -1,4 +1,4 @@
 # Middleware package initialization
-from .cors import setup_cors, setup_security_headers, setup_request_logging, setup_middleware
+from .cors import setup_cors, setup_security_headers, setup_request_logging, setup_metrics, setup_middleware
 
-__all__ = ['setup_cors', 'setup_security_headers', 'setup_request_logging', 'setup_middleware']
+__all__ = ['setup_cors', 'setup_security_headers', 'setup_request_logging', 'setup_metrics', 'setup_middleware']
@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from config import settings
+from metrics import REQUEST_LATENCY
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -72,10 +74,33 @@ def setup_request_logging(app: FastAPI) -> None:
     
     logger.info("Request logging middleware configured")
 
+def setup_metrics(app: FastAPI) -> None:
+    """Add request latency metrics middleware (always on, unlike request logging)"""
+    
+    @app.middleware("http")
+    async def record_request_metrics(request, call_next):
+        start_time = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Label by route template so path parameters do not explode cardinality
+            route = request.scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=request.method,
+                route=route.path if route is not None else "unmatched",
+                status=str(status)
+            ).observe(time.perf_counter() - start_time)
+    
+    logger.info("Request metrics middleware configured")
+
 def setup_middleware(app: FastAPI) -> None:
     """Setup all middleware for the application"""
     setup_cors(app)
     setup_security_headers(app)
+    setup_metrics(app)
     
     if settings.DEBUG:
         setup_request_logging(app)
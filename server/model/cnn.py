@@ -0,0 +1,68 @@
+import torch
+import torch.nn as nn
+from torchvision import models, transforms
+import os
+from config import settings
+from model.decode import load_images as decode_images
+from model.pages import aggregate_page_predictions
+
+# ✅ Class index mapping (RVL-CDIP)
+class_map = {
+    0: "Advertisement", 1: "Budget", 2: "Email", 3: "File Folder", 4: "Form",
+    5: "Handwritten", 6: "Invoice", 7: "Letter", 8: "Memo", 9: "News Article",
+    10: "Presentation", 11: "Questionnaire", 12: "Resume", 13: "Scientific Publication",
+    14: "Scientific Report", 15: "Specification"
+}
+
+# ✅ Image preprocessing
+INPUT_SIZE = (224, 224)
+
+transform = transforms.Compose([
+    transforms.Resize(INPUT_SIZE),
+    transforms.ToTensor(),
+])
+
+# ✅ Read weights; safetensors and mmap=True map the file instead of copying it,
+# so every worker on the node shares one copy through the page cache
+def load_state_dict(model_path):
+    if model_path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        return load_file(model_path, device="cpu")
+    return torch.load(model_path, map_location="cpu", mmap=settings.MODEL_MMAP, weights_only=True)
+
+# ✅ Load model
+def load_model(model_path):
+    # Build on the meta device and assign the loaded tensors as the parameters,
+    # rather than allocating random weights and copying over them
+    with torch.device("meta"):
+        model = models.resnet18(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, 16)
+    model.load_state_dict(load_state_dict(model_path), assign=True)
+    model.eval()
+    return model
+
+# ✅ Decode image for the CNN, at reduced resolution where the format allows
+def load_image(image_path):
+    return decode_images(image_path, INPUT_SIZE)[0]
+
+# ✅ Decode the first CNN_MAX_PAGES pages of a PDF or multi-page TIFF
+def load_images(image_path):
+    return decode_images(image_path, INPUT_SIZE, settings.CNN_MAX_PAGES)
+
+# ✅ Predict document type (from a path or an already decoded image)
+def predict_image(model, image):
+    if isinstance(image, (str, os.PathLike)):
+        image = load_image(image)
+    return predict_images(model, [image])[0]
+
+# ✅ Predict a document's type from its pages in one forward pass
+def predict_document(model, images):
+    return aggregate_page_predictions(predict_images(model, images))
+
+# ✅ Predict document types for a batch of decoded images in one forward pass
+def predict_images(model, images):
+    input_tensor = torch.stack([transform(image) for image in images])
+    with torch.no_grad():
+        output = model(input_tensor)
+        confidences, indices = torch.softmax(output, dim=1).max(dim=1)
+    return [(class_map[index], confidence) for index, confidence in zip(indices.tolist(), confidences.tolist())]
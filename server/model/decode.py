@@ -0,0 +1,114 @@
+import logging
+from PIL import Image
+from config import settings
+from metrics import PAGES
+from model.pages import is_pdf, render_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+# ✅ Pillow's own bomb check (warning above the limit, error above twice it)
+# follows the same setting
+Image.MAX_IMAGE_PIXELS = settings.MAX_IMAGE_PIXELS
+
+# TIFF NewSubfileType bit marking a reduced-resolution copy of a page
+REDUCED_RESOLUTION_SUBFILE = 0x1
+
+class ImageTooLargeError(ValueError):
+    """The image has more pixels than MAX_IMAGE_PIXELS allows"""
+
+def _check_pixels(image):
+    width, height = image.size
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Image of {width}x{height} pixels exceeds the {settings.MAX_IMAGE_PIXELS} pixel limit"
+        )
+
+# ✅ Open an image (header only) and refuse decompression bombs before decoding
+def open_image(image_path):
+    try:
+        image = Image.open(image_path)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    try:
+        _check_pixels(image)
+    except ImageTooLargeError:
+        image.close()
+        raise
+    return image
+
+# ✅ Group a TIFF's frames into pages, reading IFD headers only: each page is
+# its full-resolution frame followed by any reduced-resolution copies of it
+def _tiff_pages(image, max_pages):
+    pages = []
+    frame = 0
+    while True:
+        try:
+            image.seek(frame)
+        except EOFError:
+            break
+        if image.tag_v2.get(254, 0) & REDUCED_RESOLUTION_SUBFILE and pages:
+            pages[-1].append(frame)
+        elif len(pages) == max_pages:
+            logger.info(f"TIFF has more than {max_pages} pages; processing the first {max_pages}")
+            break
+        else:
+            pages.append([frame])
+        frame += 1
+    return pages
+
+# ✅ Seek to the smallest copy of a page that still covers the target size
+def _seek_smallest_copy(image, frames, size):
+    best_frame, best_pixels = frames[0], None
+    for frame in frames:
+        image.seek(frame)
+        pixels = image.width * image.height
+        if best_pixels is None or (image.width >= size[0] and image.height >= size[1] and pixels < best_pixels):
+            best_frame, best_pixels = frame, pixels
+    image.seek(best_frame)
+    _check_pixels(image)
+
+# ✅ Box-reduce by the largest whole factor that keeps both sides at or above
+# the target; the CNN transform still resizes to the exact input size
+def _reduce_for_cnn(image, size):
+    if image.mode not in ("L", "LA", "RGB", "RGBA", "CMYK"):
+        image = image.convert("RGB")
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor > 1:
+        image = image.reduce(factor)
+    return image.convert("RGB")
+
+# ✅ Decode the first pages straight to small RGB images for the CNN's input
+# size: JPEG scales in the DCT, TIFF pyramids supply a smaller copy of each
+# page, PDF pages are rendered at just that size, and everything else is
+# box-reduced
+def load_images(image_path, size=(224, 224), max_pages=1):
+    if is_pdf(image_path):
+        return render_pdf_pages(image_path, max_pages, size=size)
+    with open_image(image_path) as image:
+        if image.format == "TIFF":
+            images = []
+            for frames in _tiff_pages(image, max_pages):
+                _seek_smallest_copy(image, frames, size)
+                images.append(_reduce_for_cnn(image, size))
+            return images
+        if image.format == "JPEG":
+            image.draft("RGB", size)
+        return [_reduce_for_cnn(image, size)]
+
+def load_image(image_path, size=(224, 224)):
+    return load_images(image_path, size)[0]
+
+# ✅ Full-resolution grayscale pages for OCR, one decoded at a time: a
+# multi-page TIFF (fax) is read frame by frame, never all at once
+def iter_image_pages(image_path, max_pages=None):
+    max_pages = max_pages or settings.TIFF_MAX_PAGES
+    with open_image(image_path) as image:
+        if image.format != "TIFF":
+            PAGES.labels(source="ocr").inc()
+            yield image.convert("L")
+            return
+        for frames in _tiff_pages(image, max_pages):
+            image.seek(frames[0])
+            _check_pixels(image)
+            PAGES.labels(source="ocr").inc()
+            yield image.convert("L")
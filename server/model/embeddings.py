@@ -0,0 +1,29 @@
+import numpy as np
+from config import settings
+from model_registry import model_registry
+
+# ✅ Sentence-embedding model (loaded on first use, unloaded by the registry when idle)
+def _load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(settings.EMBEDDING_MODEL, device="cpu")
+
+model_registry.register("embedding", _load_embedding_model, estimated_bytes=100_000_000)
+
+def get_embedding_model():
+    return model_registry.get("embedding")
+
+def get_embedding_dim():
+    return get_embedding_model().get_sentence_embedding_dimension()
+
+# ✅ Embed texts as unit-length float32 rows, so dot product is cosine similarity
+def embed_texts(texts):
+    texts = [(text or "")[:settings.EMBEDDING_TEXT_LIMIT] for text in texts]
+    with model_registry.use("embedding") as embedding_model:
+        vectors = embedding_model.encode(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+    return np.asarray(vectors, dtype=np.float32)
@@ -0,0 +1,26 @@
+# ✅ Heuristic detectors
+def heuristic_detect(text):
+    text_lower = text.lower()
+    heuristics = {
+        "Resume": ["work experience", "education", "skills", "certifications", "linkedin"],
+        "Invoice": ["invoice", "amount due", "total", "bill to", "payment terms"],
+        "Memo": ["interoffice memo", "subject:", "to:", "from:", "date:"],
+        "Email": ["subject:", "to:", "from:", "sent:", "cc:"],
+        "Letter": ["dear", "sincerely", "regards", "to whom it may concern"],
+        "Form": ["fill out", "checkbox", "signature", "date", "form number"],
+        "Questionnaire": ["survey", "question", "response", "rate", "agree"],
+        "Budget": ["budget", "fiscal year", "allocation", "expenditure", "forecast"],
+        "Presentation": ["slide", "agenda", "overview", "bullet points", "presentation"],
+        "News Article": ["byline", "headline", "reporter", "press", "breaking news"],
+        "Scientific Publication": ["abstract", "methodology", "results", "references", "doi"],
+        "Scientific Report": ["experiment", "data", "analysis", "conclusion", "report"],
+        "Specification": ["specification", "requirements", "parameters", "dimensions", "test"],
+        "Advertisement": ["sale", "discount", "offer", "limited time", "buy now"],
+        "File Folder": ["folder", "contents", "index", "file list", "archive"],
+        "Handwritten": ["handwritten", "pen", "ink", "cursive", "scribble"]
+    }
+
+    for label, keywords in heuristics.items():
+        if sum(kw in text_lower for kw in keywords) >= 3:
+            return label, 0.95
+    return None, None
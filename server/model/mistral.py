@@ -0,0 +1,33 @@
+from config import settings
+
+# llm mistral calling and getting the response
+def classify_with_mistral(text):
+    import requests
+    import json
+
+    prompt = f"""
+You are a document classification expert. Your task is to classify the following OCR-extracted document text into one of the following types:
+
+- Resume: Contains sections like 'Summary', 'Work Experience', 'Education', 'Skills', and personal contact info.
+- Memo: Internal communication with 'To:', 'From:', 'Subject:', and a date.
+- Letter: Formal communication with greetings like 'Dear', and closing like 'Sincerely'.
+- Specification: Technical document listing product specs, parameters, or test instructions.
+
+Return a JSON object with:
+- "document_type": one of the four labels above
+- "confidence": a float between 0 and 1
+- "reasoning": a short explanation of why you chose this label
+
+Document Text:
+{text}
+"""
+
+    try:
+        response = requests.post(
+            settings.OLLAMA_URL,  # Ollama or vLLM endpoint
+            json={"model": "mistral", "prompt": prompt, "stream": False}
+        )
+        if response.status_code == 200:
+            return json.loads(response.json()["response"])
+    except Exception:
+        return None
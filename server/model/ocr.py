@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import settings
+from model.decode import iter_image_pages
+from model.ocr_engines import create_ocr_engine
+from model.pages import is_pdf, iter_pdf_pages
+from profiling import profile_worker
+from thread_budget import get_thread_layout
+
+logger = logging.getLogger(__name__)
+
+# ✅ Page OCR pool, shared by every request in the process and created on
+# first use, after the worker has applied its thread budget
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+def _get_page_executor():
+    global _page_executor
+    if _page_executor is None:
+        with _page_executor_lock:
+            if _page_executor is None:
+                layout = get_thread_layout() or {}
+                workers = settings.OCR_PAGE_WORKERS or len(layout.get("cpus") or []) or 2
+                _page_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-page")
+    return _page_executor
+
+# ✅ OCR engine, chosen on first use; every OCR call runs on the page pool,
+# so one handle per pool thread is enough
+_ocr_engine = None
+_ocr_engine_lock = threading.Lock()
+
+def get_ocr_engine():
+    global _ocr_engine
+    if _ocr_engine is None:
+        with _ocr_engine_lock:
+            if _ocr_engine is None:
+                _ocr_engine = create_ocr_engine(pool_size=_get_page_executor()._max_workers)
+    return _ocr_engine
+
+def ocr_image(image):
+    return get_ocr_engine().image_to_text(image.convert("L"))
+
+# ✅ OCR pages in parallel as they are produced; at most one page per pool
+# thread is held in memory beyond the one being rendered. Pages that arrive
+# as text (a PDF text layer) skip OCR. At the deadline (time.monotonic())
+# no more pages are read, pages not OCR'd by then are left out, and the
+# text of the pages that finished is returned.
+def ocr_pages(pages, deadline=None):
+    executor = _get_page_executor()
+    ocr = profile_worker(ocr_image)
+    in_flight = deque()
+    results = []
+    pages = iter(pages)
+
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    try:
+        while remaining() != 0.0:
+            page = next(pages, None)
+            if page is None:
+                break
+            if isinstance(page, str):
+                results.append(page)
+                continue
+            if len(in_flight) >= executor._max_workers:
+                try:
+                    in_flight.popleft().result(timeout=remaining())
+                except FutureTimeoutError:
+                    break
+            future = executor.submit(ocr, page)
+            in_flight.append(future)
+            results.append(future)
+    finally:
+        # Closes the PDF when pages stop early
+        if hasattr(pages, "close"):
+            pages.close()
+
+    texts = []
+    for result in results:
+        if not isinstance(result, str):
+            try:
+                result = result.result(timeout=remaining())
+            except FutureTimeoutError:
+                # A page still queued never starts; one already running finishes unread
+                result.cancel()
+                continue
+        texts.append(result)
+    if remaining() == 0.0:
+        logger.warning(f"OCR stopped at its deadline with {len(texts)} pages done")
+    return "\n\n".join(text for text in texts if text)
+
+# ✅ OCR extraction, bounded by timeout seconds (OCR_TIMEOUT by default)
+def extract_text(image_path, timeout=None):
+    deadline = time.monotonic() + (timeout or settings.OCR_TIMEOUT)
+    if is_pdf(image_path):
+        return ocr_pages(iter_pdf_pages(image_path), deadline)
+    # Full resolution: the one decode that needs every pixel
+    return ocr_pages(iter_image_pages(image_path), deadline)
@@ -0,0 +1,108 @@
+import logging
+import os
+import queue
+import threading
+from config import settings
+from metrics import time_model_load
+
+logger = logging.getLogger(__name__)
+
+# ✅ tesserocr installs signal handlers on import, which only works on the
+# main thread, so it is imported here rather than on first use. An OpenMP
+# build of libtesseract reads OMP_THREAD_LIMIT once, as it loads, so it is
+# set to OCR_THREADS just for the import (torch's runtime is already up).
+def _import_tesserocr():
+    previous = os.environ.get("OMP_THREAD_LIMIT")
+    os.environ["OMP_THREAD_LIMIT"] = str(settings.OCR_THREADS)
+    try:
+        import tesserocr
+        return tesserocr
+    except ImportError:  # optional dependency; OCR runs the tesseract CLI through pytesseract without it
+        return None
+    finally:
+        if previous is None:
+            del os.environ["OMP_THREAD_LIMIT"]
+        else:
+            os.environ["OMP_THREAD_LIMIT"] = previous
+
+tesserocr = _import_tesserocr() if settings.OCR_ENGINE in ("auto", "tesserocr") else None
+
+# ✅ In-process libtesseract through tesserocr. An API handle keeps its
+# language data loaded, and recognition releases the GIL, so a pool of
+# handles lets pages be OCR'd in parallel without starting a process or
+# reloading the model per call. Each handle serves one thread at a time.
+class TesserocrEngine:
+    name = "tesserocr"
+
+    def __init__(self, pool_size):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.pool_size = max(1, pool_size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # The first handle is created now, so missing language data shows up here
+        self._idle.put(self._new_handle())
+
+    def _new_handle(self):
+        kwargs = {"lang": settings.OCR_LANG}
+        if settings.TESSDATA_PATH:
+            kwargs["path"] = settings.TESSDATA_PATH
+        with time_model_load("ocr"):
+            handle = tesserocr.PyTessBaseAPI(**kwargs)
+        self._created += 1
+        return handle
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.pool_size:
+                return self._new_handle()
+        return self._idle.get()
+
+    def image_to_text(self, image):
+        handle = self._acquire()
+        try:
+            handle.SetImage(image)
+            return handle.GetUTF8Text().strip()
+        finally:
+            handle.Clear()
+            self._idle.put(handle)
+
+# ✅ The tesseract CLI through pytesseract: a process per call, which loads
+# the language data each time
+class PytesseractEngine:
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
+        self._pytesseract = pytesseract
+
+    def image_to_text(self, image):
+        return self._pytesseract.image_to_string(image, lang=settings.OCR_LANG).strip()
+
+# ✅ Pick the engine once per process: OCR_ENGINE=tesserocr or pytesseract
+# forces one; auto uses tesserocr when it is installed and can load the
+# language data, and falls back to pytesseract otherwise
+def create_ocr_engine(pool_size):
+    engine = settings.OCR_ENGINE
+    if engine not in ("auto", "tesserocr", "pytesseract"):
+        raise ValueError(f"Unknown OCR_ENGINE: {engine}")
+
+    if engine in ("auto", "tesserocr"):
+        try:
+            ocr_engine = TesserocrEngine(pool_size)
+            version = tesserocr.tesseract_version().splitlines()[0]
+            logger.info(f"OCR engine: tesserocr ({version}), up to {ocr_engine.pool_size} handles")
+            return ocr_engine
+        except RuntimeError as e:
+            if engine == "tesserocr":
+                raise
+            logger.warning(f"In-process OCR unavailable ({e}); using the tesseract CLI")
+
+    logger.info(f"OCR engine: pytesseract ({settings.TESSERACT_CMD})")
+    return PytesseractEngine()
@@ -0,0 +1,110 @@
+import logging
+import threading
+import pypdfium2 as pdfium
+from config import settings
+from metrics import PAGES
+
+logger = logging.getLogger(__name__)
+
+PDF_POINTS_PER_INCH = 72
+
+# ✅ pdfium is not thread-safe, not even across documents: every call into it
+# holds this lock. Pages are rendered one at a time under it; OCR of rendered
+# pages runs outside it.
+_pdfium_lock = threading.Lock()
+
+class UnreadablePDFError(ValueError):
+    """The PDF is damaged, encrypted or not a PDF"""
+
+def is_pdf(path):
+    # The spec tolerates junk before the header, within the first kilobyte
+    with open(path, "rb") as f:
+        return b"%PDF-" in f.read(1024)
+
+def _open_pdf(path):
+    try:
+        return pdfium.PdfDocument(path)
+    except pdfium.PdfiumError as e:
+        raise UnreadablePDFError(f"Cannot read PDF: {e}") from e
+
+# ✅ Render scale: dpi, or just enough to cover size, capped at MAX_IMAGE_PIXELS
+def _render_scale(page, dpi=None, size=None):
+    width, height = page.get_size()
+    if size:
+        scale = max(size[0] / width, size[1] / height)
+    else:
+        scale = dpi / PDF_POINTS_PER_INCH
+    return min(scale, (settings.MAX_IMAGE_PIXELS / (width * height)) ** 0.5)
+
+def _render(page, scale, grayscale):
+    bitmap = page.render(scale=scale, grayscale=grayscale)
+    # to_pil() may share the bitmap's buffer; convert() copies it out
+    return bitmap.to_pil().convert("L" if grayscale else "RGB")
+
+# ✅ Render the first pages at once, e.g. for the CNN at its input size
+def render_pdf_pages(path, max_pages=1, dpi=None, size=None, grayscale=False):
+    with _pdfium_lock:
+        pdf = _open_pdf(path)
+        try:
+            images = []
+            for index in range(min(len(pdf), max_pages)):
+                page = pdf[index]
+                try:
+                    images.append(_render(page, _render_scale(page, dpi, size), grayscale))
+                finally:
+                    page.close()
+            return images
+        finally:
+            pdf.close()
+
+# ✅ Text of the page's embedded text layer, or None for scanned pages and
+# pages with too little text to stand in for OCR
+def _text_layer(page):
+    textpage = page.get_textpage()
+    try:
+        text = textpage.get_text_range()
+    finally:
+        textpage.close()
+    if sum(not char.isspace() for char in text) < settings.PDF_TEXT_MIN_CHARS:
+        return None
+    return text.replace("\r\n", "\n").strip()
+
+# ✅ Pages one per iteration, up to max_pages: the page's text where it has a
+# text layer (born-digital PDFs), otherwise the page rendered for OCR
+def iter_pdf_pages(path, dpi=None, max_pages=None, grayscale=True, text_layer=None):
+    dpi = dpi or settings.PDF_DPI
+    text_layer = settings.PDF_TEXT_LAYER if text_layer is None else text_layer
+    max_pages = max_pages or settings.PDF_MAX_PAGES
+    with _pdfium_lock:
+        pdf = _open_pdf(path)
+        page_count = len(pdf)
+    try:
+        if page_count > max_pages:
+            logger.info(f"PDF has {page_count} pages; processing the first {max_pages}")
+        for index in range(min(page_count, max_pages)):
+            with _pdfium_lock:
+                page = pdf[index]
+                try:
+                    content = _text_layer(page) if text_layer else None
+                    if content is None:
+                        content = _render(page, _render_scale(page, dpi), grayscale)
+                finally:
+                    page.close()
+            PAGES.labels(source="text_layer" if isinstance(content, str) else "ocr").inc()
+            yield content
+    finally:
+        with _pdfium_lock:
+            pdf.close()
+
+# ✅ Combine per-page CNN predictions into the document's label: each page
+# votes for its label with its confidence; the confidence reported is the
+# winning label's share of the pages
+def aggregate_page_predictions(predictions):
+    if len(predictions) == 1:
+        return predictions[0]
+    votes = {}
+    for label, confidence in predictions:
+        votes[label] = votes.get(label, 0.0) + confidence
+    # Ties go to the label seen first, i.e. the earliest page
+    label = max(votes, key=votes.get)
+    return label, votes[label] / len(predictions)
@@ -0,0 +1,166 @@
+"""
+API-side stand-ins for model.classifier that call model_server.py.
+Used by routers/classify.py when MODEL_SERVER_SOCKET is set; the functions
+keep model.classifier's names and signatures. Calls are blocking (they run
+on TimeoutManager threads) over pooled Unix socket connections. A decoded
+image is passed as raw RGB pixels in a shared memory block, and OCR is
+passed the temp file path, which the model server must be able to read.
+"""
+
+import json
+import logging
+import os
+import queue
+import socket
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+from PIL import Image
+from config import settings
+from model.decode import load_images as decode_images
+from model.pages import aggregate_page_predictions
+from model_server import MESSAGE_HEADER, decode_length, encode_message
+
+logger = logging.getLogger(__name__)
+
+class ModelServerError(RuntimeError):
+    """The model server could not be reached or failed the request"""
+
+class ModelClient:
+    """Pool of blocking connections to the model server"""
+
+    def __init__(self, path: str, timeout: float, max_idle: int = 16):
+        self.path = path
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[socket.socket]" = queue.LifoQueue(maxsize=max_idle)
+
+    def _connect(self) -> socket.socket:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(self.timeout)
+        try:
+            conn.connect(self.path)
+        except OSError:
+            conn.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _recv_exact(conn: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = conn.recv(min(size, 1 << 20))
+            if not chunk:
+                raise ConnectionError("Model server closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def _roundtrip(self, conn: socket.socket, request: Dict[str, Any]) -> Dict[str, Any]:
+        conn.sendall(encode_message(request))
+        length = decode_length(self._recv_exact(conn, MESSAGE_HEADER.size))
+        return json.loads(self._recv_exact(conn, length))
+
+    def call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request; an idle connection that went stale is retried once on a new one"""
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = None, False
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            try:
+                reply = self._roundtrip(conn, request)
+            except (ConnectionError, BrokenPipeError):
+                if not reused:
+                    raise
+                conn.close()
+                conn = self._connect()
+                reply = self._roundtrip(conn, request)
+        except OSError as e:
+            if conn is not None:
+                conn.close()
+            raise ModelServerError(f"Model server at {self.path} unavailable: {e}") from e
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+        if not reply.pop("ok", False):
+            raise ModelServerError(reply.get("error", "Model server request failed"))
+        return reply
+
+    def predict(self, image: Image.Image) -> tuple:
+        return self.predict_pages([image])[0]
+
+    def predict_pages(self, images: List[Image.Image]) -> List[tuple]:
+        """Predict several images in one request; their pixels share one block"""
+        images = [image.convert("RGB") for image in images]
+        size = sum(image.width * image.height * 3 for image in images)
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            offset = 0
+            for image in images:
+                pixels = image.tobytes()
+                block.buf[offset:offset + len(pixels)] = pixels
+                offset += len(pixels)
+            reply = self.call({
+                "op": "predict_pages",
+                "shm": block.name,
+                "sizes": [(image.width, image.height) for image in images]
+            })
+        finally:
+            block.close()
+            block.unlink()
+        return [tuple(prediction) for prediction in reply["predictions"]]
+
+model_client = ModelClient(settings.MODEL_SERVER_SOCKET, settings.MODEL_SERVER_TIMEOUT) if settings.MODEL_SERVER_SOCKET else None
+
+class RemoteModel:
+    """Stands in for the CNN; the weights live in the model server"""
+
+    def __init__(self, info: Optional[dict]):
+        self.info = info
+
+# Same names and signatures as model.classifier
+
+def load_model(model_path):
+    try:
+        info = model_client.call({"op": "ping"})
+        logger.info(f"Connected to model server at {model_client.path} (pid {info['pid']})")
+    except ModelServerError as e:
+        # The model server may still be starting; requests connect on demand
+        logger.warning(f"{e}; will retry on the first request")
+        info = None
+    return RemoteModel(info)
+
+def load_image(image_path):
+    # Decoded here at reduced resolution, so only the small image crosses to the model server
+    return decode_images(image_path)[0]
+
+def load_images(image_path):
+    return decode_images(image_path, max_pages=settings.CNN_MAX_PAGES)
+
+def predict_image(model, image):
+    if isinstance(image, (str, os.PathLike)):
+        image = load_image(image)
+    return model_client.predict(image)
+
+def predict_document(model, images):
+    return aggregate_page_predictions(model_client.predict_pages(images))
+
+def extract_text(image_path, timeout=None):
+    request = {"op": "ocr", "path": os.path.abspath(image_path), "timeout": timeout}
+    return model_client.call(request)["text"]
+
+def summarize_text(text):
+    return model_client.call({"op": "summarize", "text": text})["summary"]
+
+def classify_with_llm(text):
+    reply = model_client.call({"op": "classify_text", "text": text})
+    return reply["label"], reply["score"]
+
+def get_summarizer():
+    # Loaded and kept resident by the model server
+    return None
@@ -0,0 +1,275 @@
+"""
+Registry that loads models on first use and unloads them when idle.
+Each model is registered with a loader and an estimate of its size. get()
+loads it if needed, first unloading least recently used models to keep the
+resident total under MODEL_MEMORY_BUDGET_MB; use() also pins it, so a model
+in the middle of a call is never unloaded. A background thread unloads
+models unused for MODEL_IDLE_TIMEOUT seconds, and idle models while the
+node's available memory is below MODEL_MIN_AVAILABLE_MB. An unloaded model
+is loaded again by its next caller.
+"""
+
+import ctypes
+import gc
+import itertools
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from config import settings
+from metrics import MODEL_RESIDENT_BYTES, MODEL_UNLOADS, time_model_load
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+def model_size_bytes(model: Any) -> int:
+    """Bytes held by a torch module's parameters and buffers (or a pipeline's model)"""
+    for candidate in (model, getattr(model, "model", None)):
+        if hasattr(candidate, "parameters") and hasattr(candidate, "buffers"):
+            tensors = itertools.chain(candidate.parameters(), candidate.buffers())
+            return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    return 0
+
+def available_memory_bytes() -> Optional[int]:
+    """MemAvailable from /proc/meminfo, or None where it cannot be read"""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _trim_heap() -> None:
+    """Hand freed heap pages back to the OS (glibc keeps them otherwise)"""
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+class _Entry:
+    def __init__(self, name: str, loader: Callable[[], Any], estimated_bytes: int):
+        self.name = name
+        self.loader = loader
+        self.estimated_bytes = estimated_bytes
+        self.model: Any = None
+        self.size_bytes = 0
+        self.last_used = 0.0
+        self.in_use = 0
+        self.loads = 0
+        self.load_lock = threading.Lock()
+
+class ModelRegistry:
+    """Loads registered models on demand within a memory budget"""
+
+    def __init__(
+        self,
+        budget_bytes: int = 0,
+        idle_timeout: float = 0,
+        min_available_bytes: int = 0,
+        check_interval: float = 30
+    ):
+        self.budget_bytes = budget_bytes
+        self.idle_timeout = idle_timeout
+        self.min_available_bytes = min_available_bytes
+        self.check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def register(self, name: str, loader: Callable[[], Any], estimated_bytes: int = 0) -> None:
+        """Add a model; registering a name again replaces its loader"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self._entries[name] = _Entry(name, loader, estimated_bytes)
+            else:
+                entry.loader = loader
+                entry.estimated_bytes = estimated_bytes
+
+    def get(self, name: str) -> Any:
+        """Get a model, loading it first if it is not resident"""
+        entry = self._entries[name]
+        self._ensure_reaper()
+        model = entry.model
+        if model is None:
+            with entry.load_lock:
+                model = entry.model
+                if model is None:
+                    model = self._load(entry)
+        entry.last_used = time.monotonic()
+        return model
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """Get a model and keep it from being unloaded until the block exits"""
+        entry = self._entries[name]
+        with self._lock:
+            entry.in_use += 1
+        try:
+            yield self.get(name)
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    def is_resident(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry.model is not None
+
+    def unload(self, name: str, reason: str = "manual") -> bool:
+        """Drop a model unless it is in use; returns whether it was unloaded"""
+        with self._lock:
+            unloaded = self._unload_locked(self._entries[name], reason)
+        if unloaded:
+            self._release_memory()
+        return unloaded
+
+    def resident_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values() if entry.model is not None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "budget_mb": round(self.budget_bytes / MB) if self.budget_bytes else None,
+            "resident_mb": round(self.resident_bytes() / MB, 1),
+            "idle_timeout": self.idle_timeout or None,
+            "models": {
+                entry.name: {
+                    "resident": entry.model is not None,
+                    "size_mb": round((entry.size_bytes or entry.estimated_bytes) / MB, 1),
+                    "in_use": entry.in_use,
+                    "idle_seconds": round(now - entry.last_used) if entry.model is not None else None,
+                    "loads": entry.loads,
+                }
+                for entry in self._entries.values()
+            },
+        }
+
+    def _load(self, entry: _Entry) -> Any:
+        # Called with entry.load_lock held; other models may load concurrently
+        self._make_room(entry, entry.size_bytes or entry.estimated_bytes)
+        with time_model_load(entry.name):
+            model = entry.loader()
+        size = model_size_bytes(model) or entry.estimated_bytes
+
+        with self._lock:
+            entry.model = model
+            entry.size_bytes = size
+            entry.loads += 1
+            entry.last_used = time.monotonic()
+        MODEL_RESIDENT_BYTES.labels(model=entry.name).set(size)
+        logger.info(f"Loaded model {entry.name} ({size / MB:.0f} MB, {self.resident_bytes() / MB:.0f} MB resident)")
+
+        # The estimate may have been low
+        self._make_room(entry, 0)
+        return model
+
+    def _make_room(self, keep: _Entry, needed: int) -> None:
+        """Unload least recently used idle models until needed bytes fit the budget"""
+        if not self.budget_bytes:
+            return
+        unloaded = False
+        with self._lock:
+            while self.resident_bytes() + needed > self.budget_bytes:
+                victim = self._least_recently_used(exclude=keep)
+                if victim is None:
+                    logger.warning(
+                        f"Model memory budget of {self.budget_bytes / MB:.0f} MB exceeded "
+                        f"by {keep.name}; every other resident model is in use"
+                    )
+                    break
+                unloaded |= self._unload_locked(victim, "budget")
+        if unloaded:
+            self._release_memory()
+
+    def _least_recently_used(self, exclude: Optional[_Entry] = None) -> Optional[_Entry]:
+        idle = [
+            entry for entry in self._entries.values()
+            if entry.model is not None and not entry.in_use and entry is not exclude
+        ]
+        return min(idle, key=lambda entry: entry.last_used, default=None)
+
+    def _unload_locked(self, entry: _Entry, reason: str) -> bool:
+        if entry.model is None or entry.in_use:
+            return False
+        entry.model = None
+        logger.info(f"Unloaded model {entry.name} ({entry.size_bytes / MB:.0f} MB, {reason})")
+        MODEL_RESIDENT_BYTES.labels(model=entry.name).set(0)
+        MODEL_UNLOADS.labels(model=entry.name, reason=reason).inc()
+        return True
+
+    @staticmethod
+    def _release_memory() -> None:
+        # Pipelines hold reference cycles; collect them before trimming
+        gc.collect()
+        _trim_heap()
+
+    def _ensure_reaper(self) -> None:
+        """Start the idle/pressure thread; also restarts it in a forked worker"""
+        if not (self.idle_timeout or self.min_available_bytes):
+            return
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        with self._lock:
+            if self._reaper is None or not self._reaper.is_alive():
+                self._stop = threading.Event()
+                self._reaper = threading.Thread(
+                    target=self._reap_loop, args=(self._stop,), name="model-registry", daemon=True
+                )
+                self._reaper.start()
+
+    def stop_reaper(self) -> None:
+        """Stop the background thread (it starts again on the next get())"""
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join(timeout=5)
+        self._reaper = None
+
+    def _reap_loop(self, stop: threading.Event) -> None:
+        while not stop.wait(self.check_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"Model registry check failed: {e}")
+
+    def reap(self) -> None:
+        """Unload models idle past the timeout, then idle models while memory is short"""
+        unloaded = False
+        with self._lock:
+            if self.idle_timeout:
+                cutoff = time.monotonic() - self.idle_timeout
+                for entry in list(self._entries.values()):
+                    if entry.model is not None and entry.last_used < cutoff:
+                        unloaded |= self._unload_locked(entry, "idle")
+
+        if not self.min_available_bytes:
+            if unloaded:
+                self._release_memory()
+            return
+
+        while True:
+            if unloaded:
+                self._release_memory()
+                unloaded = False
+            available = available_memory_bytes()
+            if available is None or available >= self.min_available_bytes:
+                return
+            with self._lock:
+                victim = self._least_recently_used()
+                if victim is None:
+                    return
+                unloaded = self._unload_locked(victim, "memory_pressure")
+
+model_registry = ModelRegistry(
+    budget_bytes=settings.MODEL_MEMORY_BUDGET_MB * MB,
+    idle_timeout=settings.MODEL_IDLE_TIMEOUT,
+    min_available_bytes=settings.MODEL_MIN_AVAILABLE_MB * MB,
+    check_interval=settings.MODEL_REGISTRY_CHECK_INTERVAL
+)
@@ -0,0 +1,285 @@
+"""
+Local inference server for the CNN, OCR, summarizer and zero-shot models.
+API workers started with MODEL_SERVER_SOCKET set send their model calls
+here over a Unix socket (see model_client.py) instead of each loading the
+models. The models are loaded once and MODEL_SERVER_WORKERS processes are
+forked to serve the same socket, sharing the weights copy-on-write. Each
+process pins itself to its share of MODEL_SERVER_CPUS and batches
+concurrent CNN requests into one forward pass.
+
+Messages are a 4-byte big-endian length followed by a JSON object. Decoded
+images are not sent on the socket: the client writes the raw RGB pixels
+to a shared memory block and sends its name and size.
+
+    python model_server.py --socket /run/doc-classifier/models.sock --workers 2
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_HEADER = struct.Struct("!I")
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    body = json.dumps(message).encode("utf-8")
+    return MESSAGE_HEADER.pack(len(body)) + body
+
+def decode_length(header: bytes) -> int:
+    length = MESSAGE_HEADER.unpack(header)[0]
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Message of {length} bytes exceeds the {MAX_MESSAGE_SIZE} byte limit")
+    return length
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Open a block created by the client without adopting it
+
+    The client unlinks the block; left registered here, this process's
+    resource tracker would unlink it too, or warn about a leak on exit.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+class ModelServer:
+    """Owns the models of one model server process"""
+
+    def __init__(self):
+        self.model = None
+        self.model_path: Optional[str] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._inference: Optional[ThreadPoolExecutor] = None
+        self._ocr: Optional[ThreadPoolExecutor] = None
+        self._text: Optional[ThreadPoolExecutor] = None
+
+    def load(self) -> None:
+        """Load every model; called once, before the worker processes fork"""
+        from metrics import time_model_load
+        from model.classifier import get_summarizer, load_model
+
+        self.model_path = settings.get_model_path()
+        with time_model_load("cnn"):
+            self.model = load_model(self.model_path)
+        get_summarizer()
+        logger.info(f"Model server loaded models from {self.model_path}")
+
+    async def serve(self, sock: socket.socket) -> None:
+        self.loop = asyncio.get_running_loop()
+        self._batch_queue = asyncio.Queue()
+        # One inference thread per process: batches run back to back on the pinned CPUs
+        self._inference = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-inference")
+        self._ocr = ThreadPoolExecutor(max_workers=settings.MODEL_SERVER_OCR_WORKERS, thread_name_prefix="model-ocr")
+        self._text = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-text")
+
+        batcher = asyncio.create_task(self._batch_loop())
+        server = await asyncio.start_unix_server(self._handle_connection, sock=sock)
+        logger.info(f"Model server process {os.getpid()} ready")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            for executor in (self._inference, self._ocr, self._text):
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(MESSAGE_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    return
+                request = json.loads(await reader.readexactly(decode_length(header)))
+                try:
+                    reply = dict(await self._dispatch(request), ok=True)
+                except Exception as e:
+                    logger.error(f"Model server {request.get('op')} failed: {e}")
+                    reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                writer.write(encode_message(reply))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Dropping model server connection: {e}")
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        from model.classifier import classify_with_llm, extract_text, summarize_text
+
+        op = request.get("op")
+        if op == "predict":
+            [(label, confidence)] = await self._predict(request["shm"], [(request["width"], request["height"])])
+            return {"label": label, "confidence": confidence}
+        if op == "predict_pages":
+            return {"predictions": await self._predict(request["shm"], request["sizes"])}
+        if op == "ocr":
+            text = await self.loop.run_in_executor(self._ocr, extract_text, request["path"], request.get("timeout"))
+            return {"text": text}
+        if op == "summarize":
+            return {"summary": await self.loop.run_in_executor(self._text, summarize_text, request["text"])}
+        if op == "classify_text":
+            label, score = await self.loop.run_in_executor(self._text, classify_with_llm, request["text"])
+            return {"label": label, "score": score}
+        if op == "ping":
+            return {"pid": os.getpid(), "model_path": self.model_path}
+        raise ValueError(f"Unknown model server operation: {op}")
+
+    async def _predict(self, shm_name: str, sizes: List[tuple]):
+        """Predict images stored back to back in a shared memory block"""
+        from PIL import Image
+
+        block = attach_shared_memory(shm_name)
+        images = []
+        try:
+            # frombytes copies the pixels out, so the block can be closed right away
+            offset = 0
+            for width, height in sizes:
+                end = offset + width * height * 3
+                with block.buf[offset:end] as pixels:
+                    images.append(Image.frombytes("RGB", (width, height), pixels))
+                offset = end
+        finally:
+            block.close()
+
+        futures = []
+        for image in images:
+            future = self.loop.create_future()
+            self._batch_queue.put_nowait((image, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _batch_loop(self) -> None:
+        """Collect CNN requests for up to MODEL_SERVER_BATCH_WINDOW and run them together"""
+        from model.classifier import predict_images
+
+        while True:
+            batch: List[tuple] = [await self._batch_queue.get()]
+            deadline = self.loop.time() + settings.MODEL_SERVER_BATCH_WINDOW
+            while len(batch) < settings.MODEL_SERVER_MAX_BATCH:
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._batch_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await self.loop.run_in_executor(
+                    self._inference, predict_images, self.model, [image for image, _ in batch]
+                )
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+def _pin_process(index: int, workers: int) -> None:
+    """Give this process its share of MODEL_SERVER_CPUS (or of the node's CPU budget)"""
+    from thread_budget import apply_thread_budget
+
+    apply_thread_budget(
+        worker_index=index,
+        worker_count=workers,
+        cpus=settings.MODEL_SERVER_CPUS or None,
+        torch_threads=settings.MODEL_SERVER_THREADS or None,
+        pin=bool(settings.MODEL_SERVER_CPUS) or None
+    )
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def _run_worker(server: ModelServer, sock: socket.socket, index: int, workers: int) -> None:
+    _pin_process(index, workers)
+    try:
+        asyncio.run(server.serve(sock))
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Local inference server for the document classifier")
+    parser.add_argument("--socket", default=settings.MODEL_SERVER_SOCKET, help="Unix socket path (default: MODEL_SERVER_SOCKET)")
+    parser.add_argument("--workers", type=int, default=settings.MODEL_SERVER_WORKERS)
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("set MODEL_SERVER_SOCKET or pass --socket")
+
+    logging.basicConfig(
+        level=logging.INFO if settings.DEBUG else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    if os.path.exists(args.socket):
+        os.remove(args.socket)  # left behind by a previous run
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(args.socket)
+    os.chmod(args.socket, 0o660)
+    sock.listen(128)
+
+    server = ModelServer()
+    server.load()
+
+    if args.workers <= 1:
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        try:
+            _run_worker(server, sock, 0, 1)
+        finally:
+            os.remove(args.socket)
+        return
+
+    # Fork after loading so the processes share the weights; freeze keeps
+    # the collector from touching (and so copying) the shared objects
+    gc.collect()
+    gc.freeze()
+    children = []
+    for index in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            _run_worker(server, sock, index, args.workers)
+            os._exit(0)
+        children.append(pid)
+    logger.info(f"Model server started {args.workers} processes on {args.socket}")
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        for pid in children:
+            while True:
+                try:
+                    os.waitpid(pid, 0)
+                    break
+                except InterruptedError:
+                    continue
+                except ChildProcessError:
+                    break
+    finally:
+        os.remove(args.socket)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,22 @@
-from sqlalchemy import Column, String, Float, Boolean, Text, DateTime, UUID, ForeignKey
+from sqlalchemy import Column, String, Float, Boolean, Text, Date, DateTime, Integer, BigInteger, UUID, ForeignKey, Index, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from database import Base
+from utils.compression import compress_text, decompress_text
 import uuid
 
+class CompressedText(TypeDecorator):
+    """Text stored as a compressed binary blob"""
+    impl = LargeBinary
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return compress_text(value)
+    
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
 class User(Base):
     """User model for authentication and profile management"""
     __tablename__ = "app_users"
@@ -41,6 +54,10 @@ class User(Base):
 class Document(Base):
     """Document model for storing classification results"""
     __tablename__ = "documents"
+    __table_args__ = (
+        # Backs keyset pagination of a user's history, newest first
+        Index("ix_documents_user_created_id", "user_id", "created_at", "id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     filename = Column(String(255), nullable=False, index=True)
@@ -48,14 +65,45 @@ class Document(Base):
     confidence = Column(Float, nullable=False)
     override_reason = Column(String(255), nullable=True)
     disagreement = Column(Boolean, default=False)
-    summary = Column(Text, nullable=True)
-    raw_text = Column(Text, nullable=True)
     user_id = Column(String(36), nullable=True, index=True)  # Store UUID as string
+    file_type = Column(String(16), nullable=True)  # upload extension, e.g. "pdf"
+    timings = Column(JSON(none_as_null=True), nullable=True)  # stage -> milliseconds
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # OCR text and summary live in document_contents and are only loaded on
+    # request (selectinload); touching them unloaded raises instead of querying
+    content = relationship(
+        "DocumentContent",
+        uselist=False,
+        lazy="raise_on_sql",
+        passive_deletes=True,
+        cascade="all, delete-orphan"
+    )
+    
     # No direct relationship - using user_id as string reference
     
+    def _get_content(self) -> "DocumentContent":
+        if self.content is None:
+            self.content = DocumentContent()
+        return self.content
+    
+    @property
+    def raw_text(self):
+        return self.content.raw_text if self.content is not None else None
+    
+    @raw_text.setter
+    def raw_text(self, value):
+        self._get_content().raw_text = value
+    
+    @property
+    def summary(self):
+        return self.content.summary if self.content is not None else None
+    
+    @summary.setter
+    def summary(self, value):
+        self._get_content().summary = value
+    
     def __repr__(self):
         return f"<Document(id={self.id}, filename={self.filename}, label={self.label})>"
     
@@ -71,6 +119,61 @@ class Document(Base):
             "summary": self.summary,
             "raw_text": self.raw_text,
             "user_id": self.user_id,
+            "file_type": self.file_type,
+            "timings": self.timings,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
+
+class DocumentContent(Base):
+    """Compressed OCR text and summary for a document, kept out of the documents table"""
+    __tablename__ = "document_contents"
+    
+    document_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("documents.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    raw_text = Column(CompressedText, nullable=True)
+    summary = Column(CompressedText, nullable=True)
+    
+    def __repr__(self):
+        return f"<DocumentContent(document_id={self.document_id})>"
+
+class DocumentStatsDaily(Base):
+    """Per user, per day classification counts, maintained as documents change"""
+    __tablename__ = "document_stats_daily"
+    
+    user_id = Column(String(36), primary_key=True)  # "" for documents without a user
+    day = Column(Date, primary_key=True)
+    label = Column(String(100), primary_key=True)
+    override_reason = Column(String(255), primary_key=True)  # "" when not set
+    document_count = Column(Integer, nullable=False, default=0)
+    disagreement_count = Column(Integer, nullable=False, default=0)
+    very_high_count = Column(Integer, nullable=False, default=0)
+    high_count = Column(Integer, nullable=False, default=0)
+    medium_count = Column(Integer, nullable=False, default=0)
+    low_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<DocumentStatsDaily(user_id={self.user_id}, day={self.day}, label={self.label})>"
+
+class DocumentVersion(Base):
+    """Per user counter bumped whenever one of the user's documents changes"""
+    __tablename__ = "document_versions"
+    
+    user_id = Column(String(36), primary_key=True)  # "" for documents without a user
+    version = Column(BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<DocumentVersion(user_id={self.user_id}, version={self.version})>"
+
+class SchemaMigration(Base):
+    """One-off data migrations (backfills) that have been applied to this database"""
+    __tablename__ = "schema_migrations"
+    
+    name = Column(String(100), primary_key=True)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<SchemaMigration(name={self.name})>"
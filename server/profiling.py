@@ -0,0 +1,212 @@
+"""
+On-demand profiling of individual classify requests.
+"cprofile" mode runs cProfile on the request and, through
+TimeoutManager and the OCR page pool, on each worker thread it starts
+(profile_worker); the profiles are merged
+into one .pstats file. From Python 3.12 cProfile runs on sys.monitoring,
+which allows one profiler per interpreter and records every thread, so the
+request's profiler covers the worker threads by itself. "sample" mode
+samples every thread's stack at PROFILE_SAMPLE_INTERVAL and writes a
+collapsed-stack .collapsed file that flamegraph.pl or speedscope read
+directly. Its overhead is low enough to profile a PROFILE_SAMPLE_RATE
+fraction of traffic continuously.
+"""
+
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, TypeVar
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_EXTENSIONS = {"cprofile": ".pstats", "sample": ".collapsed"}
+
+# Python 3.12+ cProfile is process-wide: a second enabled profiler raises ValueError
+CPROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+
+# cProfile hooks the whole interpreter thread (the whole interpreter from
+# 3.12), so only one request at a time can use it; overlapping requests
+# fall back to the stack sampler
+_cprofile_lock = threading.Lock()
+
+class StackSampler:
+    """Periodically record the stack of every thread as collapsed stacks"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        sampler_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class RequestProfile:
+    """Profile of one request, saved under PROFILE_DIR when stopped"""
+
+    def __init__(self, mode: str):
+        if mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+            logger.info("cProfile busy with another request; sampling stacks instead")
+            mode = "sample"
+
+        self.mode = mode
+        self.name = (
+            f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            f"{PROFILE_EXTENSIONS[mode]}"
+        )
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._start = time.perf_counter()
+
+        if mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL)
+            self._sampler.start()
+
+        self._token = _active_profile.set(self)
+
+    def add_thread_profile(self, profiler: cProfile.Profile) -> None:
+        self._thread_profiles.append(profiler)
+
+    def stop(self) -> Optional[str]:
+        """Stop profiling and save the result; returns the profile file name"""
+        _active_profile.reset(self._token)
+        try:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            path = os.path.join(settings.PROFILE_DIR, self.name)
+
+            if self._profiler is not None:
+                self._profiler.disable()
+                stats = pstats.Stats(self._profiler)
+                for profiler in list(self._thread_profiles):
+                    stats.add(profiler)
+                stats.dump_stats(path)
+            else:
+                self._sampler.stop()
+                self._sampler.write(path)
+
+            logger.info(f"Saved {self.mode} profile {self.name} ({time.perf_counter() - self._start:.2f}s)")
+            prune_profiles()
+            return self.name
+        except Exception as e:
+            logger.error(f"Failed to save profile {self.name}: {e}")
+            return None
+        finally:
+            if self._profiler is not None:
+                _cprofile_lock.release()
+
+def choose_profile_mode(requested: Optional[str], is_admin: bool) -> Optional[str]:
+    """Decide whether and how to profile a request
+
+    Raises ValueError for an unknown mode and PermissionError when a
+    non-admin asks for a profile.
+    """
+    if requested:
+        if requested not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {requested}. Use one of: {', '.join(PROFILE_MODES)}")
+        if not is_admin:
+            raise PermissionError("Profiling is restricted to admin users")
+        return requested
+
+    if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+def profile_worker(func: Callable[..., T]) -> Callable[..., T]:
+    """Wrap a function about to run on a worker thread so cProfile covers it"""
+    profile = _active_profile.get()
+    if profile is None or profile.mode != "cprofile" or not CPROFILE_PER_THREAD:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler is active; run unprofiled rather than fail the call
+            logger.warning(f"Not profiling {func.__name__}: {e}")
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profile.add_thread_profile(profiler)
+    return wrapper
+
+def list_profiles() -> List[dict]:
+    """Get saved profiles, newest first"""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+
+    profiles = []
+    for entry in os.scandir(settings.PROFILE_DIR):
+        if entry.is_file() and os.path.splitext(entry.name)[1] in PROFILE_EXTENSIONS.values():
+            stat = entry.stat()
+            profiles.append({
+                "name": entry.name,
+                "size": stat.st_size,
+                "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat()
+            })
+    return sorted(profiles, key=lambda profile: profile["name"], reverse=True)
+
+def get_profile_path(name: str) -> Optional[str]:
+    """Resolve a profile name to its path, rejecting anything outside PROFILE_DIR"""
+    if os.path.basename(name) != name or os.path.splitext(name)[1] not in PROFILE_EXTENSIONS.values():
+        return None
+    path = os.path.join(settings.PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+def prune_profiles() -> int:
+    """Delete the oldest profiles beyond PROFILE_MAX_FILES"""
+    removed = 0
+    for profile in list_profiles()[settings.PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, profile["name"]))
+            removed += 1
+        except OSError as e:
+            logger.warning(f"Could not remove old profile {profile['name']}: {e}")
+    return removed
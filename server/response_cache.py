@@ -0,0 +1,98 @@
+"""
+Conditional GET support for history and stats responses.
+crud bumps a per-user counter in document_versions in the same transaction
+as every document insert, update and delete. Read endpoints derive their
+ETag from (user, endpoint, params, version): a matching If-None-Match gets
+304 Not Modified, and otherwise the serialized body is served from an
+in-process cache under the same key until the version moves on.
+"""
+
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from metrics import register_cache
+from models import DocumentVersion
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+response_cache = TTLCache(max_size=settings.RESPONSE_CACHE_MAX_SIZE, ttl=settings.RESPONSE_CACHE_TTL)
+register_cache("responses", response_cache)
+
+def _upsert_statement(dialect_name: str):
+    """Build an insert that increments an existing version row"""
+    if dialect_name == "postgresql":
+        stmt = postgresql.insert(DocumentVersion)
+    elif dialect_name == "sqlite":
+        stmt = sqlite.insert(DocumentVersion)
+    else:
+        raise ValueError(f"Document versions do not support database backend: {dialect_name}")
+
+    return stmt.on_conflict_do_update(
+        index_elements=[DocumentVersion.user_id],
+        set_={"version": DocumentVersion.version + 1}
+    )
+
+async def bump_document_versions(db: AsyncSession, user_ids: Iterable[Optional[str]]) -> None:
+    """Mark the given users' documents as changed
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    params = [{"user_id": user_id, "version": 1} for user_id in sorted({user_id or "" for user_id in user_ids})]
+    if params:
+        await db.execute(_upsert_statement(db.bind.dialect.name), params)
+
+async def get_document_version(db: AsyncSession, user_id: Optional[str]) -> int:
+    """Get a user's document version; None sums every user's, for unscoped stats"""
+    query = select(func.coalesce(func.sum(DocumentVersion.version), 0))
+    if user_id is not None:
+        query = query.where(DocumentVersion.user_id == user_id)
+    return int(await db.scalar(query))
+
+@lru_cache(maxsize=None)
+def _adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return etag in candidates or "*" in candidates
+
+async def conditional_response(
+    request: Request,
+    db: AsyncSession,
+    user_id: Optional[str],
+    endpoint: str,
+    params: Dict[str, Any],
+    response_type: Any,
+    build: Callable[[], Awaitable[Any]]
+) -> Response:
+    """Serve a read endpoint with an ETag, 304 replies and the response cache
+
+    build() runs only on a cache miss. The version is read before the data,
+    so a cached body is never older than the version it is stored under.
+    """
+    version = await get_document_version(db, user_id)
+    key = (user_id, endpoint, tuple(sorted(params.items())), version)
+    etag = '"' + hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:24] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key)
+    if body is None:
+        body = _adapter(response_type).dump_json(await build())
+        if len(body) <= settings.RESPONSE_CACHE_MAX_BODY:
+            response_cache.set(key, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
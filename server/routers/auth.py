@@ -1,18 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from database import get_async_db
 from models import User
 from schemas import UserCreate, UserLogin, UserResponse, Token, UserUpdate
 from auth import (
-    verify_password, 
-    get_password_hash, 
+    PasswordHashBusy,
+    verify_and_update_password,
+    get_password_hash_async,
     create_access_token, 
     verify_token,
     get_token_expire_time
 )
+from config import settings
+from utils.cache import TTLCache
+from metrics import register_cache
 from datetime import datetime, timezone
 import logging
+import time
 from typing import Optional
 import uuid
 
@@ -20,49 +27,117 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/auth", tags=["authentication"])
 security = HTTPBearer()
 
-def get_user_by_username(db: Session, username: str) -> Optional[User]:
+# Verified token payloads and resolved user rows, so authenticated requests
+# skip JWT decoding and the app_users lookup while the entries are fresh.
+# Both are per process; user rows expire sooner (AUTH_USER_CACHE_TTL) since
+# invalidate_user_cache cannot reach the other workers
+token_cache = TTLCache(max_size=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL)
+user_cache = TTLCache(max_size=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_USER_CACHE_TTL)
+register_cache("auth_tokens", token_cache)
+register_cache("auth_users", user_cache)
+
+def _snapshot_user(user: User) -> dict:
+    """Copy a user's column values so they outlive the session"""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+async def _attach_cached_user(db: AsyncSession, snapshot: dict) -> User:
+    """Rebuild a cached user and attach it to the session without a SELECT"""
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+def invalidate_user_cache(user_id) -> None:
+    """Drop a cached user after it is updated, deactivated or deleted
+    
+    Only this process's entry; other workers keep theirs until it expires.
+    """
+    user_cache.delete(str(user_id))
+
+def _password_hash_busy_error() -> HTTPException:
+    """503 for a request refused because the password hashing pool is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many password operations in progress, try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
+def get_auth_cache_stats() -> dict:
+    """Get hit/miss counters for the token and user caches"""
+    return {
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats()
+    }
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Get user by username or email"""
-    return db.query(User).filter(
-        (User.username == username) | (User.email == username)
-    ).first()
+    result = await db.execute(
+        select(User).where((User.username == username) | (User.email == username))
+    )
+    return result.scalars().first()
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Get user by email"""
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
-def get_user_by_id(db: Session, user_id: uuid.UUID) -> Optional[User]:
+async def get_user_by_id(db: AsyncSession, user_id: uuid.UUID) -> Optional[User]:
     """Get user by ID"""
-    return db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).where(User.id == user_id))
+    return result.scalars().first()
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
     """Authenticate user with username/email and password"""
-    user = get_user_by_username(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+    user = await get_user_by_username(db, username)
+    if not user:
+        return None
+    
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None
+    
+    # Stored hash uses an outdated work factor; persisted with last_login
+    if new_hash:
+        user.hashed_password = new_hash
+        logger.info(f"Rehashed password for user: {user.username}")
+    
     return user
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get current authenticated user from token"""
     token = credentials.credentials
-    token_data = verify_token(token)
+    token_data = token_cache.get(token)
     
     if token_data is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        token_data = verify_token(token)
+        
+        if token_data is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        
+        # Never keep a token cached past its own expiry
+        ttl = settings.AUTH_CACHE_TTL
+        if token_data.get("exp"):
+            ttl = min(ttl, token_data["exp"] - time.time())
+        token_cache.set(token, token_data, ttl=ttl)
     
-    user = get_user_by_id(db, uuid.UUID(token_data["user_id"]))
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    snapshot = user_cache.get(token_data["user_id"])
+    if snapshot is not None:
+        user = await _attach_cached_user(db, snapshot)
+    else:
+        user = await get_user_by_id(db, uuid.UUID(token_data["user_id"]))
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        user_cache.set(token_data["user_id"], _snapshot_user(user))
     
     if not user.is_active:
         raise HTTPException(
@@ -72,25 +147,38 @@ def get_current_user(
     
     return user
 
+def is_admin_user(user: User) -> bool:
+    """Check whether a user is listed in ADMIN_USERS"""
+    return user.username in settings.ADMIN_USERS or user.email in settings.ADMIN_USERS
+
+async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """Get current user, requiring admin rights"""
+    if not is_admin_user(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
 @router.post("/signup", response_model=Token)
-async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
+async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     try:
         # Check if user already exists
-        if get_user_by_email(db, user_data.email):
+        if await get_user_by_email(db, user_data.email):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
-        if get_user_by_username(db, user_data.username):
+        if await get_user_by_username(db, user_data.username):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already taken"
             )
         
         # Create new user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
         db_user = User(
             email=user_data.email,
             username=user_data.username,
@@ -101,8 +189,8 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         # Create access token
         access_token = create_access_token(
@@ -120,19 +208,22 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
         
     except HTTPException:
         raise
+    except PasswordHashBusy as e:
+        logger.warning(f"Signup error: {e}")
+        raise _password_hash_busy_error()
     except Exception as e:
         logger.error(f"Signup error: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Registration failed"
         )
 
 @router.post("/login", response_model=Token)
-async def login(login_data: UserLogin, db: Session = Depends(get_db)):
+async def login(login_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Authenticate user and return access token"""
     try:
-        user = authenticate_user(db, login_data.username, login_data.password)
+        user = await authenticate_user(db, login_data.username, login_data.password)
         
         if not user:
             raise HTTPException(
@@ -149,7 +240,9 @@ async def login(login_data: UserLogin, db: Session = Depends(get_db)):
         
         # Update last login
         user.last_login = datetime.now(timezone.utc)
-        db.commit()
+        await db.commit()
+        await db.refresh(user)
+        invalidate_user_cache(user.id)
         
         # Create access token
         access_token = create_access_token(
@@ -167,6 +260,9 @@ async def login(login_data: UserLogin, db: Session = Depends(get_db)):
         
     except HTTPException:
         raise
+    except PasswordHashBusy as e:
+        logger.warning(f"Login error: {e}")
+        raise _password_hash_busy_error()
     except Exception as e:
         logger.error(f"Login error: {e}")
         raise HTTPException(
@@ -183,14 +279,14 @@ async def get_current_user_profile(current_user: User = Depends(get_current_user
 async def update_user_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user profile"""
     try:
         # Update fields if provided
         if user_update.email is not None:
             # Check if email is already taken by another user
-            existing_user = get_user_by_email(db, user_update.email)
+            existing_user = await get_user_by_email(db, user_update.email)
             if existing_user and existing_user.id != current_user.id:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -202,11 +298,12 @@ async def update_user_profile(
             current_user.full_name = user_update.full_name
         
         if user_update.password is not None:
-            current_user.hashed_password = get_password_hash(user_update.password)
+            current_user.hashed_password = await get_password_hash_async(user_update.password)
         
         current_user.updated_at = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
+        invalidate_user_cache(current_user.id)
         
         logger.info(f"User profile updated: {current_user.username}")
         
@@ -214,9 +311,13 @@ async def update_user_profile(
         
     except HTTPException:
         raise
+    except PasswordHashBusy as e:
+        logger.warning(f"Profile update error: {e}")
+        await db.rollback()
+        raise _password_hash_busy_error()
     except Exception as e:
         logger.error(f"Profile update error: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Profile update failed"
@@ -233,13 +334,15 @@ async def verify_user_token(current_user: User = Depends(get_current_user)):
 @router.delete("/account")
 async def delete_account(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete user account and all associated data"""
     try:
         username = current_user.username
-        db.delete(current_user)
-        db.commit()
+        user_id = current_user.id
+        await db.delete(current_user)
+        await db.commit()
+        invalidate_user_cache(user_id)
         
         logger.info(f"User account deleted: {username}")
         
@@ -247,7 +350,7 @@ async def delete_account(
         
     except Exception as e:
         logger.error(f"Account deletion error: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Account deletion failed"
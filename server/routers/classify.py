@@ -1,72 +1,165 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Response
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import Document
 from schemas import DocumentCreate, ClassificationResult, UserResponse
-from routers.auth import get_current_user
+from routers.auth import get_current_admin_user, get_current_user, get_auth_cache_stats, is_admin_user
 from crud import create_document
+from write_buffer import document_buffer
+from similarity import similarity_indexer
+from response_cache import response_cache
+from thread_budget import get_thread_layout
+from model_registry import model_registry
+from profiling import RequestProfile, choose_profile_mode, get_profile_path, list_profiles
+from metrics import CLASSIFICATIONS, format_server_timing, start_stage_timings, time_stage
 from utils.file_ops import file_ops
 from utils.timeout import safe_run_with_timeout
 from utils.helpers import text_helpers, confidence_helpers
 from config import settings
+import asyncio
 import logging
+import os
+import time
+from functools import partial
 from typing import Optional
 
-# Import ML model functions
-from model.classifier import (
-    load_model,
-    predict_image,
-    extract_text,
-    summarize_text,
-    classify_with_llm,
-    heuristic_detect,
-    classify_with_mistral
-)
+# Import ML model functions; with a model server they forward to it instead
+if settings.MODEL_SERVER_SOCKET:
+    from model_client import (
+        load_model,
+        load_images,
+        predict_document,
+        extract_text,
+        summarize_text,
+        get_summarizer,
+        classify_with_llm
+    )
+    from model.heuristics import heuristic_detect
+    from model.mistral import classify_with_mistral
+else:
+    from model.classifier import (
+        load_model,
+        load_images,
+        predict_document,
+        extract_text,
+        summarize_text,
+        get_summarizer,
+        classify_with_llm,
+        heuristic_detect,
+        classify_with_mistral
+    )
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1", tags=["classification"])
 
-# Load model once when module is imported
+# Register the CNN and load it once when module is imported, so a bad
+# MODEL_PATH shows up at startup; the registry reloads it if it is unloaded
 try:
-    model_path = settings.get_model_path()
-    model = load_model(model_path)
+    model_path = settings.MODEL_SERVER_SOCKET or settings.get_model_path()
+    model_registry.register("cnn", partial(load_model, model_path), estimated_bytes=45_000_000)
+    model_registry.get("cnn")
     logger.info(f"Model loaded successfully from: {model_path}")
 except Exception as e:
     logger.error(f"Failed to load model: {e}")
-    model = None
+    model_path = None
+
+def preload_models():
+    """Load the models that otherwise load on first use
+    
+    Called before gunicorn forks its workers (gunicorn.conf.py), so they share
+    the weights copy-on-write, or at startup when PRELOAD_MODELS is set.
+    """
+    try:
+        get_summarizer()
+        if settings.SIMILARITY_ENABLED:
+            from model.embeddings import get_embedding_model
+            get_embedding_model()
+        logger.info("Models preloaded")
+    except Exception as e:
+        # Whatever did not load is loaded on first use instead
+        logger.error(f"Failed to preload models: {e}")
+
+def _predict_cnn(images):
+    # Pinned for the call; the registry may have to load it first
+    with model_registry.use("cnn") as model:
+        return predict_document(model, images)
 
 @router.post("/classify", response_model=ClassificationResult)
 async def classify_document(
+    response: Response,
     file: UploadFile = File(...),
     current_user: UserResponse = Depends(get_current_user),
     save_to_db: bool = True,
-    db: Session = Depends(get_db)
+    include_timings: bool = False,
+    profile: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Classify an uploaded document using ML model and save results"""
+    """Classify an uploaded document using ML model and save results
+    
+    Admins can pass profile=cprofile or profile=sample to profile the request;
+    the saved profile's name is returned in the X-Profile header.
+    """
+    start_time = time.perf_counter()
+    timings = start_stage_timings()
     
-    if model is None:
+    try:
+        profile_mode = choose_profile_mode(profile, is_admin_user(current_user))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    
+    if model_path is None:
         raise HTTPException(
             status_code=500, 
             detail="ML model not loaded. Please check server configuration."
         )
     
     temp_path = None
+    request_profile = RequestProfile(profile_mode) if profile_mode else None
     try:
         # Save uploaded file
-        temp_path = await file_ops.save_upload_file(file)
+        with time_stage("upload"):
+            temp_path = await file_ops.save_upload_file(file)
         logger.info(f"Processing file: {file.filename}")
         
-        # Phase 1: CNN prediction
-        cnn_label, cnn_confidence = predict_image(model, temp_path)
+        # Phase 1: CNN prediction, voted over the first pages of multi-page
+        # documents. Every blocking stage runs on a thread, so the event loop
+        # keeps serving other requests (and their CNN calls can be batched)
+        with time_stage("decode"):
+            images = await asyncio.to_thread(
+                safe_run_with_timeout,
+                load_images,
+                temp_path,
+                timeout=settings.DEFAULT_TIMEOUT
+            )
+        if not images:
+            raise RuntimeError("Document decoding failed or timed out")
+        
+        with time_stage("cnn"):
+            cnn_result = await asyncio.to_thread(
+                safe_run_with_timeout,
+                _predict_cnn,
+                images,
+                timeout=settings.DEFAULT_TIMEOUT
+            )
+        if cnn_result is None:
+            raise RuntimeError("CNN prediction failed or timed out")
+        cnn_label, cnn_confidence = cnn_result
         logger.info(f"CNN prediction: {cnn_label} ({cnn_confidence:.2f})")
         
-        # Phase 2: OCR extraction with timeout
-        text = safe_run_with_timeout(
-            extract_text, 
-            temp_path, 
-            timeout=settings.OCR_TIMEOUT
-        )
+        # Phase 2: OCR extraction with timeout; extract_text stops at
+        # OCR_TIMEOUT and returns the pages finished by then, so the outer
+        # timeout only catches a single page decode that overruns it
+        with time_stage("ocr"):
+            text = await asyncio.to_thread(
+                safe_run_with_timeout,
+                extract_text, 
+                temp_path, 
+                settings.OCR_TIMEOUT,
+                timeout=settings.OCR_TIMEOUT * 2
+            )
         
         if text is None:
             text = "Text extraction failed or timed out."
@@ -77,11 +170,13 @@ async def classify_document(
         text_for_llm = text_helpers.truncate_for_llm(text)
         
         # Phase 3: Summarization with timeout
-        summary = safe_run_with_timeout(
-            summarize_text, 
-            text, 
-            timeout=settings.LLM_TIMEOUT
-        )
+        with time_stage("summarize"):
+            summary = await asyncio.to_thread(
+                safe_run_with_timeout,
+                summarize_text, 
+                text, 
+                timeout=settings.LLM_TIMEOUT
+            )
         
         if summary is None:
             summary = "Summarization failed or timed out."
@@ -98,11 +193,13 @@ async def classify_document(
         
         if len(text) > 50:  # Only apply overrides if we have sufficient text
             # Heuristic detection
-            heuristic_result = safe_run_with_timeout(
-                heuristic_detect,
-                text,
-                timeout=10
-            )
+            with time_stage("heuristic"):
+                heuristic_result = await asyncio.to_thread(
+                    safe_run_with_timeout,
+                    heuristic_detect,
+                    text,
+                    timeout=10
+                )
             
             if heuristic_result:
                 heuristic_label, heuristic_conf = heuristic_result
@@ -120,11 +217,13 @@ async def classify_document(
             
             # Mistral LLM override for sensitive labels
             elif cnn_label in sensitive_labels:
-                mistral_result = safe_run_with_timeout(
-                    classify_with_mistral,
-                    text_for_llm,
-                    timeout=settings.LLM_TIMEOUT
-                )
+                with time_stage("mistral"):
+                    mistral_result = await asyncio.to_thread(
+                        safe_run_with_timeout,
+                        classify_with_mistral,
+                        text_for_llm,
+                        timeout=settings.LLM_TIMEOUT
+                    )
                 
                 if mistral_result:
                     mistral_label = mistral_result.get("document_type")
@@ -152,6 +251,8 @@ async def classify_document(
         document_id = None
         if save_to_db:
             try:
+                # The stored breakdown covers everything up to the insert itself
+                stored_timings = dict(timings, total=round((time.perf_counter() - start_time) * 1000, 1))
                 document_data = DocumentCreate(
                     filename=file.filename,
                     label=label,
@@ -160,30 +261,52 @@ async def classify_document(
                     disagreement=disagreement,
                     summary=summary,
                     raw_text=text,
-                    user_id=str(current_user.id)
+                    user_id=str(current_user.id),
+                    file_type=os.path.splitext(file.filename or "")[1].lstrip(".").lower()[:16] or None,
+                    timings=stored_timings
                 )
                 
-                db_document = create_document(db, document_data)
-                document_id = str(db_document.id)
-                logger.info(f"Saved document to database: {document_id}")
+                with time_stage("db_write"):
+                    queued_id = None
+                    if settings.WRITE_BEHIND_ENABLED:
+                        queued_id = await document_buffer.enqueue(document_data)
+                    
+                    if queued_id is not None:
+                        document_id = str(queued_id)
+                        logger.info(f"Queued document for write-behind: {document_id}")
+                    else:
+                        db_document = await create_document(db, document_data)
+                        document_id = str(db_document.id)
+                        logger.info(f"Saved document to database: {document_id}")
                 
             except Exception as e:
                 logger.error(f"Failed to save document to database: {e}")
                 # Continue without saving to DB
         
+        timings["total"] = round((time.perf_counter() - start_time) * 1000, 1)
+        response.headers["Server-Timing"] = format_server_timing(timings)
+        
+        if request_profile is not None:
+            profile_name = request_profile.stop()
+            request_profile = None
+            if profile_name:
+                response.headers["X-Profile"] = profile_name
+        
         # Format response
-        response = ClassificationResult(
+        result = ClassificationResult(
             label=label,
             confidence=confidence_helpers.format_confidence(confidence),
             text=text,
             summary=summary,
             override_reason=override_reason,
             disagreement=disagreement,
-            document_id=document_id
+            document_id=document_id,
+            timings=timings if include_timings else None
         )
         
+        CLASSIFICATIONS.labels(override_reason=override_reason).inc()
         logger.info(f"Classification completed: {label} ({confidence:.2f})")
-        return response
+        return result
         
     except ValueError as e:
         logger.error(f"Validation error: {e}")
@@ -197,6 +320,9 @@ async def classify_document(
         )
     
     finally:
+        if request_profile is not None:
+            request_profile.stop()
+        
         # Clean up temp file
         if temp_path:
             file_ops.cleanup_temp_file(temp_path)
@@ -206,11 +332,30 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
-        "model_path": settings.get_model_path() if model else None,
+        "model_loaded": model_path is not None,
+        "model_path": model_path,
+        "models": model_registry.stats(),
+        "auth_cache": get_auth_cache_stats(),
+        "write_buffer": document_buffer.stats(),
+        "similarity_index": similarity_indexer.stats(),
+        "response_cache": response_cache.stats(),
+        "thread_budget": get_thread_layout(),
         "version": settings.VERSION
     }
 
+@router.get("/profiles")
+async def get_profiles(admin_user: UserResponse = Depends(get_current_admin_user)):
+    """List saved request profiles (admin only)"""
+    return {"profiles": list_profiles()}
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str, admin_user: UserResponse = Depends(get_current_admin_user)):
+    """Download a saved .pstats or .collapsed profile (admin only)"""
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
 @router.post("/cleanup")
 async def cleanup_temp_files():
     """Clean up old temporary files"""
@@ -1,66 +1,222 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from database import get_db
-from schemas import DocumentResponse, HistoryResponse, UserResponse
-from routers.auth import get_current_user
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from database import get_async_db
+from schemas import (
+    DocumentResponse, DocumentListItem, HistoryPage, HistoryResponse,
+    SearchResponse, SearchResult, SimilarDocument, UserResponse
+)
+from routers.auth import get_current_user, is_admin_user
 from crud import (
     get_documents, 
+    get_documents_page,
+    search_documents,
+    find_similar_documents,
     get_documents_count, 
     get_document,
     get_recent_documents,
     get_documents_by_label,
     delete_document
 )
-from utils.helpers import pagination_helpers
-from typing import Optional, List
+from stats import get_stats_from_documents, get_stats_from_rollup
+from timings import get_timing_percentiles
+from response_cache import conditional_response
+from utils.helpers import pagination_helpers, text_helpers
+from search import get_search_terms
+from export import EXPORT_MEDIA_TYPES, export_documents, parquet_available
+from datetime import date
+from typing import Any, Dict, Optional, List, Union
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/documents", tags=["documents"])
 
-@router.get("/history", response_model=List[DocumentResponse])
+@router.get("/history", response_model=Union[List[DocumentListItem], List[DocumentResponse]])
 async def get_user_document_history(
+    request: Request,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000, description="Number of most recent documents"),
+    include_content: bool = Query(False, description="Return full documents, with summary and OCR text"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get current user's document classification history"""
+    """Get current user's most recent classifications
+    
+    Compact rows without text columns by default; include_content=true
+    returns full documents. /history/page pages through the rest.
+    """
     try:
-        # Get all documents for the current user
         user_id_str = str(current_user.id)  # Convert UUID to string
+        response_type = List[DocumentResponse] if include_content else List[DocumentListItem]
+        
+        async def build():
+            if not include_content:
+                rows, _ = await get_documents_page(db, user_id=user_id_str, limit=limit)
+                return [DocumentListItem.model_validate(row) for row in rows]
+            
+            documents = await get_documents(
+                db, 
+                skip=0, 
+                limit=limit,
+                user_id=user_id_str,
+                include_content=True
+            )
+            return [DocumentResponse.model_validate(doc) for doc in documents]
+        
+        return await conditional_response(
+            request, db, user_id_str, "history",
+            {"limit": limit, "include_content": include_content}, response_type, build
+        )
         
-        documents = get_documents(
-            db, 
-            skip=0, 
-            limit=1000,  # Get all documents for now
-            user_id=user_id_str
+    except Exception as e:
+        logger.error(f"Error getting user document history: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve document history: {str(e)}"
+        )
+
+@router.get("/history/page", response_model=HistoryPage)
+async def get_user_document_history_page(
+    current_user: UserResponse = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    label: Optional[str] = Query(None, description="Filter by label"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get current user's history one keyset page at a time, without text columns"""
+    try:
+        decoded_cursor = pagination_helpers.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        rows, has_more = await get_documents_page(
+            db,
+            user_id=str(current_user.id),
+            limit=limit,
+            cursor=decoded_cursor,
+            label_filter=label
         )
         
-        # Convert to response format
-        document_responses = [DocumentResponse.model_validate(doc) for doc in documents]
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = pagination_helpers.encode_cursor(last.created_at, last.id)
         
-        return document_responses
+        return HistoryPage(
+            items=[DocumentListItem.model_validate(row) for row in rows],
+            next_cursor=next_cursor,
+            has_more=has_more
+        )
         
     except Exception as e:
-        logger.error(f"Error getting user document history: {e}")
+        logger.error(f"Error getting user document history page: {e}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to retrieve document history: {str(e)}"
         )
 
+@router.get("/search", response_model=SearchResponse)
+async def search_user_documents(
+    q: str = Query(..., min_length=1, max_length=500, description="Search text"),
+    current_user: UserResponse = Depends(get_current_user),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Full-text search the current user's filenames, summaries and OCR text"""
+    try:
+        offset = int(cursor) if cursor else 0
+        if offset < 0:
+            raise ValueError
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    
+    try:
+        # Fetch one extra hit to know whether another page exists
+        hits = await search_documents(
+            db,
+            user_id=str(current_user.id),
+            query=q,
+            limit=limit + 1,
+            offset=offset
+        )
+        has_more = len(hits) > limit
+        terms = get_search_terms(q)
+        
+        items = []
+        for document, rank in hits[:limit]:
+            snippet_source = document.raw_text or document.summary or ""
+            items.append(SearchResult(
+                **DocumentListItem.model_validate(document).model_dump(),
+                rank=rank,
+                snippet=text_helpers.highlight_snippet(
+                    snippet_source, terms, max_length=settings.SEARCH_SNIPPET_LENGTH
+                )
+            ))
+        
+        return SearchResponse(
+            items=items,
+            next_cursor=str(offset + limit) if has_more else None,
+            has_more=has_more
+        )
+        
+    except Exception as e:
+        logger.error(f"Error searching documents: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to search documents: {str(e)}"
+        )
+
+@router.get("/export")
+async def export_user_documents(
+    current_user: UserResponse = Depends(get_current_user),
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$", description="csv, ndjson or parquet"),
+    label: Optional[str] = Query(None, description="Filter by label"),
+    start_date: Optional[date] = Query(None, description="First day to include (UTC)"),
+    end_date: Optional[date] = Query(None, description="Last day to include (UTC)"),
+    include_text: bool = Query(False, description="Include summary and OCR text")
+):
+    """Stream the current user's documents as a CSV, NDJSON or Parquet download"""
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    
+    filename = f"documents_{date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        export_documents(
+            format,
+            str(current_user.id),
+            label_filter=label,
+            start_date=start_date,
+            end_date=end_date,
+            include_content=include_text
+        ),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/history/recent", response_model=List[DocumentResponse])
 async def get_recent_classifications(
+    request: Request,
     current_user: UserResponse = Depends(get_current_user),
     limit: int = Query(10, ge=1, le=50, description="Number of recent items"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get recent classification results for current user"""
     try:
         # Convert user ID to string
         user_id_str = str(current_user.id)
         
-        documents = get_recent_documents(db, limit=limit, user_id=user_id_str)
-        return [DocumentResponse.model_validate(doc) for doc in documents]
+        async def build():
+            documents = await get_recent_documents(
+                db, limit=limit, user_id=user_id_str, include_content=True
+            )
+            return [DocumentResponse.model_validate(doc) for doc in documents]
+        
+        return await conditional_response(
+            request, db, user_id_str, "history/recent", {"limit": limit}, List[DocumentResponse], build
+        )
         
     except Exception as e:
         logger.error(f"Error getting recent classifications: {e}")
@@ -72,22 +228,30 @@ async def get_recent_classifications(
 @router.get("/history/by-label/{label}", response_model=List[DocumentResponse])
 async def get_classifications_by_label(
     label: str,
+    request: Request,
     current_user: UserResponse = Depends(get_current_user),
     limit: int = Query(50, ge=1, le=100, description="Maximum number of results"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get classifications filtered by document label for current user"""
     try:
         # Convert user ID to string
         user_id_str = str(current_user.id)
         
-        documents = get_documents_by_label(
-            db, 
-            label=label, 
-            limit=limit, 
-            user_id=user_id_str
+        async def build():
+            documents = await get_documents_by_label(
+                db, 
+                label=label, 
+                limit=limit, 
+                user_id=user_id_str,
+                include_content=True
+            )
+            return [DocumentResponse.model_validate(doc) for doc in documents]
+        
+        return await conditional_response(
+            request, db, user_id_str, "history/by-label",
+            {"label": label, "limit": limit}, List[DocumentResponse], build
         )
-        return [DocumentResponse.model_validate(doc) for doc in documents]
         
     except Exception as e:
         logger.error(f"Error getting classifications by label {label}: {e}")
@@ -99,14 +263,14 @@ async def get_classifications_by_label(
 @router.get("/history/{document_id}", response_model=DocumentResponse)
 async def get_classification_by_id(
     document_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific classification by document ID"""
     try:
         # Validate UUID format
         doc_uuid = uuid.UUID(document_id)
         
-        document = get_document(db, doc_uuid)
+        document = await get_document(db, doc_uuid, include_content=True)
         if not document:
             raise HTTPException(
                 status_code=404,
@@ -127,17 +291,53 @@ async def get_classification_by_id(
             detail=f"Failed to retrieve document: {str(e)}"
         )
 
+@router.get("/history/{document_id}/similar", response_model=List[SimilarDocument])
+async def get_similar_classifications(
+    document_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the current user's documents most semantically similar to one of theirs"""
+    if not settings.SIMILARITY_ENABLED:
+        raise HTTPException(status_code=404, detail="Similarity search is disabled")
+    
+    try:
+        doc_uuid = uuid.UUID(document_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid document ID format")
+    
+    try:
+        hits = await find_similar_documents(db, str(current_user.id), doc_uuid, limit=limit)
+    except Exception as e:
+        logger.error(f"Error finding documents similar to {document_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to find similar documents: {str(e)}"
+        )
+    
+    if hits is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Document with ID {document_id} not found"
+        )
+    
+    return [
+        SimilarDocument(**DocumentListItem.model_validate(row).model_dump(), score=score)
+        for row, score in hits
+    ]
+
 @router.delete("/history/{document_id}")
 async def delete_classification(
     document_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a classification record"""
     try:
         # Validate UUID format
         doc_uuid = uuid.UUID(document_id)
         
-        success = delete_document(db, doc_uuid)
+        success = await delete_document(db, doc_uuid)
         if not success:
             raise HTTPException(
                 status_code=404,
@@ -160,79 +360,24 @@ async def delete_classification(
 
 @router.get("/stats")
 async def get_classification_stats(
+    request: Request,
     user_id: Optional[str] = Query(None, description="Filter by user ID"),
-    db: Session = Depends(get_db)
+    start_date: Optional[date] = Query(None, description="First day to include (UTC)"),
+    end_date: Optional[date] = Query(None, description="Last day to include (UTC)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get classification statistics"""
     try:
-        from sqlalchemy import func
-        from models import Document
-        
-        query = db.query(Document)
-        if user_id:
-            query = query.filter(Document.user_id == user_id)
-        
-        # Total count
-        total_documents = query.count()
-        
-        # Count by label
-        label_stats = (
-            query
-            .with_entities(Document.label, func.count(Document.id).label('count'))
-            .group_by(Document.label)
-            .all()
-        )
-        
-        # Count by confidence range
-        confidence_ranges = [
-            ('Very High (≥90%)', 0.9, 1.0),
-            ('High (75-89%)', 0.75, 0.89),
-            ('Medium (60-74%)', 0.6, 0.74),
-            ('Low (<60%)', 0.0, 0.59)
-        ]
-        
-        confidence_stats = []
-        for range_name, min_conf, max_conf in confidence_ranges:
-            count = (
-                query
-                .filter(Document.confidence >= min_conf)
-                .filter(Document.confidence <= max_conf)
-                .count()
-            )
-            confidence_stats.append({
-                'range': range_name,
-                'count': count
-            })
-        
-        # Override statistics
-        override_stats = (
-            query
-            .with_entities(
-                Document.override_reason, 
-                func.count(Document.id).label('count')
-            )
-            .group_by(Document.override_reason)
-            .all()
-        )
-        
-        # Disagreement count
-        disagreement_count = query.filter(Document.disagreement == True).count()
-        
-        return {
-            'total_documents': total_documents,
-            'label_distribution': [
-                {'label': label, 'count': count} for label, count in label_stats
-            ],
-            'confidence_distribution': confidence_stats,
-            'override_methods': [
-                {'method': method, 'count': count} for method, count in override_stats
-            ],
-            'disagreement_count': disagreement_count,
-            'agreement_rate': (
-                (total_documents - disagreement_count) / total_documents * 100
-                if total_documents > 0 else 0
-            )
-        }
+        async def build():
+            if settings.STATS_USE_ROLLUP:
+                return await get_stats_from_rollup(db, user_id, start_date, end_date)
+            return await get_stats_from_documents(db, user_id, start_date, end_date)
+        
+        return await conditional_response(
+            request, db, user_id, "stats",
+            {"start_date": start_date, "end_date": end_date, "rollup": settings.STATS_USE_ROLLUP},
+            Dict[str, Any], build
+        )
         
     except Exception as e:
         logger.error(f"Error getting classification stats: {e}")
@@ -240,3 +385,32 @@ async def get_classification_stats(
             status_code=500,
             detail=f"Failed to retrieve statistics: {str(e)}"
         )
+
+@router.get("/timings")
+async def get_classification_timings(
+    user_id: Optional[str] = Query(None, description="Filter by user ID (admins only; others see their own documents)"),
+    start_date: Optional[date] = Query(None, description="First day to include (UTC)"),
+    end_date: Optional[date] = Query(None, description="Last day to include (UTC)"),
+    limit: int = Query(10000, ge=1, le=100000, description="Most recent documents to include"),
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get per-stage latency percentiles, overall and by label and file type
+    
+    Covers the current user's documents; admins may pass user_id, or omit it
+    for every user's documents.
+    """
+    if not is_admin_user(current_user):
+        if user_id is not None and user_id != str(current_user.id):
+            raise HTTPException(status_code=403, detail="Timings of other users are restricted to admin users")
+        user_id = str(current_user.id)
+    
+    try:
+        return await get_timing_percentiles(db, user_id, start_date, end_date, limit=limit)
+        
+    except Exception as e:
+        logger.error(f"Error getting classification timings: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve timings: {str(e)}"
+        )
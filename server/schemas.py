@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 import uuid
 
@@ -63,6 +63,8 @@ class DocumentBase(BaseModel):
     summary: Optional[str] = None
     raw_text: Optional[str] = None
     user_id: Optional[str] = None  # Store UUID as string
+    file_type: Optional[str] = Field(None, max_length=16)
+    timings: Optional[Dict[str, float]] = None  # stage -> milliseconds
 
 class DocumentCreate(DocumentBase):
     """Schema for creating a Document"""
@@ -87,6 +89,39 @@ class DocumentResponse(DocumentBase):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+class DocumentListItem(BaseModel):
+    """Compact Document projection for history listings (no text columns)"""
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: uuid.UUID
+    filename: str
+    label: str
+    confidence: float
+    override_reason: Optional[str] = None
+    disagreement: bool = False
+    created_at: Optional[datetime] = None
+
+class HistoryPage(BaseModel):
+    """Schema for keyset-paginated history response"""
+    items: list[DocumentListItem]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+class SearchResult(DocumentListItem):
+    """Schema for a single full-text search hit"""
+    rank: float
+    snippet: Optional[str] = None  # HTML: escaped document text with matches in <b> tags
+
+class SearchResponse(BaseModel):
+    """Schema for full-text search response"""
+    items: list[SearchResult]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+class SimilarDocument(DocumentListItem):
+    """Schema for a document similar to a given one"""
+    score: float  # cosine similarity
+
 class ClassificationResult(BaseModel):
     """Schema for classification endpoint response"""
     label: str
@@ -96,6 +131,7 @@ class ClassificationResult(BaseModel):
     override_reason: str
     disagreement: bool
     document_id: Optional[str] = None  # UUID of saved document
+    timings: Optional[Dict[str, float]] = None  # stage -> milliseconds, when requested
 
 class HistoryResponse(BaseModel):
     """Schema for history endpoint response"""
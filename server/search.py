@@ -0,0 +1,194 @@
+"""
+Full-text search over document filenames, summaries and OCR text.
+PostgreSQL keeps a weighted tsvector per document in document_search with a
+GIN index; SQLite uses an FTS5 virtual table. The index is written by crud
+alongside each document, and snippets are highlighted from the stored text.
+"""
+
+import re
+import uuid
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import DateTime, UUID, bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+POSTGRES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS document_search (
+        document_id UUID PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+        user_id VARCHAR(36),
+        created_at TIMESTAMPTZ,
+        search_vector TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_document_search_vector ON document_search USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_document_search_user_id ON document_search (user_id)",
+]
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS document_search USING fts5(
+        document_id UNINDEXED,
+        user_id UNINDEXED,
+        filename,
+        summary,
+        raw_text,
+        tokenize = 'porter unicode61'
+    )
+    """,
+]
+
+# Filename matches rank above summary matches, which rank above body text
+POSTGRES_INSERT = text("""
+    INSERT INTO document_search (document_id, user_id, created_at, search_vector)
+    VALUES (
+        :document_id, :user_id, :created_at,
+        setweight(to_tsvector(CAST(:language AS regconfig), coalesce(:filename, '')), 'A') ||
+        setweight(to_tsvector(CAST(:language AS regconfig), coalesce(:summary, '')), 'B') ||
+        setweight(to_tsvector(CAST(:language AS regconfig), coalesce(:raw_text, '')), 'C')
+    )
+""").bindparams(
+    bindparam("document_id", type_=UUID(as_uuid=True)),
+    bindparam("created_at", type_=DateTime(timezone=True))
+)
+
+POSTGRES_SEARCH = text("""
+    SELECT document_id, ts_rank_cd(search_vector, query) AS rank
+    FROM document_search, websearch_to_tsquery(CAST(:language AS regconfig), :query) AS query
+    WHERE user_id = :user_id AND search_vector @@ query
+    ORDER BY rank DESC, created_at DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+SQLITE_INSERT = text("""
+    INSERT INTO document_search (document_id, user_id, filename, summary, raw_text)
+    VALUES (:document_id, :user_id, :filename, :summary, :raw_text)
+""")
+
+# bm25() is lower-is-better, so it is negated into a higher-is-better rank
+SQLITE_SEARCH = text("""
+    SELECT document_id, -bm25(document_search, 0.0, 0.0, 10.0, 5.0, 1.0) AS rank
+    FROM document_search
+    WHERE document_search MATCH :query AND user_id = :user_id
+    ORDER BY rank DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+POSTGRES_DELETE = text("DELETE FROM document_search WHERE document_id = :document_id").bindparams(
+    bindparam("document_id", type_=UUID(as_uuid=True))
+)
+
+SQLITE_DELETE = text("DELETE FROM document_search WHERE document_id = :document_id")
+
+STATEMENTS = {
+    "postgresql": {"ddl": POSTGRES_DDL, "insert": POSTGRES_INSERT, "delete": POSTGRES_DELETE, "search": POSTGRES_SEARCH},
+    "sqlite": {"ddl": SQLITE_DDL, "insert": SQLITE_INSERT, "delete": SQLITE_DELETE, "search": SQLITE_SEARCH},
+}
+
+def _statements(dialect_name: str) -> dict:
+    if dialect_name not in STATEMENTS:
+        raise ValueError(f"Full-text search does not support database backend: {dialect_name}")
+    return STATEMENTS[dialect_name]
+
+def get_search_terms(query: str) -> List[str]:
+    """Split a search query into plain word terms"""
+    return re.findall(r"\w+", query.lower())
+
+def _fts5_query(query: str) -> str:
+    """Quote each term so user input is never parsed as FTS5 syntax"""
+    return " ".join(f'"{term}"' for term in get_search_terms(query))
+
+def _document_key(dialect_name: str, document_id: uuid.UUID) -> Any:
+    # SQLite stores Document.id as 32-char hex; keep the FTS column joinable
+    return document_id.hex if dialect_name == "sqlite" else document_id
+
+def _index_params(dialect_name: str, documents: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    params = []
+    for document in documents:
+        row = {
+            "document_id": _document_key(dialect_name, document["id"]),
+            "user_id": document.get("user_id"),
+            "filename": document.get("filename"),
+            "summary": document.get("summary"),
+            "raw_text": document.get("raw_text"),
+        }
+        if dialect_name == "postgresql":
+            row["created_at"] = document.get("created_at")
+            row["language"] = settings.SEARCH_LANGUAGE
+        params.append(row)
+    return params
+
+def create_search_index(conn) -> None:
+    """Create the search table and indexes for the connected backend (sync connection)"""
+    dialect_name = conn.dialect.name
+    if dialect_name not in STATEMENTS:
+        logger.warning(f"Full-text search not available for database backend: {dialect_name}")
+        return
+    
+    for statement in STATEMENTS[dialect_name]["ddl"]:
+        conn.execute(text(statement))
+
+async def index_documents(db: AsyncSession, documents: List[Dict[str, Any]]) -> None:
+    """Add documents to the search index inside the caller's transaction
+
+    Each document dict needs id, user_id, filename, summary, raw_text and created_at.
+    """
+    if documents:
+        dialect_name = db.bind.dialect.name
+        await db.execute(_statements(dialect_name)["insert"], _index_params(dialect_name, documents))
+
+async def remove_from_index(db: AsyncSession, document_ids: List[uuid.UUID]) -> None:
+    """Remove documents from the search index inside the caller's transaction"""
+    if document_ids:
+        dialect_name = db.bind.dialect.name
+        await db.execute(
+            _statements(dialect_name)["delete"],
+            [{"document_id": _document_key(dialect_name, document_id)} for document_id in document_ids]
+        )
+
+def rebuild_search_index(conn, documents: Iterable[Dict[str, Any]], batch_size: int = 500) -> int:
+    """Reindex the given documents from scratch (sync connection)"""
+    dialect_name = conn.dialect.name
+    insert_statement = _statements(dialect_name)["insert"]
+    conn.execute(text("DELETE FROM document_search"))
+    
+    indexed = 0
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            conn.execute(insert_statement, _index_params(dialect_name, batch))
+            indexed += len(batch)
+            batch = []
+    
+    if batch:
+        conn.execute(insert_statement, _index_params(dialect_name, batch))
+        indexed += len(batch)
+    
+    return indexed
+
+async def search_document_ids(
+    db: AsyncSession,
+    user_id: str,
+    query: str,
+    limit: int = 20,
+    offset: int = 0
+) -> List[Tuple[uuid.UUID, float]]:
+    """Get (document_id, rank) pairs for a user's documents, best match first"""
+    if not get_search_terms(query):
+        return []
+    
+    dialect_name = db.bind.dialect.name
+    if dialect_name == "sqlite":
+        params = {"query": _fts5_query(query)}
+    else:
+        params = {"language": settings.SEARCH_LANGUAGE, "query": query}
+    
+    result = await db.execute(
+        _statements(dialect_name)["search"],
+        {**params, "user_id": user_id, "limit": limit, "offset": offset}
+    )
+    return [(uuid.UUID(str(document_id)), float(rank)) for document_id, rank in result.all()]
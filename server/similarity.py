@@ -0,0 +1,588 @@
+"""
+Semantic similarity search over stored documents.
+Each user's document embeddings are appended to a float16 record file under
+VECTOR_INDEX_DIR that is memory-mapped for queries. Queries are a chunked
+dot product; once a user has more than VECTOR_IVF_THRESHOLD vectors, an IVF
+partition (spherical k-means centroids) limits each query to the nearest
+partitions. New documents are embedded on a background thread as crud
+writes them. Deletions append tombstones; once more than
+VECTOR_COMPACT_FRACTION of a user's rows are deleted, the live rows are
+rewritten into a new file.
+"""
+
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from config import settings
+from metrics import register_queue
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only safe from a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SCAN_CHUNK_ROWS = 65536
+IVF_TRAIN_ITERATIONS = 10
+IVF_REBUILD_GROWTH = 1.5  # retrain once the index grows 50% past the last build
+
+TOMBSTONE_DTYPE = np.dtype([("id", "<u8", (2,)), ("row_limit", "<u8")])
+# A tombstone file starts with a record for the nil UUID whose row_limit is
+# the inode of the vectors file its row numbers refer to (files written
+# before compaction existed have no header)
+TOMBSTONE_HEADER_ID = (0, 0)
+CONSISTENT_READ_ATTEMPTS = 100  # readers wait up to ~0.5s for a compaction to finish replacing files
+
+def _id_parts(document_id: uuid.UUID) -> Tuple[int, int]:
+    raw = document_id.bytes
+    return int.from_bytes(raw[:8], "little"), int.from_bytes(raw[8:], "little")
+
+def _id_from_parts(parts) -> uuid.UUID:
+    return uuid.UUID(bytes=int(parts[0]).to_bytes(8, "little") + int(parts[1]).to_bytes(8, "little"))
+
+@contextmanager
+def _locked(path: str):
+    """Open a file for appending under an exclusive lock
+
+    Compaction replaces the file while holding the lock, so a file that was
+    replaced while we waited for it is reopened.
+    """
+    while True:
+        f = open(path, "ab")
+        if fcntl is None:
+            break
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        f.close()
+    try:
+        yield f
+    finally:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+def _append_locked(path: str, data: bytes) -> None:
+    """Append bytes under an exclusive lock so API workers never interleave records"""
+    with _locked(path) as f:
+        f.write(data)
+        f.flush()
+
+class VectorIndex:
+    """Append-only, memory-mapped float16 vector store for one user"""
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self.dtype = np.dtype([("id", "<u8", (2,)), ("vector", "<f2", (dim,))])
+        self.vectors_path = os.path.join(directory, "vectors.f16")
+        self.tombstones_path = os.path.join(directory, "deleted.bin")
+        self.ivf_path = os.path.join(directory, "ivf.npz")
+        self._records: Optional[np.memmap] = None
+        self._vectors_file: Optional[Tuple[int, int]] = None  # (inode, rows) currently mapped
+        self._tombstones: Dict[Tuple[int, int], int] = {}
+        self._tombstones_file: Optional[Tuple[int, int]] = None  # (inode, size) currently loaded
+        self._tombstones_vectors_ino: Optional[int] = None
+        self._dead: Optional[np.ndarray] = None  # rows hidden by a tombstone
+        self._ivf: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._ivf_loaded: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._ivf_vectors_ino: Optional[int] = None
+        self._ivf_mtime = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        self._refresh()
+        return 0 if self._records is None else len(self._records)
+
+    @property
+    def dead_rows(self) -> int:
+        return 0 if self._dead is None else int(self._dead.sum())
+
+    def add(self, document_ids: List[uuid.UUID], vectors: np.ndarray) -> None:
+        """Append vectors for the given documents"""
+        records = np.zeros(len(document_ids), dtype=self.dtype)
+        records["id"] = [_id_parts(document_id) for document_id in document_ids]
+        records["vector"] = vectors.astype(np.float16)
+        _append_locked(self.vectors_path, records.tobytes())
+
+    def remove(self, document_ids: List[uuid.UUID]) -> None:
+        """Hide every vector currently stored for the given documents"""
+        # Held so a compaction cannot renumber the rows under row_limit
+        with _locked(self.tombstones_path) as f:
+            row_limit = len(self)
+            tombstones = np.zeros(len(document_ids), dtype=TOMBSTONE_DTYPE)
+            tombstones["id"] = [_id_parts(document_id) for document_id in document_ids]
+            tombstones["row_limit"] = row_limit
+            if f.tell() == 0:
+                tombstones = np.concatenate([self._tombstone_header(self._vectors_ino()), tombstones])
+            f.write(tombstones.tobytes())
+            f.flush()
+
+    @staticmethod
+    def _tombstone_header(vectors_ino: Optional[int]) -> np.ndarray:
+        header = np.zeros(1, dtype=TOMBSTONE_DTYPE)
+        header["id"] = [TOMBSTONE_HEADER_ID]
+        header["row_limit"] = vectors_ino or 0
+        return header
+
+    def _vectors_ino(self) -> Optional[int]:
+        return None if self._vectors_file is None else self._vectors_file[0]
+
+    def _refresh(self) -> None:
+        """Re-map the files if another thread or worker appended to or compacted them"""
+        with self._lock:
+            for _ in range(CONSISTENT_READ_ATTEMPTS):
+                self._refresh_vectors()
+                self._refresh_tombstones()
+                # A compaction replaces the tombstones before the vectors file
+                if self._tombstones_vectors_ino in (None, self._vectors_ino()):
+                    break
+                time.sleep(0.005)
+            else:
+                logger.warning(f"Vector index files in {self.directory} do not match; using them as they are")
+            self._refresh_ivf()
+
+    def _refresh_vectors(self) -> None:
+        try:
+            f = open(self.vectors_path, "rb")
+        except FileNotFoundError:
+            self._records, self._vectors_file, self._dead = None, None, None
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            rows = stat.st_size // self.dtype.itemsize
+            if self._vectors_file == (stat.st_ino, rows):
+                return
+            previous = self._vectors_file
+            self._vectors_file = (stat.st_ino, rows)
+            self._records = np.memmap(f, dtype=self.dtype, mode="r", shape=(rows,)) if rows else None
+
+        # Appended rows only need their own tombstone check
+        if previous is not None and previous[0] == stat.st_ino and self._dead is not None and rows > len(self._dead):
+            self._dead = np.concatenate([self._dead, self._dead_mask(len(self._dead))])
+        else:
+            self._dead = self._dead_mask()
+
+    def _refresh_tombstones(self) -> None:
+        try:
+            stat = os.stat(self.tombstones_path)
+            current = (stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            current = None
+        if current == self._tombstones_file:
+            return
+
+        tombstones = np.fromfile(self.tombstones_path, dtype=TOMBSTONE_DTYPE) if current else np.zeros(0, TOMBSTONE_DTYPE)
+        self._tombstones_vectors_ino = None
+        if len(tombstones) and tuple(int(part) for part in tombstones[0]["id"]) == TOMBSTONE_HEADER_ID:
+            self._tombstones_vectors_ino = int(tombstones[0]["row_limit"]) or None
+            tombstones = tombstones[1:]
+        self._tombstones = {}
+        for parts, row_limit in zip(tombstones["id"], tombstones["row_limit"]):
+            key = (int(parts[0]), int(parts[1]))
+            self._tombstones[key] = max(self._tombstones.get(key, 0), int(row_limit))
+        self._tombstones_file = current
+        self._dead = self._dead_mask()
+
+    def _refresh_ivf(self) -> None:
+        if os.path.exists(self.ivf_path):
+            mtime = os.path.getmtime(self.ivf_path)
+            if mtime != self._ivf_mtime:
+                with np.load(self.ivf_path) as data:
+                    self._ivf_loaded = (data["centroids"], data["assignments"])
+                    self._ivf_vectors_ino = int(data["vectors_ino"]) if "vectors_ino" in data.files else None
+                self._ivf_mtime = mtime
+        # A partition of another (pre-compaction) vectors file numbers rows differently
+        usable = (
+            self._ivf_loaded is not None
+            and self._ivf_vectors_ino in (None, self._vectors_ino())
+            and self._records is not None
+            and len(self._ivf_loaded[1]) <= len(self._records)
+        )
+        self._ivf = self._ivf_loaded if usable else None
+
+    def _dead_mask(self, start: int = 0) -> Optional[np.ndarray]:
+        """Rows from start on that a tombstone hides"""
+        if self._records is None:
+            return None
+        dead = np.zeros(len(self._records) - start, dtype=bool)
+        if not self._tombstones:
+            return dead
+        tombstoned_hi = np.fromiter((key[0] for key in self._tombstones), dtype=np.uint64, count=len(self._tombstones))
+        for chunk_start in range(start, len(self._records), SCAN_CHUNK_ROWS):
+            ids = self._records[chunk_start:chunk_start + SCAN_CHUNK_ROWS]["id"]
+            for offset in np.flatnonzero(np.isin(ids[:, 0], tombstoned_hi)):
+                row = chunk_start + int(offset)
+                dead[row - start] = not self._is_live(row, ids[offset])
+        return dead
+
+    def _is_live(self, row: int, parts) -> bool:
+        return self._tombstones.get((int(parts[0]), int(parts[1])), 0) <= row
+
+    def get_vector(self, document_id: uuid.UUID) -> Optional[np.ndarray]:
+        """Get the latest live vector stored for a document"""
+        self._refresh()
+        if self._records is None:
+            return None
+
+        hi, lo = _id_parts(document_id)
+        for start in range(len(self._records) - SCAN_CHUNK_ROWS, -SCAN_CHUNK_ROWS, -SCAN_CHUNK_ROWS):
+            chunk = self._records[max(start, 0):start + SCAN_CHUNK_ROWS]
+            matches = np.flatnonzero((chunk["id"][:, 0] == hi) & (chunk["id"][:, 1] == lo))
+            if len(matches):
+                row = max(start, 0) + int(matches[-1])
+                if not self._is_live(row, (hi, lo)):
+                    return None
+                return self._records[row]["vector"].astype(np.float32)
+        return None
+
+    def _candidate_rows(self, query: np.ndarray, records, ivf) -> Optional[np.ndarray]:
+        """Rows in the nearest IVF partitions plus rows added since the last build"""
+        if ivf is None:
+            return None
+
+        centroids, assignments = ivf
+        nprobe = min(settings.VECTOR_IVF_NPROBE, len(centroids))
+        probes = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.flatnonzero(np.isin(assignments, probes))
+        tail = np.arange(len(assignments), len(records))
+        return np.concatenate([rows, tail])
+
+    def _top_rows(self, records, dead, query, candidates, fetch) -> Tuple[np.ndarray, np.ndarray]:
+        """The fetch best-scoring live rows, unordered"""
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        total = len(records) if candidates is None else len(candidates)
+
+        for start in range(0, total, SCAN_CHUNK_ROWS):
+            if candidates is None:
+                rows = np.arange(start, min(start + SCAN_CHUNK_ROWS, total))
+                vectors = records[start:start + SCAN_CHUNK_ROWS]["vector"]
+            else:
+                rows = candidates[start:start + SCAN_CHUNK_ROWS]
+                vectors = records[rows]["vector"]
+
+            scores = vectors.astype(np.float32) @ query
+            if dead is not None:
+                scores[dead[start:start + len(rows)] if candidates is None else dead[rows]] = -np.inf
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > fetch:
+                keep = np.argpartition(-best_scores, fetch - 1)[:fetch]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        live = best_scores > -np.inf
+        return best_rows[live], best_scores[live]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        exclude: Optional[uuid.UUID] = None
+    ) -> List[Tuple[uuid.UUID, float]]:
+        """Get the k most similar live documents as (document_id, cosine score)"""
+        self._refresh()
+        records, dead, ivf = self._records, self._dead, self._ivf
+        if records is None:
+            return []
+
+        query = query.astype(np.float32)
+        candidates = self._candidate_rows(query, records, ivf)
+        exclude_parts = _id_parts(exclude) if exclude else None
+
+        # Tombstoned rows never make the cut; one extra row covers the excluded
+        # document, and the fetch widens only if older vectors of re-added
+        # documents crowd out the k results
+        fetch = k + 1
+        while True:
+            best_rows, best_scores = self._top_rows(records, dead, query, candidates, fetch)
+            results = []
+            seen = set()
+            for position in np.argsort(-best_scores):
+                row = int(best_rows[position])
+                parts = records[row]["id"]
+                key = (int(parts[0]), int(parts[1]))
+                if key == exclude_parts or key in seen:
+                    continue
+                seen.add(key)
+                results.append((_id_from_parts(parts), float(best_scores[position])))
+                if len(results) >= k:
+                    return results
+            if len(best_rows) < fetch:
+                return results
+            fetch *= 2
+
+    def maybe_compact(self) -> bool:
+        """Rewrite the live rows into a new file once too many rows are tombstoned"""
+        if not self._needs_compaction():
+            return False
+
+        # Same lock order as remove() (tombstones) and add() (vectors)
+        with _locked(self.tombstones_path), _locked(self.vectors_path):
+            if not self._needs_compaction():
+                return False  # another worker compacted it first
+            records, live = self._records, np.flatnonzero(~self._dead)
+
+            vectors_temp = self.vectors_path + ".compact.tmp"
+            with open(vectors_temp, "wb") as f:
+                for start in range(0, len(live), SCAN_CHUNK_ROWS):
+                    f.write(records[live[start:start + SCAN_CHUNK_ROWS]].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            vectors_ino = os.stat(vectors_temp).st_ino
+
+            tombstones_temp = self.tombstones_path + ".compact.tmp"
+            self._tombstone_header(vectors_ino).tofile(tombstones_temp)
+
+            # Kept rows keep their order, so the partition carries over
+            ivf_temp = None
+            if self._ivf is not None:
+                centroids, assignments = self._ivf
+                ivf_temp = self.ivf_path + ".compact.tmp.npz"
+                np.savez(
+                    ivf_temp,
+                    centroids=centroids,
+                    assignments=assignments[live[live < len(assignments)]],
+                    vectors_ino=np.int64(vectors_ino)
+                )
+
+            # Readers that see the new tombstones wait for the new vectors file
+            os.replace(tombstones_temp, self.tombstones_path)
+            if ivf_temp is not None:
+                os.replace(ivf_temp, self.ivf_path)
+            os.replace(vectors_temp, self.vectors_path)
+
+        logger.info(f"Compacted vector index in {self.directory}: {len(records)} rows to {len(live)}")
+        return True
+
+    def _needs_compaction(self) -> bool:
+        rows = len(self)
+        return rows > 0 and self.dead_rows > rows * settings.VECTOR_COMPACT_FRACTION
+
+    def maybe_build_ivf(self) -> bool:
+        """Train or retrain the IVF partition once the index is large enough"""
+        rows = len(self)
+        if rows < settings.VECTOR_IVF_THRESHOLD:
+            return False
+        if self._ivf is not None and rows < len(self._ivf[1]) * IVF_REBUILD_GROWTH:
+            return False
+
+        records = self._records
+        nlist = int(np.clip(np.sqrt(rows), 16, 4096))
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(rows, size=min(rows, nlist * 64), replace=False))
+        sample = records[sample_rows]["vector"].astype(np.float32)
+
+        # Spherical k-means: vectors are unit length, so assign by dot product
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = sample[labels == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1.0)
+                else:
+                    centroids[cluster] = sample[rng.integers(len(sample))]
+
+        assignments = np.empty(rows, dtype=np.int32)
+        for start in range(0, rows, SCAN_CHUNK_ROWS):
+            vectors = records[start:start + SCAN_CHUNK_ROWS]["vector"].astype(np.float32)
+            assignments[start:start + len(vectors)] = np.argmax(vectors @ centroids.T, axis=1)
+
+        temp_path = self.ivf_path + ".tmp.npz"
+        np.savez(temp_path, centroids=centroids, assignments=assignments, vectors_ino=np.int64(self._vectors_ino()))
+        os.replace(temp_path, self.ivf_path)
+        logger.info(f"Built IVF index with {nlist} partitions over {rows} vectors in {self.directory}")
+        return True
+
+class SimilarityIndexer:
+    """Embed new documents in the background and keep per-user indexes current"""
+
+    def __init__(self, root: str = settings.VECTOR_INDEX_DIR):
+        self.root = root
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._indexes_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self.indexed_count = 0
+        self.failed_count = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _user_dir(self, user_id: Optional[str]) -> str:
+        return os.path.join(self.root, user_id or "_anonymous")
+
+    def get_index(self, user_id: Optional[str], create: bool = False) -> Optional[VectorIndex]:
+        """Get a user's index; None if it does not exist and create is False"""
+        key = user_id or ""
+        with self._indexes_lock:
+            if key in self._indexes:
+                return self._indexes[key]
+
+            directory = self._user_dir(user_id)
+            meta_path = os.path.join(directory, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                if meta["model"] != settings.EMBEDDING_MODEL:
+                    logger.warning(
+                        f"Vector index in {directory} was built with {meta['model']}; "
+                        f"run init_db.py --rebuild-embeddings"
+                    )
+            elif create:
+                from model.embeddings import get_embedding_dim
+                os.makedirs(directory, exist_ok=True)
+                meta = {"model": settings.EMBEDDING_MODEL, "dim": get_embedding_dim()}
+                with open(meta_path, "w") as f:
+                    json.dump(meta, f)
+            else:
+                return None
+
+            index = VectorIndex(directory, meta["dim"])
+            self._indexes[key] = index
+            return index
+
+    def _ensure_worker(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._worker, name="similarity-indexer", daemon=True
+                )
+                self._thread.start()
+
+    def schedule(self, documents: Iterable[Dict[str, Any]]) -> None:
+        """Queue documents (id, user_id, raw_text, summary) for embedding"""
+        if not settings.SIMILARITY_ENABLED:
+            return
+
+        for document in documents:
+            text = document.get("raw_text") or document.get("summary")
+            if text:
+                self._queue.put(("add", document.get("user_id"), document["id"], text))
+        self._ensure_worker()
+
+    def remove(self, user_id: Optional[str], document_ids: List[uuid.UUID]) -> None:
+        """Queue removal of documents (ordered after any pending adds)"""
+        if not settings.SIMILARITY_ENABLED:
+            return
+
+        self._queue.put(("remove", user_id, document_ids, None))
+        self._ensure_worker()
+
+    def _process(self, batch: List[tuple]) -> None:
+        from model.embeddings import embed_texts
+
+        adds = [item for item in batch if item[0] == "add"]
+        vectors = iter(embed_texts([item[3] for item in adds])) if adds else iter(())
+
+        # Apply in queue order so a remove never overtakes the add before it
+        for action, user_id, payload, _ in batch:
+            if action == "add":
+                self.get_index(user_id, create=True).add([payload], next(vectors)[None, :])
+                self.indexed_count += 1
+            else:
+                index = self.get_index(user_id)
+                if index is not None:
+                    index.remove(payload)
+
+        for user_id in {item[1] for item in batch if item[0] == "remove"}:
+            index = self.get_index(user_id)
+            if index is not None:
+                index.maybe_compact()
+        for user_id in {item[1] for item in adds}:
+            self.get_index(user_id).maybe_build_ivf()
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            while len(batch) < settings.EMBEDDING_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            try:
+                self._process(batch)
+            except Exception as e:
+                self.failed_count += len(batch)
+                logger.error(f"Similarity indexing failed for {len(batch)} items: {e}")
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Finish queued work and stop the worker thread"""
+        with self._thread_lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def rebuild(self, documents: Iterable[Dict[str, Any]], batch_size: int = 256) -> int:
+        """Drop all indexes and re-embed the given documents synchronously"""
+        from model.embeddings import embed_texts
+
+        with self._indexes_lock:
+            self._indexes.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+        indexed = 0
+        batch = []
+
+        def flush():
+            nonlocal indexed
+            vectors = embed_texts([document["raw_text"] or document["summary"] for document in batch])
+            by_user: Dict[Optional[str], List[int]] = {}
+            for position, document in enumerate(batch):
+                by_user.setdefault(document.get("user_id"), []).append(position)
+            for user_id, positions in by_user.items():
+                self.get_index(user_id, create=True).add(
+                    [batch[position]["id"] for position in positions], vectors[positions]
+                )
+            indexed += len(batch)
+            batch.clear()
+
+        for document in documents:
+            if document.get("raw_text") or document.get("summary"):
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+
+        for user_id in os.listdir(self.root) if os.path.exists(self.root) else []:
+            self.get_index(None if user_id == "_anonymous" else user_id).maybe_build_ivf()
+        return indexed
+
+    def stats(self) -> dict:
+        """Get queue depth and indexing counters"""
+        return {
+            "enabled": settings.SIMILARITY_ENABLED,
+            "queue_depth": self.queue_depth,
+            "indexed": self.indexed_count,
+            "failed": self.failed_count
+        }
+
+# Create global instance
+similarity_indexer = SimilarityIndexer()
+register_queue("similarity_indexer", lambda: similarity_indexer.queue_depth)
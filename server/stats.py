@@ -0,0 +1,224 @@
+"""
+Classification statistics.
+Counts are kept in the document_stats_daily rollup, which crud updates in
+the same transaction as every document insert, update and delete, so the
+stats endpoint reads a handful of rollup rows instead of scanning documents.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, case, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Document, DocumentStatsDaily
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (display name, rollup column, lower bound inclusive); upper bound is the
+# previous bucket's lower bound, so the ranges leave no gaps
+CONFIDENCE_BUCKETS = [
+    ("Very High (≥90%)", "very_high_count", 0.9),
+    ("High (75-89%)", "high_count", 0.75),
+    ("Medium (60-74%)", "medium_count", 0.6),
+    ("Low (<60%)", "low_count", float("-inf")),
+]
+
+COUNT_COLUMNS = ["document_count", "disagreement_count"] + [column for _, column, _ in CONFIDENCE_BUCKETS]
+
+def _value(document: Any, field: str) -> Any:
+    """Read a field from a Document or a row dict"""
+    if isinstance(document, dict):
+        return document.get(field)
+    return getattr(document, field)
+
+def _to_day(value: Any) -> date:
+    """Convert a created_at value (or date string from SQLite) to a UTC day"""
+    if value is None:
+        return datetime.now(timezone.utc).date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date()
+    return value
+
+def confidence_bucket(confidence: float) -> str:
+    """Get the rollup column counting a confidence score"""
+    for _, column, lower in CONFIDENCE_BUCKETS:
+        if confidence >= lower:
+            return column
+    return CONFIDENCE_BUCKETS[-1][1]
+
+def _rollup_deltas(documents: Iterable[Any], sign: int) -> Dict[Tuple, Dict[str, int]]:
+    """Group documents by rollup key and sum their count changes"""
+    deltas: Dict[Tuple, Dict[str, int]] = {}
+    for document in documents:
+        key = (
+            _value(document, "user_id") or "",
+            _to_day(_value(document, "created_at")),
+            _value(document, "label"),
+            _value(document, "override_reason") or "",
+        )
+        counts = deltas.setdefault(key, dict.fromkeys(COUNT_COLUMNS, 0))
+        counts["document_count"] += sign
+        if _value(document, "disagreement"):
+            counts["disagreement_count"] += sign
+        counts[confidence_bucket(_value(document, "confidence"))] += sign
+    return deltas
+
+def _upsert_statement(dialect_name: str):
+    """Build an insert that adds to the counts of an existing rollup row"""
+    if dialect_name == "postgresql":
+        stmt = postgresql.insert(DocumentStatsDaily)
+    elif dialect_name == "sqlite":
+        stmt = sqlite.insert(DocumentStatsDaily)
+    else:
+        raise ValueError(f"Stats rollup does not support database backend: {dialect_name}")
+    
+    table = DocumentStatsDaily.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key.columns],
+        set_={column: table.c[column] + stmt.excluded[column] for column in COUNT_COLUMNS}
+    )
+
+def _rollup_params(deltas: Dict[Tuple, Dict[str, int]]) -> List[Dict[str, Any]]:
+    return [
+        {"user_id": user_id, "day": day, "label": label, "override_reason": override_reason, **counts}
+        for (user_id, day, label, override_reason), counts in deltas.items()
+    ]
+
+async def apply_stats_delta(db: AsyncSession, documents: Iterable[Any], sign: int = 1) -> None:
+    """Add (sign=1) or remove (sign=-1) documents from the rollup
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    deltas = _rollup_deltas(documents, sign)
+    if deltas:
+        await db.execute(_upsert_statement(db.bind.dialect.name), _rollup_params(deltas))
+
+def rebuild_stats_rollup(conn) -> int:
+    """Recompute the whole rollup from the documents table (sync connection)"""
+    conn.execute(DocumentStatsDaily.__table__.delete())
+    
+    rows = conn.execute(
+        select(
+            Document.user_id,
+            Document.created_at,
+            Document.label,
+            Document.override_reason,
+            Document.disagreement,
+            Document.confidence
+        )
+        .execution_options(yield_per=5000)
+    ).mappings()
+    
+    deltas = _rollup_deltas(rows, 1)
+    if deltas:
+        conn.execute(insert(DocumentStatsDaily), _rollup_params(deltas))
+    return len(deltas)
+
+def _build_stats(rows: Iterable[Any]) -> dict:
+    """Fold (label, override_reason, counts...) rows into the stats response"""
+    total_documents = 0
+    disagreement_count = 0
+    labels: Dict[str, int] = {}
+    overrides: Dict[Optional[str], int] = {}
+    buckets = dict.fromkeys([column for _, column, _ in CONFIDENCE_BUCKETS], 0)
+    
+    for row in rows:
+        count = int(row.document_count or 0)
+        if count <= 0:
+            continue
+        
+        total_documents += count
+        disagreement_count += int(row.disagreement_count or 0)
+        labels[row.label] = labels.get(row.label, 0) + count
+        override_reason = row.override_reason or None
+        overrides[override_reason] = overrides.get(override_reason, 0) + count
+        for column in buckets:
+            buckets[column] += int(getattr(row, column) or 0)
+    
+    return {
+        "total_documents": total_documents,
+        "label_distribution": [
+            {"label": label, "count": count} for label, count in labels.items()
+        ],
+        "confidence_distribution": [
+            {"range": name, "count": buckets[column]} for name, column, _ in CONFIDENCE_BUCKETS
+        ],
+        "override_methods": [
+            {"method": method, "count": count} for method, count in overrides.items()
+        ],
+        "disagreement_count": disagreement_count,
+        "agreement_rate": (
+            (total_documents - disagreement_count) / total_documents * 100
+            if total_documents > 0 else 0
+        )
+    }
+
+async def get_stats_from_rollup(
+    db: AsyncSession,
+    user_id: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> dict:
+    """Get classification statistics from the daily rollup in one query"""
+    query = select(
+        DocumentStatsDaily.label,
+        DocumentStatsDaily.override_reason,
+        *[func.sum(DocumentStatsDaily.__table__.c[column]).label(column) for column in COUNT_COLUMNS]
+    )
+    
+    if user_id:
+        query = query.where(DocumentStatsDaily.user_id == user_id)
+    if start_date:
+        query = query.where(DocumentStatsDaily.day >= start_date)
+    if end_date:
+        query = query.where(DocumentStatsDaily.day <= end_date)
+    
+    result = await db.execute(
+        query.group_by(DocumentStatsDaily.label, DocumentStatsDaily.override_reason)
+    )
+    return _build_stats(result.all())
+
+async def get_stats_from_documents(
+    db: AsyncSession,
+    user_id: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> dict:
+    """Get classification statistics from documents with one conditional aggregate"""
+    bucket_columns = []
+    upper = None
+    for _, column, lower in CONFIDENCE_BUCKETS:
+        conditions = []
+        if lower != float("-inf"):
+            conditions.append(Document.confidence >= lower)
+        if upper is not None:
+            conditions.append(Document.confidence < upper)
+        bucket_columns.append(func.sum(case((and_(*conditions), 1), else_=0)).label(column))
+        upper = lower
+    
+    query = select(
+        Document.label,
+        Document.override_reason,
+        func.count(Document.id).label("document_count"),
+        func.sum(case((Document.disagreement == True, 1), else_=0)).label("disagreement_count"),
+        *bucket_columns
+    )
+    
+    if user_id:
+        query = query.where(Document.user_id == user_id)
+    if start_date:
+        query = query.where(
+            Document.created_at >= datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+        )
+    if end_date:
+        query = query.where(
+            Document.created_at < datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc)
+        )
+    
+    result = await db.execute(query.group_by(Document.label, Document.override_reason))
+    return _build_stats(result.all())
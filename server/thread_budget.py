@@ -0,0 +1,115 @@
+"""
+CPU thread budget shared by torch, tesseract and the worker processes.
+Left alone, every worker's torch uses all cores for intra-op parallelism
+and every tesseract run starts its own OpenMP pool, so N workers
+oversubscribe the node many times over. Each worker process instead gets
+an equal slice of CPU_BUDGET CPUs: torch's intra-op threads are sized to
+the slice, inter-op threads to TORCH_INTEROP_THREADS, and OCR subprocesses
+inherit OMP_THREAD_LIMIT=OCR_THREADS. With PIN_WORKER_CPUS the process
+(and so its tesseract children) is also pinned to its slice.
+"""
+
+import logging
+import os
+import sys
+from typing import Dict, List, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_layout: Optional[Dict] = None
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on, limited to CPU_BUDGET"""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    if settings.CPU_BUDGET:
+        cpus = cpus[:settings.CPU_BUDGET]
+    return cpus
+
+def plan_thread_budget(
+    worker_index: int = 0,
+    worker_count: Optional[int] = None,
+    cpus: Optional[List[int]] = None,
+    torch_threads: Optional[int] = None
+) -> Dict:
+    """Work out one worker's CPU slice and thread counts without applying them"""
+    worker_count = max(1, worker_count or settings.WORKERS)
+    worker_index %= worker_count
+    cpus = list(cpus) if cpus else available_cpus()
+
+    # Contiguous slices keep a worker's threads on neighbouring cores; with
+    # more workers than CPUs, workers share CPUs round-robin
+    per_worker = len(cpus) // worker_count
+    if per_worker:
+        worker_cpus = cpus[worker_index * per_worker:(worker_index + 1) * per_worker]
+    else:
+        worker_cpus = [cpus[worker_index % len(cpus)]]
+
+    return {
+        "worker_index": worker_index,
+        "worker_count": worker_count,
+        "node_cpus": len(cpus),
+        "cpus": worker_cpus,
+        "torch_threads": max(1, torch_threads or settings.TORCH_THREADS or len(worker_cpus)),
+        "torch_interop_threads": settings.TORCH_INTEROP_THREADS,
+        "ocr_threads": settings.OCR_THREADS,
+        "pinned": False,
+    }
+
+def apply_thread_budget(
+    worker_index: int = 0,
+    worker_count: Optional[int] = None,
+    cpus: Optional[List[int]] = None,
+    torch_threads: Optional[int] = None,
+    pin: Optional[bool] = None
+) -> Dict:
+    """Apply this process's share of the thread budget and log the layout
+
+    Call once per process, after torch is imported and before it runs any
+    inference; torch is only configured if the process already loaded it.
+    """
+    global _layout
+    if not settings.THREAD_BUDGET_ENABLED:
+        _layout = {"enabled": False}
+        return _layout
+
+    layout = plan_thread_budget(worker_index, worker_count, cpus, torch_threads)
+    pin = settings.PIN_WORKER_CPUS if pin is None else pin
+
+    if pin and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, layout["cpus"])
+            layout["pinned"] = True
+        except OSError as e:
+            logger.warning(f"Could not pin worker to CPUs {layout['cpus']}: {e}")
+
+    # Inherited by every tesseract subprocess started from here on
+    os.environ["OMP_THREAD_LIMIT"] = str(layout["ocr_threads"])
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(layout["torch_threads"])
+        try:
+            torch.set_num_interop_threads(layout["torch_interop_threads"])
+        except RuntimeError:
+            # Only settable before torch first runs inter-op work in this process
+            layout["torch_interop_threads"] = torch.get_num_interop_threads()
+    else:
+        layout["torch_threads"] = layout["torch_interop_threads"] = None
+
+    layout["enabled"] = True
+    _layout = layout
+    logger.info(
+        f"Thread budget for pid {os.getpid()}: worker {layout['worker_index'] + 1}/{layout['worker_count']}, "
+        f"cpus {layout['cpus']}{' (pinned)' if layout['pinned'] else ''} of {layout['node_cpus']}, "
+        f"torch {layout['torch_threads']} intra-op / {layout['torch_interop_threads']} inter-op, "
+        f"OCR {layout['ocr_threads']} thread(s)"
+    )
+    return layout
+
+def get_thread_layout() -> Optional[Dict]:
+    """The layout applied in this process, or None if not applied yet"""
+    return _layout
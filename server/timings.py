@@ -0,0 +1,87 @@
+"""
+Per-stage latency percentiles from the timing breakdown stored on each
+document by the classify endpoint.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Document
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 95, 99)
+
+def _summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    """Reduce each stage's durations (milliseconds) to count, mean and percentiles"""
+    summary = {}
+    for stage, values in samples.items():
+        values = np.asarray(values, dtype=np.float64)
+        summary[stage] = {
+            "count": int(len(values)),
+            "mean": round(float(values.mean()), 1),
+            **{
+                f"p{percentile}": round(float(value), 1)
+                for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+            }
+        }
+    return summary
+
+def _add_sample(stages: Dict[str, List[float]], timings: Dict[str, float]) -> None:
+    for stage, duration in timings.items():
+        stages.setdefault(stage, []).append(duration)
+
+async def get_timing_percentiles(
+    db: AsyncSession,
+    user_id: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = 10000
+) -> Dict[str, Any]:
+    """Get stage latency percentiles overall, per label and per file type
+
+    Covers the most recent `limit` documents with a stored breakdown.
+    """
+    query = select(Document.label, Document.file_type, Document.timings).where(Document.timings.isnot(None))
+    
+    if user_id:
+        query = query.where(Document.user_id == user_id)
+    if start_date:
+        query = query.where(
+            Document.created_at >= datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+        )
+    if end_date:
+        query = query.where(
+            Document.created_at < datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc)
+        )
+    
+    result = await db.stream(
+        query
+        .order_by(desc(Document.created_at))
+        .limit(limit)
+        .execution_options(yield_per=1000)
+    )
+    
+    overall: Dict[str, List[float]] = {}
+    by_label: Dict[str, Dict[str, List[float]]] = {}
+    by_file_type: Dict[str, Dict[str, List[float]]] = {}
+    documents = 0
+    
+    async for label, file_type, timings in result:
+        if not timings:
+            continue
+        documents += 1
+        _add_sample(overall, timings)
+        _add_sample(by_label.setdefault(label, {}), timings)
+        _add_sample(by_file_type.setdefault(file_type or "unknown", {}), timings)
+    
+    return {
+        "documents": documents,
+        "percentiles": list(PERCENTILES),
+        "stages": _summarize(overall),
+        "by_label": {label: _summarize(samples) for label, samples in sorted(by_label.items())},
+        "by_file_type": {file_type: _summarize(samples) for file_type, samples in sorted(by_file_type.items())}
+    }
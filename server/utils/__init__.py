@@ -1,5 +1,6 @@
 # Utils package initialization
 from .file_ops import file_ops, FileOperations
+from .cache import TTLCache
 from .timeout import timeout_manager, TimeoutManager, safe_run_with_timeout, llm_timeout, ocr_timeout
 from .helpers import (
     text_helpers, TextHelpers,
@@ -12,6 +13,9 @@ __all__ = [
     # File operations
     'file_ops', 'FileOperations',
     
+    # Caching
+    'TTLCache',
+    
     # Timeout management
     'timeout_manager', 'TimeoutManager', 'safe_run_with_timeout', 
     'llm_timeout', 'ocr_timeout',
@@ -0,0 +1,47 @@
+import zlib
+import logging
+from typing import Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # optional dependency; zlib is always available
+    zstandard = None
+
+# One-byte codec marker prefixed to every stored blob, so rows written with
+# either codec stay readable after the configured codec changes
+ZLIB_MARKER = b"\x00"
+ZSTD_MARKER = b"\x01"
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+def compress_text(text: Optional[str]) -> Optional[bytes]:
+    """Compress text with the configured codec (zstd, falling back to zlib)"""
+    if text is None:
+        return None
+    
+    data = text.encode("utf-8")
+    if settings.TEXT_COMPRESSION == "zstd" and zstandard is not None:
+        return ZSTD_MARKER + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    
+    return ZLIB_MARKER + zlib.compress(data, ZLIB_LEVEL)
+
+def decompress_text(blob: Optional[bytes]) -> Optional[str]:
+    """Decompress a blob produced by compress_text"""
+    if blob is None:
+        return None
+    
+    marker, payload = blob[:1], blob[1:]
+    if marker == ZSTD_MARKER:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed text")
+        data = zstandard.ZstdDecompressor().decompress(payload)
+    elif marker == ZLIB_MARKER:
+        data = zlib.decompress(payload)
+    else:
+        raise ValueError(f"Unknown text compression marker: {marker!r}")
+    
+    return data.decode("utf-8")
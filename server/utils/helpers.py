@@ -1,5 +1,8 @@
 import re
+import html
 import math
+import base64
+import uuid
 from typing import Optional
 from datetime import datetime, timezone
 from config import settings
@@ -62,6 +65,43 @@ class TextHelpers:
         word_counts = Counter(keywords)
         return [word for word, _ in word_counts.most_common(max_keywords)]
     
+    @staticmethod
+    def highlight_snippet(
+        text: str,
+        terms: list[str],
+        max_length: int = 200,
+        start_tag: str = "<b>",
+        end_tag: str = "</b>"
+    ) -> str:
+        """Cut a snippet around the first matching term and wrap every match in tags
+        
+        The snippet is HTML: the document text is escaped, only the tags are markup.
+        """
+        if not text:
+            return ""
+        
+        pattern = re.compile(
+            r"\b(" + "|".join(re.escape(term) for term in terms) + r")\w*",
+            re.IGNORECASE
+        ) if terms else None
+        
+        match = pattern.search(text) if pattern else None
+        start = max(0, match.start() - max_length // 4) if match else 0
+        snippet = text[start:start + max_length]
+        
+        parts = []
+        position = 0
+        for term_match in pattern.finditer(snippet) if pattern else ():
+            parts.append(html.escape(snippet[position:term_match.start()]))
+            parts.append(f"{start_tag}{html.escape(term_match.group(0))}{end_tag}")
+            position = term_match.end()
+        parts.append(html.escape(snippet[position:]))
+        snippet = "".join(parts)
+        
+        prefix = "..." if start > 0 else ""
+        suffix = "..." if start + max_length < len(text) else ""
+        return f"{prefix}{snippet}{suffix}"
+    
     @staticmethod
     def get_text_stats(text: str) -> dict:
         """Get basic text statistics"""
@@ -189,6 +229,22 @@ class PaginationHelpers:
     def get_offset(page: int, per_page: int) -> int:
         """Calculate offset for database query"""
         return (max(1, page) - 1) * per_page
+    
+    @staticmethod
+    def encode_cursor(created_at: datetime, document_id: uuid.UUID) -> str:
+        """Encode a keyset cursor from the last row of a page"""
+        raw = f"{created_at.isoformat()}|{document_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+        """Decode a keyset cursor, raising ValueError if it is malformed"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            created_at, document_id = base64.urlsafe_b64decode(padded).decode().split("|")
+            return datetime.fromisoformat(created_at), uuid.UUID(document_id)
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
 
 # Create global instances
 text_helpers = TextHelpers()
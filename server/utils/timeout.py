@@ -1,8 +1,11 @@
 import concurrent.futures
+import contextvars
 import functools
 import logging
 from typing import Any, Callable, Optional, TypeVar
 from config import settings
+from metrics import FAILURES, TIMEOUTS
+from profiling import profile_worker
 
 logger = logging.getLogger(__name__)
 
@@ -24,16 +27,20 @@ class TimeoutManager:
             timeout = settings.DEFAULT_TIMEOUT
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(func, *args, **kwargs)
+            # In the caller's context, so the function sees the request's profile
+            context = contextvars.copy_context()
+            future = executor.submit(context.run, profile_worker(func), *args, **kwargs)
             try:
                 result = future.result(timeout=timeout)
                 logger.info(f"Function {func.__name__} completed successfully in {timeout}s")
                 return result
             except concurrent.futures.TimeoutError:
                 logger.warning(f"Function {func.__name__} timed out after {timeout}s")
+                TIMEOUTS.labels(function=func.__name__).inc()
                 return default_return
             except Exception as e:
                 logger.error(f"Function {func.__name__} raised exception: {e}")
+                FAILURES.labels(function=func.__name__).inc()
                 return default_return
     
     @staticmethod
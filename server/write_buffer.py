@@ -0,0 +1,198 @@
+"""
+Write-behind buffer for classification results.
+Documents are queued in memory with a pre-generated ID and flushed in
+batched multi-row inserts when the batch fills up or the interval elapses.
+A batch that keeps failing is bisected after WRITE_BEHIND_MAX_RETRIES
+attempts, so rows the database rejects are dropped (and logged) instead of
+blocking every write queued behind them.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+from config import settings
+from metrics import WRITE_BEHIND_DROPPED, register_queue
+from crud import create_documents_bulk
+from database import AsyncSessionLocal
+from schemas import DocumentCreate
+
+logger = logging.getLogger(__name__)
+
+def is_bad_row_error(error: Exception) -> bool:
+    """Whether the database rejected the rows themselves rather than being unavailable"""
+    if isinstance(error, (IntegrityError, DataError)):
+        return True
+    # Failed while binding parameters, before anything reached the database
+    return isinstance(error, StatementError) and not isinstance(error, DBAPIError)
+
+class DocumentWriteBuffer:
+    """Queue Document rows and flush them in batches"""
+    
+    def __init__(
+        self,
+        batch_size: int = settings.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = settings.WRITE_BEHIND_FLUSH_INTERVAL,
+        max_queue: int = settings.WRITE_BEHIND_MAX_QUEUE,
+        max_retries: int = settings.WRITE_BEHIND_MAX_RETRIES
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushed_count = 0
+        self.failed_flushes = 0
+        self.dropped_count = 0
+        self._head_failures = 0  # consecutive failed attempts at the batch at the head of the queue
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of documents waiting to be written"""
+        return len(self._pending)
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self) -> None:
+        """Start the background flush loop"""
+        if not self.running:
+            self._stopping = False
+            self._task = asyncio.create_task(self._flush_loop())
+            logger.info(
+                f"Write-behind buffer started (batch={self.batch_size}, "
+                f"interval={self.flush_interval}s)"
+            )
+    
+    async def stop(self) -> None:
+        """Stop the flush loop and write everything still queued"""
+        # Let an in-flight batch finish rather than cancelling it mid-insert
+        if self._task is not None:
+            self._stopping = True
+            self._batch_ready.set()
+            await self._task
+            self._task = None
+        
+        await self.flush()
+        if self._pending:
+            logger.error(f"Write-behind buffer stopped with {len(self._pending)} unwritten documents")
+    
+    async def enqueue(self, document: DocumentCreate) -> Optional[uuid.UUID]:
+        """Queue a document and return its ID, or None if the queue is full"""
+        if len(self._pending) >= self.max_queue:
+            await self.flush()
+            if len(self._pending) >= self.max_queue:
+                logger.warning("Write-behind queue is full")
+                return None
+        
+        row = document.model_dump()
+        row["id"] = uuid.uuid4()
+        row["created_at"] = datetime.now(timezone.utc)
+        self._pending.append(row)
+        
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+        
+        return row["id"]
+    
+    async def flush(self) -> int:
+        """Write all queued documents, one multi-row insert per batch"""
+        async with self._flush_lock:
+            written = 0
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                try:
+                    await self._write(batch)
+                except Exception as e:
+                    self.failed_flushes += 1
+                    self._head_failures += 1
+                    if self._head_failures < self.max_retries:
+                        # Keep the rows queued and retry on the next trigger
+                        logger.error(f"Write-behind flush failed, {len(self._pending)} documents kept: {e}")
+                        break
+                    
+                    logger.error(
+                        f"Write-behind batch of {len(batch)} failed {self._head_failures} times, "
+                        f"writing it in parts: {e}"
+                    )
+                    try:
+                        written += await self._write_bisecting(batch)
+                    except Exception as e:
+                        # Not a rejected row: back to plain retries of what is left
+                        self._head_failures = 0
+                        logger.error(f"Write-behind flush failed, {len(self._pending)} documents kept: {e}")
+                        break
+                    self._head_failures = 0
+                    continue
+                
+                del self._pending[:len(batch)]
+                written += len(batch)
+                self._head_failures = 0
+            
+            self.flushed_count += written
+            return written
+    
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        async with AsyncSessionLocal() as db:
+            await create_documents_bulk(db, rows)
+    
+    async def _write_bisecting(self, rows: List[Dict[str, Any]]) -> int:
+        """Write rows (the head of the queue) in halves, dropping single rows the database rejects
+        
+        Rows leave the queue as they are written or dropped; an error other than
+        a rejected row (e.g. the database going away) propagates and leaves the
+        rest queued.
+        """
+        try:
+            await self._write(rows)
+        except Exception as e:
+            if len(rows) > 1:
+                middle = len(rows) // 2
+                return await self._write_bisecting(rows[:middle]) + await self._write_bisecting(rows[middle:])
+            if not is_bad_row_error(e):
+                raise
+            row = rows[0]
+            logger.error(
+                f"Write-behind dropped document {row['id']} "
+                f"(user={row.get('user_id')}, filename={row.get('filename')}): {e}"
+            )
+            del self._pending[:1]
+            self.dropped_count += 1
+            WRITE_BEHIND_DROPPED.inc()
+            return 0
+        
+        del self._pending[:len(rows)]
+        return len(rows)
+    
+    async def _flush_loop(self) -> None:
+        """Flush whenever a batch fills up or the interval elapses"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            
+            self._batch_ready.clear()
+            await self.flush()
+    
+    def stats(self) -> dict:
+        """Get queue depth and flush counters"""
+        return {
+            "enabled": settings.WRITE_BEHIND_ENABLED,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "flushed": self.flushed_count,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped_count
+        }
+
+# Create global instance
+document_buffer = DocumentWriteBuffer()
+register_queue("write_buffer", lambda: document_buffer.queue_depth)